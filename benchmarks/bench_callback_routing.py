@@ -0,0 +1,104 @@
+"""Cost of dispatching one button press as registered buttons grow
+
+For BUTTONS buttons (ANSWERS answers per question, one handler per
+question) compares a dispatcher with a button_cb.filter() per handler
+with one CallbackRouter. Presses of the first and of the last
+registered button go through Dispatcher.process_update with the
+memory FSM storage, handlers do nothing.
+
+    python -m benchmarks.bench_callback_routing
+
+No database or Telegram needed.
+"""
+import asyncio
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.types import Update
+from aiogram.utils.callback_data import CallbackData
+
+from benchmarks.fake_telegram import make_callback_update
+from callback_routing import CallbackRouter
+
+BUTTONS = (10, 100, 1000, 5000)
+ANSWERS = 10
+ROUNDS = 2000
+CHAT = 10 ** 9
+TOKEN = '123456:bench'
+
+button_cb = CallbackData('btn', 'question', 'answer', 'data')
+
+
+def get_buttons(count: int) -> dict:
+    """question -> answers"""
+    return {
+        f'q{question}': [f'answer {answer}' for answer in range(ANSWERS)]
+        for question in range(count // ANSWERS)
+    }
+
+
+def make_handler():
+    async def handler(query, callback_data, state):
+        pass
+    return handler
+
+
+def make_filter_dispatcher(bot: Bot, buttons: dict) -> Dispatcher:
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    for question, answers in buttons.items():
+        dp.register_callback_query_handler(
+            make_handler(),
+            button_cb.filter(question=question, answer=answers),
+            state='*')
+    return dp
+
+
+def make_router_dispatcher(bot: Bot, buttons: dict) -> Dispatcher:
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    router = CallbackRouter(button_cb)
+    for question, answers in buttons.items():
+        router.add_route(make_handler(), question, answers)
+    router.register(dp)
+    return dp
+
+
+def make_update(question: str, answer: str) -> Update:
+    message = {'message_id': 1, 'date': 0,
+               'chat': {'id': CHAT, 'type': 'private'}}
+    data = button_cb.new(question=question, answer=answer, data=1)
+    return Update(**make_callback_update(CHAT, message, data))
+
+
+async def measure(dp: Dispatcher, update: Update) -> float:
+    """Median of ROUNDS dispatches in microseconds"""
+    Dispatcher.set_current(dp)
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await dp.process_update(update)
+        timings.append((time.perf_counter() - started) * 10 ** 6)
+    return statistics.median(timings)
+
+
+async def main() -> None:
+    bot = Bot(TOKEN)
+    print(f'{"buttons":>8} {"pressed":<8} {"filters us":>11} '
+          f'{"router us":>10}')
+    for count in BUTTONS:
+        buttons = get_buttons(count)
+        filter_dp = make_filter_dispatcher(bot, buttons)
+        router_dp = make_router_dispatcher(bot, buttons)
+        questions = list(buttons)
+        for name, question in (('first', questions[0]),
+                               ('last', questions[-1])):
+            update = make_update(question, buttons[question][-1])
+            print(f'{count:>8} {name:<8} '
+                  f'{await measure(filter_dp, update):>11.1f} '
+                  f'{await measure(router_dp, update):>10.1f}')
+    await (await bot.get_session()).close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
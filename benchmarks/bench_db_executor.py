@@ -0,0 +1,54 @@
+"""Updates per second with blocking queries in the event loop vs db_call
+
+Each simulated update runs QUERIES_PER_UPDATE queries of QUERY_TIME
+seconds (time.sleep stands in for psycopg2) and one awaited bot call.
+
+    python -m benchmarks.bench_db_executor
+"""
+import asyncio
+import time
+
+from db_pool import db_call
+
+QUERY_TIME = 0.005
+QUERIES_PER_UPDATE = 3
+UPDATES_PER_CHAT = 10
+
+
+def query():
+    time.sleep(QUERY_TIME)
+
+
+async def blocking_update():
+    for _ in range(QUERIES_PER_UPDATE):
+        query()
+    await asyncio.sleep(0)  # bot.send_message
+
+
+async def executor_update():
+    for _ in range(QUERIES_PER_UPDATE):
+        await db_call(query)
+    await asyncio.sleep(0)
+
+
+async def chat(update):
+    for _ in range(UPDATES_PER_CHAT):
+        await update()
+
+
+async def measure(update, chats: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(update) for _ in range(chats)))
+    return chats * UPDATES_PER_CHAT / (time.perf_counter() - started)
+
+
+async def main():
+    print(f'{"chats":>6} {"blocking upd/s":>15} {"db_call upd/s":>14}')
+    for chats in (1, 10, 100):
+        blocking = await measure(blocking_update, chats)
+        executor = await measure(executor_update, chats)
+        print(f'{chats:>6} {blocking:>15.1f} {executor:>14.1f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,208 @@
+"""Latency of db_managing.py queries before and after 003_indexes.sql
+
+Creates a scratch database, applies the migrations before 003, fills
+it with SERVICES services and times every query of db_managing.py.
+Then applies the rest of the migrations and times them again.
+
+    python -m benchmarks.bench_db_indexes
+    python -m benchmarks.bench_db_indexes --services 100000
+
+The bot user needs CREATEDB. The scratch database is dropped first,
+never give it the name of the bot database.
+"""
+import argparse
+import logging
+import random
+import statistics
+import time
+from typing import Callable, List, Tuple
+
+import psycopg2
+
+import db_deploy
+from db_managing import MeetingData, OperatorData, ServiceData, TgUserData
+from db_pool import close_pool, db_config, get_cursor
+from products import bank_card_product, driver_license_product
+
+SCRATCH_DB = 'paperwork_bench'
+INDEXES_VERSION = '003'
+SERVICES = 1_000_000
+SERVICES_PER_USER = 5
+OPERATORS = 30
+ROUNDS = 30
+
+FILL_SCRIPT = '''
+    INSERT INTO tg_user (tg_id, tg_username)
+    SELECT i, 'user' || i FROM generate_series(1, %(users)s) i;
+
+    INSERT INTO operator (tg_id, name, operation_section)
+    SELECT i, 'operator' || i,
+        (ARRAY['PAYMENT_CONTROL', 'BANK_CARD', 'DRIVER_LICENSE']
+            )[1 + i %% 3]::section_id
+    FROM generate_series(1, %(operators)s) i;
+
+    -- four of five services are taken by an operator
+    INSERT INTO service (user_tg_id, customer_name, request_date,
+        is_paid, service_executor)
+    SELECT 1 + i %% %(users)s, 'customer' || i,
+        date '2022-01-01' + i %% 365, i %% 5 <> 0,
+        CASE WHEN i %% 5 <> 0 THEN 1 + i %% %(operators)s END
+    FROM generate_series(1, %(services)s) i;
+
+    INSERT INTO bank_card_service (service_id, full_name)
+    SELECT service_id, customer_name FROM service WHERE service_id %% 2 = 1;
+
+    INSERT INTO driver_license_service (service_id, blood_type)
+    SELECT service_id, 'A' FROM service WHERE service_id %% 2 = 0;
+
+    -- one meeting of a hundred is upcoming
+    INSERT INTO meeting (service_id, meeting_time, meeting_address)
+    SELECT service_id,
+        now() + (CASE WHEN service_id %% 100 = 0 THEN 1 ELSE -1 END)
+            * (1 + service_id %% 300) * interval '1 hour',
+        'address'
+    FROM service;
+
+    ANALYZE;
+'''
+
+
+def recreate_database(name: str) -> None:
+    if name == db_config['dbname']:
+        raise ValueError(f'{name} is the bot database')
+    connection = psycopg2.connect(**db_config)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS {name};')
+        cursor.execute(f'CREATE DATABASE {name};')
+    connection.close()
+
+
+def migrate(up_to: str = None) -> None:
+    """Apply migrations, those before up_to only if it is given"""
+    migrations = [migration for migration in db_deploy.find_migrations()
+                  if up_to is None or migration.version < up_to]
+    connection = psycopg2.connect(**db_config)
+    try:
+        db_deploy.ensure_migrations_table(connection, migrations)
+        db_deploy.deploy(connection, migrations)
+    finally:
+        connection.close()
+    with get_cursor() as cursor:
+        cursor.execute('ANALYZE;')
+
+
+def fill(services: int) -> None:
+    users = max(1, services // SERVICES_PER_USER)
+    started = time.perf_counter()
+    with get_cursor() as cursor:
+        cursor.execute(FILL_SCRIPT, {
+            'users': users, 'operators': OPERATORS, 'services': services})
+    print(f'filled {services} services of {users} users '
+          f'in {time.perf_counter() - started:.1f} s')
+
+
+def delete_new_operator(tg_id: int) -> None:
+    operator_id = OperatorData.new_operator(
+        tg_id=tg_id, section='PAYMENT_CONTROL', name='bench')
+    OperatorData.delete_operator(operator_id)
+
+
+def get_queries(services: int) -> List[Tuple[str, Callable[[], object]]]:
+    """Every query of db_managing.py with random arguments"""
+    users = max(1, services // SERVICES_PER_USER)
+
+    def user() -> int:
+        return random.randint(1, users)
+
+    def operator() -> int:
+        return random.randint(1, OPERATORS)
+
+    def bank_card() -> int:
+        return random.randrange(1, services + 1, 2)
+
+    def driver_license() -> int:
+        return random.randrange(2, services + 1, 2)
+
+    bank_card_data = bank_card_product.service_class.data_class
+    driver_license_data = driver_license_product.service_class.data_class
+    return [
+        ('TgUserData', lambda: TgUserData(user())),
+        ('does_tg_user_exist',
+         lambda: TgUserData.does_tg_user_exist(user())),
+        ('new_tg_user (update)',
+         lambda: TgUserData.new_tg_user(user(), 'bench')),
+        ('OperatorData', lambda: OperatorData(operator())),
+        ('does_operator_exist',
+         lambda: OperatorData.does_operator_exist(operator())),
+        ('get_all_operators', OperatorData.get_all_operators),
+        ('get_operator_id_list(section)',
+         lambda: OperatorData.get_operator_id_list('BANK_CARD')),
+        ('delete_operator (FK check)',
+         lambda: delete_new_operator(user())),
+        ('bank card snapshot', lambda: bank_card_data(bank_card())),
+        ('driver license snapshot',
+         lambda: driver_license_data(driver_license())),
+        ('bank card does_service_exist',
+         lambda: bank_card_data.does_service_exist(bank_card())),
+        ('driver license does_service_exist',
+         lambda: driver_license_data.does_service_exist(
+             driver_license())),
+        ('bank card put_data_to_field',
+         lambda: bank_card_data(bank_card(), snapshot={})
+         .put_data_to_field('occupation', 'bench')),
+        ('driver license put_document',
+         lambda: driver_license_data(driver_license(), snapshot={})
+         .put_document('e_visa', 'bench')),
+        ('mark_paid', lambda: ServiceData(bank_card(), snapshot={})
+         .mark_paid()),
+        ('get_uncompleted_services',
+         lambda: bank_card_data.get_uncompleted_services(user())),
+        ('get_service_id_list',
+         lambda: ServiceData.get_service_id_list(user())),
+        ('MeetingData.get_time',
+         lambda: MeetingData(bank_card()).get_time()),
+        ('MeetingData.get_address',
+         lambda: MeetingData(bank_card()).get_address()),
+        ('get_scheduled_meetings', MeetingData.get_scheduled_meetings),
+    ]
+
+
+def measure(query: Callable[[], object]) -> float:
+    """Median of ROUNDS calls in ms"""
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(services: int, database: str) -> None:
+    # the slow query log would print every query before the indexes
+    logging.getLogger('instrumentation').setLevel(logging.ERROR)
+    random.seed(1)
+    recreate_database(database)
+    db_config['dbname'] = database  # the pool and the deploy use it
+    try:
+        migrate(up_to=INDEXES_VERSION)
+        fill(services)
+        queries = get_queries(services)
+        before = [measure(query) for _, query in queries]
+        started = time.perf_counter()
+        migrate()
+        print(f'indexes built in {time.perf_counter() - started:.1f} s')
+        after = [measure(query) for _, query in queries]
+    finally:
+        close_pool()
+    print(f'{"query":<36} {"before ms":>10} {"after ms":>10}')
+    for (name, _), before_ms, after_ms in zip(queries, before, after):
+        print(f'{name:<36} {before_ms:>10.3f} {after_ms:>10.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--services', type=int, default=SERVICES)
+    parser.add_argument('--database', default=SCRATCH_DB)
+    args = parser.parse_args()
+    main(args.services, args.database)
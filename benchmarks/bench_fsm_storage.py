@@ -0,0 +1,87 @@
+"""Latency of FSM storage operations: MemoryStorage vs durable backends
+
+    python -m benchmarks.bench_fsm_storage postgres
+    python -m benchmarks.bench_fsm_storage redis
+    python -m benchmarks.bench_fsm_storage fake-redis
+
+postgres needs the bot database with migrations applied, redis needs
+any server speaking the redis protocol on REDIS_HOST:REDIS_PORT and
+fake-redis starts benchmarks.fake_redis there. Before timing every
+storage is checked to give back what was written.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.fake_redis import FakeRedis
+from fsm_storage import make_storage
+
+ROUNDS = 1000
+CHAT = USER = 10 ** 9  # far away from real tg ids
+
+
+async def measure(storage, name: str, operation) -> None:
+    timings = []
+    for i in range(ROUNDS):
+        started = time.perf_counter()
+        await operation(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f'{name:<14} p50 {statistics.median(timings):8.3f} ms  '
+          f'p99 {timings[int(len(timings) * 0.99)]:8.3f} ms')
+
+
+def expect(name: str, value, expected) -> None:
+    if value != expected:
+        raise AssertionError(f'{name}: {value!r}, expected {expected!r}')
+
+
+async def check(storage) -> None:
+    """The storage gives back what was written"""
+    address = {'chat': CHAT, 'user': USER}
+    await storage.set_state(state='DocumentState:waiting_form', **address)
+    await storage.set_data(data={'service_id': 1}, **address)
+    await storage.update_data(data={'answer': 'да'}, **address)
+    expect('state', await storage.get_state(**address),
+           'DocumentState:waiting_form')
+    expect('data', await storage.get_data(**address),
+           {'service_id': 1, 'answer': 'да'})
+    await storage.reset_state(with_data=True, **address)
+    expect('state after reset', await storage.get_state(**address), None)
+    expect('data after reset', await storage.get_data(**address), {})
+
+
+async def bench(kind: str) -> None:
+    storage = make_storage(kind)
+    address = {'chat': CHAT, 'user': USER}
+    print(f'--- {kind}')
+    await check(storage)
+    await measure(storage, 'set_state', lambda i: storage.set_state(
+        state='BankCardState:waiting_form', **address))
+    await measure(storage, 'get_state', lambda i: storage.get_state(
+        **address))
+    await measure(storage, 'update_data', lambda i: storage.update_data(
+        data={'service_id': i, 'field_index': i % 13}, **address))
+    await measure(storage, 'get_data', lambda i: storage.get_data(
+        **address))
+    await storage.reset_state(with_data=True, **address)
+    await storage.close()
+    await storage.wait_closed()
+
+
+async def main(kinds) -> None:
+    for kind in ['memory'] + kinds:
+        if kind == 'fake-redis':
+            fake = FakeRedis()
+            await fake.start()
+            try:
+                await bench('redis')
+            finally:
+                await fake.stop()
+        else:
+            await bench(kind)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,104 @@
+"""Cost of the product button path of every private text message
+
+For a registry of 2, 10, 100 and 1000 products compares the old
+is_message_product_button (list of names rebuilt on every call),
+get_product_by_name (linear scan) and get_keyboard_services (markup
+built and serialized on every call) with the frozen indexes and the
+prebuilt keyboard.
+
+    python -m benchmarks.bench_product_lookup
+
+No database or Telegram needed, products are only registered.
+"""
+from types import SimpleNamespace
+import timeit
+
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+from aiogram.utils.payload import prepare_arg
+
+import paperwork_bot
+from business_logic import Document, DocumentType, Product, Section
+
+SIZES = (2, 10, 100, 1000)
+REPEAT = 3
+
+
+def old_get_all_product_names() -> list:
+    return [
+        product.product_name
+        for key, product in Product._all_products.items()
+    ]
+
+
+def old_is_message_product_button(message) -> bool:
+    if message.text in old_get_all_product_names():
+        return True
+    else:
+        return False
+
+
+def old_get_product_by_name(product_name: str) -> Product:
+    for key, product in Product._all_products.items():
+        if product.product_name == product_name:
+            return product
+
+
+def old_get_keyboard_services() -> ReplyKeyboardMarkup:
+    keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
+    for product_name in old_get_all_product_names():
+        keyboard.add(KeyboardButton(text=product_name))
+    return keyboard
+
+
+def add_products(count: int) -> None:
+    for i in range(len(Product.get_all_products()), count):
+        Product(
+            product_name=f'Bench product {i}',
+            uniq_key=f'bench_{i}',
+            payment_amount='1$',
+            terms_description='',
+            list_of_documents=[Document('Фото', DocumentType.FILE,
+                                        'photo', 'is_photo_complete')],
+            preparation_description='',
+            list_of_places=[],
+            operator_section=Section.BANK_CARD,
+            table_name=f'bench_{i}_service')
+
+
+def measure(statement) -> float:
+    """ns per call, best of REPEAT runs of at least 0.2 s"""
+    timer = timeit.Timer(statement)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, number)) / number * 10 ** 9
+
+
+def main() -> None:
+    print(f'{"products":>8} {"case":<28} {"before ns":>10} {"after ns":>10}')
+    for size in SIZES:
+        add_products(size)
+        last_name = Product.get_all_product_names()[-1]
+        hit = SimpleNamespace(text=last_name)
+        miss = SimpleNamespace(text='random text of the customer')
+        keyboard = paperwork_bot.freeze_keyboard(
+            paperwork_bot.make_replay_keyboard(
+                Product.get_all_product_names()))
+        cases = [
+            ('filter, unknown text',
+             lambda: old_is_message_product_button(miss),
+             lambda: paperwork_bot.is_message_product_button(miss)),
+            ('filter + lookup, last name',
+             lambda: old_is_message_product_button(hit)
+             and old_get_product_by_name(hit.text),
+             lambda: paperwork_bot.is_message_product_button(hit)
+             and Product.get_product_by_name(hit.text)),
+            ('services keyboard, sent',
+             lambda: prepare_arg(old_get_keyboard_services()),
+             lambda: prepare_arg(keyboard)),
+        ]
+        for name, before, after in cases:
+            print(f'{size:>8} {name:<28} {measure(before):>10.0f} '
+                  f'{measure(after):>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
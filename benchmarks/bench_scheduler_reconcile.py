@@ -0,0 +1,79 @@
+"""Startup reconciliation time of meeting reminders
+
+Reconciles MEETINGS scheduled meetings twice: into an empty job store
+(every job is added) and into the filled one (restart, every job is
+kept). Then a tenth of the meetings is moved to another day.
+
+    python -m benchmarks.bench_scheduler_reconcile
+    python -m benchmarks.bench_scheduler_reconcile postgresql+psycopg2://...
+
+Without url an sqlite file in the temp directory stands in for the
+bot database.
+"""
+from datetime import datetime, timedelta
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from pytz import timezone
+
+from config import CLIENT_TIMEZONE_NAME
+from scheduling import reconcile_meeting_notifications
+
+MEETINGS = 100_000
+TABLE = 'apscheduler_jobs_bench'
+
+
+def remind(service_id: int) -> None:
+    pass
+
+
+def make_meetings(now: datetime, shift_every: int = 0) -> list:
+    meetings = []
+    for service_id in range(1, MEETINGS + 1):
+        days = 2 + service_id % 30
+        if shift_every and service_id % shift_every == 0:
+            days += 1
+        meetings.append((service_id, now + timedelta(days=days)))
+    return meetings
+
+
+def measure(scheduler, meetings: list, now: datetime, name: str) -> None:
+    started = time.perf_counter()
+    result = reconcile_meeting_notifications(
+        scheduler, remind, meetings, now)
+    print(f'{name:<10} {time.perf_counter() - started:8.2f} s  {result}')
+
+
+def bench(name: str, jobstore) -> None:
+    print(f'--- {name}')
+    scheduler = BackgroundScheduler(jobstores={'default': jobstore})
+    scheduler.start(paused=True)
+    now = datetime.now(tz=timezone(CLIENT_TIMEZONE_NAME))
+    try:
+        measure(scheduler, make_meetings(now), now, 'empty')
+        measure(scheduler, make_meetings(now), now, 'restart')
+        measure(scheduler, make_meetings(now, shift_every=10), now, 'moved')
+    finally:
+        scheduler.remove_all_jobs()
+        scheduler.shutdown(wait=False)
+
+
+def main(url: str = None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    bench('memory', MemoryJobStore())
+    if url:
+        bench('sqlalchemy', SQLAlchemyJobStore(url=url, tablename=TABLE))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'jobs.sqlite')
+        bench('sqlite', SQLAlchemyJobStore(url=f'sqlite:///{path}'))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,140 @@
+"""Concurrent claims of services by operators
+
+Creates a scratch database with SERVICES services and CLAIMS operators.
+Every operator presses "Взять клиента" on every service at once: the
+claims go through db_call like in the bot. Runs the removed
+change_executor, which lets every claim win, and Service.claim, and
+counts the operators told that they won.
+
+    python -m benchmarks.bench_service_claim
+    python -m benchmarks.bench_service_claim --services 20 --claims 500
+
+The bot user needs CREATEDB. The scratch database is dropped first,
+never give it the name of the bot database.
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.bench_db_indexes import migrate, recreate_database
+from business_logic import Operator
+from db_managing import OperatorData, OperatorNotFound
+from db_pool import close_pool, db_call, db_config, get_cursor
+from products import bank_card_product
+
+SCRATCH_DB = 'paperwork_claim_bench'
+SERVICES = 10
+CLAIMS = 200  # operators claiming every service
+
+FILL_SCRIPT = '''
+    INSERT INTO tg_user (tg_id, tg_username)
+    SELECT i, 'user' || i FROM generate_series(1, %(operators)s) i;
+
+    INSERT INTO operator (operator_id, tg_id, name, operation_section)
+    SELECT i, i, 'operator' || i, 'BANK_CARD'
+    FROM generate_series(1, %(operators)s) i;
+
+    INSERT INTO service (service_id, user_tg_id, customer_name,
+        request_date, is_paid, product_key)
+    SELECT i, 1, 'customer' || i, current_date, TRUE, 'bank_card'
+    FROM generate_series(1, %(services)s) i;
+
+    INSERT INTO bank_card_service (service_id)
+    SELECT i FROM generate_series(1, %(services)s) i;
+
+    INSERT INTO meeting (service_id)
+    SELECT i FROM generate_series(1, %(services)s) i;
+'''
+
+
+def fill(services: int, operators: int) -> None:
+    with get_cursor() as cursor:
+        cursor.execute(FILL_SCRIPT, {
+            'services': services, 'operators': operators})
+
+
+def release_services() -> None:
+    with get_cursor() as cursor:
+        cursor.execute('UPDATE service SET service_executor = NULL;')
+
+
+def get_executors() -> Dict[int, int]:
+    with get_cursor() as cursor:
+        cursor.execute('SELECT service_id, service_executor FROM service;')
+        return dict(cursor.fetchall())
+
+
+def old_claim(service_id: int, operator: Operator) -> int:
+    """The removed change_executor: a check of the operator, then an
+    UPDATE. Every caller thinks it won
+    """
+    operator_id = operator.get_operator_id()
+    if not OperatorData.does_operator_exist(operator_id):
+        raise OperatorNotFound
+    with get_cursor() as cursor:
+        cursor.execute(
+            'UPDATE service SET service_executor = %s WHERE service_id = %s;',
+            (operator_id, service_id))
+    return operator_id
+
+
+def new_claim(service_id: int, operator: Operator) -> int:
+    service = bank_card_product.service_class(service_id)
+    return service.claim(operator).get_operator_id()
+
+
+async def run(claim: Callable[[int, Operator], int],
+              services: int,
+              operators: List[Operator]) -> None:
+    await db_call(release_services)
+    calls = [(service_id, operator)
+             for operator in operators
+             for service_id in range(1, services + 1)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        db_call(claim, service_id, operator)
+        for service_id, operator in calls))
+    elapsed = time.perf_counter() - started
+
+    executors = await db_call(get_executors)
+    winners = collections.Counter()
+    wrong = 0
+    for (service_id, operator), executor_id in zip(calls, results):
+        if executor_id == operator.get_operator_id():
+            winners[service_id] += 1
+        if executor_id != executors[service_id]:
+            wrong += 1
+    print(f'{claim.__name__:<10} {len(calls):>7} '
+          f'{sum(winners.values()):>7} '
+          f'{sum(1 for count in winners.values() if count > 1):>9} '
+          f'{wrong:>7} {len(calls) / elapsed:>9.0f}')
+
+
+def main(services: int, claims: int, database: str) -> None:
+    logging.getLogger('busines_logic').setLevel(logging.WARNING)
+    recreate_database(database)
+    db_config['dbname'] = database  # the pool and the deploy use it
+    try:
+        migrate()
+        fill(services, claims)
+        operators = [Operator.get(operator_id)
+                     for operator_id in range(1, claims + 1)]
+        print(f'{"claim":<10} {"claims":>7} {"won":>7} '
+              f'{"2+ winners":>9} {"wrong":>7} {"claims/s":>9}')
+        for claim in (old_claim, new_claim):
+            asyncio.run(run(claim, services, operators))
+    finally:
+        close_pool()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--services', type=int, default=SERVICES)
+    parser.add_argument('--claims', type=int, default=CLAIMS,
+                        help='operators claiming every service')
+    parser.add_argument('--database', default=SCRATCH_DB)
+    args = parser.parse_args()
+    main(args.services, args.claims, args.database)
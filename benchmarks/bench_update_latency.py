@@ -0,0 +1,119 @@
+"""End-to-end update latency: long polling vs webhook
+
+An echo bot runs against benchmarks.fake_telegram. Latency is the time
+from an update appearing at the fake API to the bot's sendMessage
+reaching it. Updates are sent one by one and then in bursts from
+different chats.
+
+    python -m benchmarks.bench_update_latency
+"""
+import asyncio
+import logging
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY, \
+    WebhookRequestHandler
+from aiogram.types import Message
+from aiohttp import web
+
+from benchmarks.fake_telegram import FakeTelegram, TOKEN, make_text_update
+from webhook import secret_token_middleware, set_webhook
+
+SEQUENTIAL = 200
+BURSTS = 20
+BURST_SIZE = 50
+WEBHOOK_PORT = 8082
+SECRET = 'bench-secret'
+
+
+def make_dispatcher(fake: FakeTelegram) -> Dispatcher:
+    bot = Bot(TOKEN, server=TelegramAPIServer.from_base(fake.url))
+    dp = Dispatcher(bot)
+
+    @dp.message_handler()
+    async def echo(message: Message):
+        await message.answer(message.text)
+
+    return dp
+
+
+class Probe:
+    """Matches replies of the bot to pushed updates by text"""
+
+    def __init__(self, fake: FakeTelegram) -> None:
+        self.fake = fake
+        self.waiting = {}
+        self.counter = 0
+        fake.listeners.append(self.on_request)
+
+    def on_request(self, method: str, params: dict) -> None:
+        future = self.waiting.pop(params.get('text'), None)
+        if method == 'sendmessage' and future is not None:
+            future.set_result(time.perf_counter())
+
+    async def ping(self, chat_id: int) -> float:
+        self.counter += 1
+        text = f'ping {self.counter}'
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[text] = future
+        started = time.perf_counter()
+        await self.fake.push_update(make_text_update(chat_id, text))
+        return (await future - started) * 1000
+
+
+async def measure(probe: Probe) -> None:
+    sequential = [await probe.ping(1) for _ in range(SEQUENTIAL)]
+    burst = []
+    for _ in range(BURSTS):
+        burst += await asyncio.gather(
+            *(probe.ping(chat_id) for chat_id in range(1, BURST_SIZE + 1)))
+    for name, timings in (('sequential', sequential), ('burst', burst)):
+        timings.sort()
+        print(f'  {name:<11} p50 {statistics.median(timings):7.2f} ms  '
+              f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms  '
+              f'p99 {timings[int(len(timings) * 0.99)]:7.2f} ms')
+
+
+async def bench_polling(fake: FakeTelegram) -> None:
+    print('polling')
+    dp = make_dispatcher(fake)
+    polling = asyncio.create_task(dp.start_polling(timeout=20))
+    await measure(Probe(fake))
+    dp.stop_polling()
+    polling.cancel()
+    await (await dp.bot.get_session()).close()
+
+
+async def bench_webhook(fake: FakeTelegram) -> None:
+    print('webhook')
+    dp = make_dispatcher(fake)
+    app = web.Application(middlewares=[secret_token_middleware(SECRET)])
+    app.router.add_route('*', '/webhook', WebhookRequestHandler)
+    app[BOT_DISPATCHER_KEY] = dp
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', WEBHOOK_PORT).start()
+    await set_webhook(
+        dp.bot, f'http://127.0.0.1:{WEBHOOK_PORT}/webhook', SECRET)
+    await measure(Probe(fake))
+    await dp.bot.delete_webhook()
+    await runner.cleanup()
+    await (await dp.bot.get_session()).close()
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    fake = FakeTelegram()
+    await fake.start()
+    try:
+        await bench_polling(fake)
+        await bench_webhook(fake)
+    finally:
+        await fake.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""Local stand-in for a redis server
+
+Speaks the redis protocol for the commands of aiogram RedisStorage2:
+GET, SET with EX, DEL, KEYS, FLUSHDB and the connection commands.
+Keys are kept in memory and expire like in redis.
+
+    fake = FakeRedis()
+    await fake.start()
+    storage = make_storage('redis')
+
+It listens on REDIS_HOST:REDIS_PORT of config.py by default. To run
+the bot itself with FSM_STORAGE = 'redis' against it start
+
+    python -m benchmarks.fake_redis
+"""
+from __future__ import annotations
+import asyncio
+import fnmatch
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import REDIS_HOST, REDIS_PORT
+
+
+class FakeRedis:
+
+    def __init__(self, host: str = REDIS_HOST, port: int = REDIS_PORT) -> None:
+        self.host = host
+        self.port = port
+        self.commands = 0
+        self._keys: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._server = None
+        self._commands: Dict[bytes, Callable[[List[bytes]], bytes]] = {
+            b'PING': lambda args: b'+PONG\r\n',
+            b'AUTH': lambda args: b'+OK\r\n',
+            b'SELECT': lambda args: b'+OK\r\n',
+            b'GET': self.get,
+            b'SET': self.set,
+            b'DEL': self.delete,
+            b'KEYS': self.keys,
+            b'FLUSHDB': self.flushdb,
+        }
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self.serve, self.host, self.port)
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def serve(self, reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                self.commands += 1
+                handler = self._commands.get(command[0].upper())
+                if handler is None:
+                    reply = b'-ERR unknown command %s\r\n' % command[0]
+                else:
+                    reply = handler(command[1:])
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        value, expires_at = self._keys.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._keys[key]
+            return None
+        return value
+
+    def get(self, args: List[bytes]) -> bytes:
+        return encode_bulk(self._get(args[0]))
+
+    def set(self, args: List[bytes]) -> bytes:
+        key, value, *options = args
+        expires_at = None
+        if options and options[0].upper() == b'EX':
+            expires_at = time.monotonic() + int(options[1])
+        self._keys[key] = (value, expires_at)
+        return b'+OK\r\n'
+
+    def delete(self, args: List[bytes]) -> bytes:
+        deleted = 0
+        for key in args:
+            if self._get(key) is not None:
+                del self._keys[key]
+                deleted += 1
+        return b':%d\r\n' % deleted
+
+    def keys(self, args: List[bytes]) -> bytes:
+        pattern = args[0].decode()
+        keys = [key for key in list(self._keys)
+                if self._get(key) is not None
+                and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return b'*%d\r\n' % len(keys) + b''.join(map(encode_bulk, keys))
+
+    def flushdb(self, args: List[bytes]) -> bytes:
+        self._keys.clear()
+        return b'+OK\r\n'
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """Arguments of the next command, None when the client is gone"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.split()  # inline command, e.g. from telnet
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def encode_bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+async def main() -> None:
+    fake = FakeRedis()
+    await fake.start()
+    print(f'fake redis on {fake.host}:{fake.port}')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,269 @@
+"""Local stand-in for the Telegram Bot API
+
+Serves /bot<token>/<method> like api.telegram.org. Updates pushed with
+push_update() are given out by getUpdates or posted to the webhook set
+by setWebhook, with its secret token. Every request to the fake is
+passed to listeners as (method, params).
+
+Messages sent by the bot are kept per chat and edits are applied to
+them, so a simulated user can read the last keyboard and press its
+buttons. New messages of a chat also go to get_inbox(chat_id).
+
+    fake = FakeTelegram()
+    await fake.start()
+    bot = Bot(TOKEN, server=TelegramAPIServer.from_base(fake.url))
+
+To run the bot itself against it set TELEGRAM_API_SERVER in config.py
+to the address printed by
+
+    python -m benchmarks.fake_telegram
+"""
+from __future__ import annotations
+import asyncio
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+TOKEN = '42:fake-token'
+BOT_USER = {'id': 42, 'is_bot': True, 'first_name': 'paperwork_bot',
+            'username': 'paperwork_bot'}
+
+
+class FakeTelegram:
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8081) -> None:
+        self.host = host
+        self.port = port
+        self.url = f'http://{host}:{port}'
+        self.webhook_url = None
+        self.secret_token = None
+        self.listeners: List[Callable[[str, dict], None]] = []
+        self.chats: Dict[int, List[dict]] = {}  # chat_id -> bot messages
+        self._inboxes: Dict[int, asyncio.Queue] = {}
+        self._messages: Dict[tuple, dict] = {}  # (chat_id, message_id)
+        self._pending: List[dict] = []
+        self._has_updates = asyncio.Event()
+        self._update_id = 0
+        self._message_id = 0
+        self._file_id = 0
+        self._runner = None
+        self._session = None
+        self._methods: Dict[str, Callable] = {
+            'getme': self.get_me,
+            'getupdates': self.get_updates,
+            'setwebhook': self.set_webhook,
+            'deletewebhook': self.delete_webhook,
+            'sendmessage': self.send_message,
+            'sendphoto': self.send_photo,
+            'senddocument': self.send_document,
+            'editmessagetext': self.edit_message,
+            'editmessagecaption': self.edit_message,
+            'editmessagereplymarkup': self.edit_message,
+            'deletemessage': self.delete_message,
+            'answercallbackquery': self.answer_callback_query,
+        }
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._session = ClientSession()
+
+    async def stop(self) -> None:
+        await self._session.close()
+        await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = dict(await request.post())
+        for listener in self.listeners:
+            listener(method, params)
+        handler = self._methods.get(method)
+        if handler is None:
+            return web.json_response(
+                {'ok': False, 'error_code': 404, 'description': 'Not Found'},
+                status=404)
+        return web.json_response({'ok': True, 'result': await handler(params)})
+
+    #  ----------------------------------------------------------- updates
+    async def push_update(self, update: dict, wait: bool = False) -> int:
+        """Deliver update the way the bot asked for: webhook or polling
+
+        With wait=True and a webhook returns after the bot answered
+        the request, which is after the update was handled.
+        """
+        self._update_id += 1
+        update = dict(update, update_id=self._update_id)
+        if self.webhook_url:
+            posting = self._post_update(update)
+            if wait:
+                await posting
+            else:
+                asyncio.create_task(posting)
+        else:
+            self._pending.append(update)
+            self._has_updates.set()
+        return self._update_id
+
+    async def _post_update(self, update: dict) -> None:
+        headers = {}
+        if self.secret_token:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret_token
+        async with self._session.post(
+                self.webhook_url, json=update, headers=headers) as response:
+            await response.read()
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        self._pending = [u for u in self._pending if u['update_id'] >= offset]
+        if not self._pending:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(
+                    self._has_updates.wait(),
+                    float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get('limit') or 100)
+        return self._pending[:limit]
+
+    async def set_webhook(self, params: dict) -> bool:
+        self.webhook_url = params.get('url') or None
+        self.secret_token = params.get('secret_token')
+        return True
+
+    async def delete_webhook(self, params: dict) -> bool:
+        self.webhook_url = None
+        self.secret_token = None
+        return True
+
+    #  ---------------------------------------------------------- messages
+    def get_inbox(self, chat_id: int) -> asyncio.Queue:
+        """Queue of new messages sent by the bot to the chat"""
+        return self._inboxes.setdefault(int(chat_id), asyncio.Queue())
+
+    def make_message(self, chat_id: int, **fields) -> dict:
+        self._message_id += 1
+        return dict({
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'from': BOT_USER,
+        }, **fields)
+
+    def _store(self, params: dict, **fields) -> dict:
+        chat_id = int(params['chat_id'])
+        message = self.make_message(chat_id, **fields)
+        markup = _load_markup(params)
+        if markup:
+            message['reply_markup'] = markup
+        self._messages[(chat_id, message['message_id'])] = message
+        self.chats.setdefault(chat_id, []).append(message)
+        self.get_inbox(chat_id).put_nowait(message)
+        return message
+
+    def _new_file(self, file_id: Optional[str]) -> dict:
+        self._file_id += 1
+        return {'file_id': file_id or f'file-{self._file_id}',
+                'file_unique_id': f'unique-{self._file_id}'}
+
+    async def get_me(self, params: dict) -> dict:
+        return BOT_USER
+
+    async def send_message(self, params: dict) -> dict:
+        return self._store(params, text=params['text'])
+
+    async def send_photo(self, params: dict) -> dict:
+        photo = dict(self._new_file(params.get('photo')), width=1, height=1)
+        return self._store(
+            params, photo=[photo], caption=params.get('caption', ''))
+
+    async def send_document(self, params: dict) -> dict:
+        return self._store(
+            params,
+            document=self._new_file(params.get('document')),
+            caption=params.get('caption', ''))
+
+    async def edit_message(self, params: dict) -> dict:
+        """Text, caption and keyboard edits, like Telegram an edit
+        without reply_markup removes the inline keyboard
+        """
+        key = (int(params['chat_id']), int(params['message_id']))
+        message = self._messages[key]
+        for field in ('text', 'caption'):
+            if field in params:
+                message[field] = params[field]
+        markup = _load_markup(params)
+        if markup:
+            message['reply_markup'] = markup
+        else:
+            message.pop('reply_markup', None)
+        return message
+
+    async def delete_message(self, params: dict) -> bool:
+        key = (int(params['chat_id']), int(params['message_id']))
+        message = self._messages.pop(key, None)
+        if message is not None:
+            self.chats[key[0]].remove(message)
+        return True
+
+    async def answer_callback_query(self, params: dict) -> bool:
+        return True
+
+
+def _load_markup(params: dict) -> Optional[dict]:
+    markup = params.get('reply_markup')
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return markup or None
+
+
+def make_user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}',
+            'username': f'user{user_id}'}
+
+
+def make_message_update(chat_id: int, **fields) -> dict:
+    """Private message from user chat_id"""
+    return {'message': dict({
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': make_user(chat_id),
+    }, **fields)}
+
+
+def make_text_update(chat_id: int, text: str) -> dict:
+    return make_message_update(chat_id, text=text)
+
+
+def make_photo_update(chat_id: int, file_id: str) -> dict:
+    photo = {'file_id': file_id, 'file_unique_id': file_id,
+             'width': 1, 'height': 1}
+    return make_message_update(chat_id, photo=[photo])
+
+
+def make_callback_update(chat_id: int, message: dict, data: str) -> dict:
+    """Press of a button with data under message of the bot"""
+    return {'callback_query': {
+        'id': f'{chat_id}-{message["message_id"]}-{time.monotonic_ns()}',
+        'from': make_user(chat_id),
+        'message': message,
+        'chat_instance': str(chat_id),
+        'data': data,
+    }}
+
+
+async def main() -> None:
+    fake = FakeTelegram()
+    await fake.start()
+    print(f'fake Bot API on {fake.url}')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
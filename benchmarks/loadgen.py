@@ -0,0 +1,315 @@
+"""Load test of paperwork_bot against benchmarks.fake_telegram
+
+N customers walk through the bank card and then the driver license
+flow while M payment control operators confirm their payments. For
+every flow prints throughput, handler latency percentiles, database
+queries counted by instrumentation and transactions (connections
+taken from the pool).
+
+    python -m benchmarks.loadgen --customers 50 --operators 3
+
+The bot runs in this process behind a webhook, its Bot API calls go
+to the fake. A simulated user sends the next update only after the
+previous one was handled. Telegram rate limits of the fan-out are
+lifted unless --telegram-limits is given.
+
+Needs the bot database with migrations applied. Use a scratch
+database: the run leaves its users, operators and services there.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+import logging
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.bot.api import TelegramAPIServer
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY, \
+    WebhookRequestHandler
+from aiohttp import web
+
+import paperwork_bot
+from benchmarks.fake_telegram import FakeTelegram, make_callback_update, \
+    make_photo_update, make_text_update
+from business_logic import FieldType, Operator, Section
+from db_managing import OperatorAlreadySet
+from db_pool import db_call, get_pool
+from fanout import FanOut
+from instrumentation import get_handler_stats, get_query_totals, \
+    reset_stats
+from products import BankCardForm, DriverLicenseForm, bank_card_product, \
+    driver_license_product
+from webhook import secret_token_middleware, set_webhook
+
+FIRST_TG_ID = 10 ** 12  # far away from real tg ids
+WEBHOOK_PORT = 8083
+SECRET = 'loadgen-secret'
+CONFIRM_TIMEOUT = 60  # seconds to wait for operators after customers
+
+FIELD_VALUES = {
+    FieldType.COUNT: '180',
+    FieldType.PHONE: '+6281234567890',
+    FieldType.EMAIL: 'load@example.com',
+    FieldType.DATE: '01.01.1990',
+    FieldType.YES_NO: paperwork_bot.yes_button,
+}
+DEFAULT_FIELD_VALUE = 'load test'
+
+
+class HandlerTimer(BaseMiddleware):
+    """Time of every message and callback handler of the bot"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    def reset(self) -> None:
+        self.timings = defaultdict(list)
+
+    async def _start(self, event, data: dict):
+        data['_started'] = time.perf_counter()
+
+    async def _name(self, event, data: dict):
+        data['_handler'] = current_handler.get().__name__
+
+    async def _stop(self, event, results: list, data: dict):
+        elapsed = (time.perf_counter() - data['_started']) * 1000
+        self.timings[data.get('_handler', '(no handler)')].append(elapsed)
+
+    on_pre_process_message = on_pre_process_callback_query = _start
+    on_process_message = on_process_callback_query = _name
+    on_post_process_message = on_post_process_callback_query = _stop
+
+
+class SimulatedChat:
+    """Private chat of a user with the bot"""
+
+    def __init__(self, fake: FakeTelegram, chat_id: int) -> None:
+        self.fake = fake
+        self.chat_id = chat_id
+        self.updates = 0
+
+    async def push(self, update: dict) -> None:
+        self.updates += 1
+        await self.fake.push_update(update, wait=True)
+
+    async def send_text(self, text: str) -> None:
+        await self.push(make_text_update(self.chat_id, text))
+
+    async def send_photo(self) -> None:
+        await self.push(make_photo_update(
+            self.chat_id, f'photo-{self.chat_id}-{self.updates}'))
+
+    def find_button(self, text: str) -> Tuple[dict, str]:
+        """Newest message of the bot with the inline button"""
+        for message in reversed(self.fake.chats.get(self.chat_id, [])):
+            data = get_button_data(message, text)
+            if data is not None:
+                return message, data
+        raise LookupError(f'no button {text!r} in chat {self.chat_id}')
+
+    async def press(self, text: str) -> None:
+        message, data = self.find_button(text)
+        await self.push(make_callback_update(self.chat_id, message, data))
+
+
+def get_button_data(message: dict, text: str) -> Optional[str]:
+    keyboard = message.get('reply_markup', {}).get('inline_keyboard', [])
+    for row in keyboard:
+        for button in row:
+            if button['text'] == text:
+                return button['callback_data']
+    return None
+
+
+#  ------------------------------------------------------------- flows
+async def start_service(chat: SimulatedChat, product, run_id: int) -> None:
+    await chat.send_text('/start')
+    await chat.send_text(product.product_name)
+    await chat.press(paperwork_bot.start_service_button)
+    await chat.send_text(f'load {run_id} {chat.chat_id}')
+    await chat.send_photo()  # payment screenshot
+
+
+async def fill_form(chat: SimulatedChat, form) -> None:
+    for field_enum in form:
+        await chat.send_text(FIELD_VALUES.get(
+            field_enum.value.field_type, DEFAULT_FIELD_VALUE))
+
+
+async def bank_card_customer(chat: SimulatedChat, run_id: int) -> None:
+    form, passport = bank_card_product.get_document_names()
+    await start_service(chat, bank_card_product, run_id)
+    await chat.press(form)
+    await fill_form(chat, BankCardForm)
+    await chat.press(passport)
+    await chat.send_photo()
+
+
+async def driver_license_customer(chat: SimulatedChat, run_id: int) -> None:
+    form, passport, evisa, meeting = \
+        driver_license_product.get_document_names()
+    await start_service(chat, driver_license_product, run_id)
+    await chat.press(form)
+    await fill_form(chat, DriverLicenseForm)
+    await chat.press(passport)
+    await chat.send_photo()
+    await chat.press(evisa)
+    await chat.send_photo()
+    await chat.press(meeting)
+    place = driver_license_product.list_of_places[0]
+    await chat.press(place.name)
+    await chat.press(place.slot_times[0].strftime(paperwork_bot.TIME_FORMAT))
+
+
+async def payment_operator(chat: SimulatedChat, index: int, count: int,
+                           confirmed: asyncio.Queue) -> None:
+    """Confirms payments of services with service_id % count == index"""
+    inbox = chat.fake.get_inbox(chat.chat_id)
+    while True:
+        message = await inbox.get()
+        data = get_button_data(message, paperwork_bot.confirm_payment)
+        if data is None:
+            continue
+        service_id = int(paperwork_bot.callback_codec.parse(data)['data'])
+        if service_id % count != index:
+            continue
+        await chat.push(make_callback_update(chat.chat_id, message, data))
+        confirmed.put_nowait(service_id)
+
+
+async def register_operator(chat: SimulatedChat) -> None:
+    await chat.send_text('/start')
+    try:
+        await db_call(
+            Operator.new,
+            tg_id=chat.chat_id,
+            section=Section.PAYMENT_CONTROL,
+            name=f'load operator {chat.chat_id}'
+        )
+    except OperatorAlreadySet:
+        pass
+
+
+#  ------------------------------------------------------------ report
+def percentile(timings: List[float], share: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def print_report(name: str, customers: int, updates: int, elapsed: float,
+                 transactions: int, timings: Dict[str, List[float]]) -> None:
+    totals = get_query_totals()
+    queries = {handler: stats['queries']
+               for handler, stats in get_handler_stats().items()}
+    print(f'--- {name}: {customers} customers')
+    print(f'updates {updates} in {elapsed:.2f} s: '
+          f'{updates / elapsed:.1f} upd/s')
+    print(f'db queries {totals["queries"]}, '
+          f'{totals["queries"] / customers:.1f} per customer, '
+          f'{totals["db_time"]:.2f} s in db, '
+          f'{totals["slow_queries"]} slow')
+    print(f'db transactions {transactions}, '
+          f'{transactions / customers:.1f} per customer')
+    print(f'{"handler":<45} {"count":>6} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"queries":>8}')
+    rows = [('(all)', sum(timings.values(), []))] + sorted(timings.items())
+    for handler, handler_timings in rows:
+        handler_timings = sorted(handler_timings)
+        if not handler_timings:
+            continue
+        if handler in queries:
+            per_update = queries[handler]['sum'] / queries[handler]['count']
+        else:
+            per_update = sum(q['sum'] for q in queries.values()) / max(
+                1, sum(q['count'] for q in queries.values()))
+        print(f'{handler:<45} {len(handler_timings):>6} '
+              f'{statistics.median(handler_timings):>8.2f} '
+              f'{percentile(handler_timings, 0.95):>8.2f} '
+              f'{percentile(handler_timings, 0.99):>8.2f} '
+              f'{per_update:>8.1f}')
+
+
+async def run_flow(fake: FakeTelegram, timer: HandlerTimer, name: str,
+                   flow, first_id: int, customers: int,
+                   operators: List[SimulatedChat], run_id: int) -> None:
+    confirmed = asyncio.Queue()
+    operator_tasks = [
+        asyncio.create_task(payment_operator(
+            operator, index, len(operators), confirmed))
+        for index, operator in enumerate(operators)]
+    chats = [SimulatedChat(fake, first_id + i) for i in range(customers)]
+    pool = get_pool()
+    timer.reset()
+    reset_stats()
+    acquired = pool.get_stats()['acquired']
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(flow(chat, run_id) for chat in chats))
+        for _ in range(customers if operators else 0):
+            await asyncio.wait_for(confirmed.get(), CONFIRM_TIMEOUT)
+    finally:
+        for task in operator_tasks:
+            task.cancel()
+    elapsed = time.perf_counter() - started
+    updates = sum(chat.updates for chat in chats + operators)
+    for operator in operators:
+        operator.updates = 0
+    print_report(
+        name, customers, updates, elapsed,
+        pool.get_stats()['acquired'] - acquired, timer.timings)
+
+
+async def main(customers: int, operators: int,
+               telegram_limits: bool) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    run_id = int(time.time())
+    fake = FakeTelegram()
+    await fake.start()
+
+    dp = paperwork_bot.dp
+    dp.bot.server = TelegramAPIServer.from_base(fake.url)
+    timer = HandlerTimer()
+    dp.middleware.setup(timer)
+    if not telegram_limits:
+        paperwork_bot.notifier = FanOut(global_rate=10 ** 6,
+                                        chat_rate=10 ** 6)
+
+    app = web.Application(middlewares=[secret_token_middleware(SECRET)])
+    app.router.add_route('*', '/webhook', WebhookRequestHandler)
+    app[BOT_DISPATCHER_KEY] = dp
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', WEBHOOK_PORT).start()
+    await set_webhook(
+        dp.bot, f'http://127.0.0.1:{WEBHOOK_PORT}/webhook', SECRET)
+
+    try:
+        await db_call(paperwork_bot.callback_codec.load,
+                      paperwork_bot.router.get_labels())
+        operator_chats = [SimulatedChat(fake, FIRST_TG_ID + i)
+                          for i in range(operators)]
+        for chat in operator_chats:
+            await register_operator(chat)
+            chat.updates = 0
+        first_id = FIRST_TG_ID + 1000
+        for name, flow in (('bank card', bank_card_customer),
+                           ('driver license', driver_license_customer)):
+            await run_flow(fake, timer, name, flow, first_id, customers,
+                           operator_chats, run_id)
+            first_id += customers
+    finally:
+        await runner.cleanup()
+        await (await dp.bot.get_session()).close()
+        await fake.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--operators', type=int, default=2)
+    parser.add_argument('--telegram-limits', action='store_true')
+    args = parser.parse_args()
+    asyncio.run(main(args.customers, args.operators, args.telegram_limits))
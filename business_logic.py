@@ -1,14 +1,20 @@
 from __future__ import annotations
-from collections import defaultdict
 import logging
-from typing import Any, NamedTuple, Tuple, List
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, NamedTuple, Tuple, List, Type
 from enum import Enum
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 from pytz import timezone
 
+from cache import LRUCache
 from db_managing import MeetingData, OperatorData, ServiceData, TgUserData
-from config import CLIENT_TIMEZONE_NAME
+from config import CLIENT_TIMEZONE_NAME, CACHE_TTL, TG_USER_CACHE_SIZE, \
+    OPERATOR_CACHE_SIZE, SERVICE_CACHE_SIZE, OPERATOR_DIRECTORY_TTL, \
+    SERVICE_PRODUCT_CACHE_SIZE, MEETING_DAYS_AHEAD, MEETING_PLACE_CAPACITY, \
+    MEETING_OPERATOR_CAPACITY
 
 
 # Configure logging
@@ -20,21 +26,74 @@ log = logging.getLogger('busines_logic')
 
 # Class
 class CacheMixin(object):
-    __all_objects = defaultdict(dict)
+    """Keeps created objects in a bounded cache of their class
+
+    Every class has its own cache made by cache_factory with
+    cache_capacity and cache_ttl of the class.
+    """
+    cache_factory: Callable = LRUCache
+    cache_capacity = 1000
+    cache_ttl = CACHE_TTL
+    __caches = {}
+
+    @classmethod
+    def get_cache(cls) -> LRUCache:
+        cache = cls.__caches.get(cls)
+        if cache is None:
+            cache = cls.__caches.setdefault(
+                cls, cls.cache_factory(cls.cache_capacity, cls.cache_ttl))
+        return cache
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, dict]:
+        return {
+            cached_class.__name__: cache.get_stats()
+            for cached_class, cache in list(cls.__caches.items())
+        }
 
     def __init__(self, key):
-        self.__all_objects[self.__class__][key] = self
+        """Puts the object in the cache, call it when the object is
+        ready: another thread can take it from the cache at once"""
+        self.get_cache().put(key, self)
 
     @classmethod
     def get(cls, key):
-        if key in cls.__all_objects[cls]:
-            object_ = cls.__all_objects[cls][key]
-            if object_ is not None:
-                return object_
+        object_ = cls.get_cache().get(key)
+        if object_ is not None:
+            return object_
         return cls(key)
 
+    @classmethod
+    def _get_cache_family(cls) -> List[type]:
+        """Class that inherits CacheMixin directly and all its subclasses"""
+        root = cls
+        for parent in cls.__mro__:
+            if CacheMixin in parent.__bases__:
+                root = parent
+                break
+        family = [root]
+        for family_class in family:
+            family.extend(family_class.__subclasses__())
+        return family
+
+    @classmethod
+    def invalidate_cache(cls, key, keep: CacheMixin = None) -> None:
+        """Drop cached objects with the key in all related classes
+
+        keep: the object stays in cache (it has actual data)
+        """
+        for family_class in cls._get_cache_family():
+            cache = cls.__caches.get(family_class)
+            if cache is None:
+                continue
+            object_ = cache.peek(key)
+            if object_ is not None and object_ is not keep:
+                cache.invalidate(key)
+
 
 class TgUser(CacheMixin):
+    cache_capacity = TG_USER_CACHE_SIZE
+
     @classmethod
     def new(cls, tg_id: int, tg_username: str) -> TgUser:
         log.info(f'new TgUser: {tg_id}')
@@ -43,9 +102,9 @@ class TgUser(CacheMixin):
         return TgUser(tg_id)
 
     def __init__(self, tg_id: int):
-        super(TgUser, self).__init__(key=tg_id)
         self.tg_id = tg_id
         self.tg_data = TgUserData(tg_id)
+        super(TgUser, self).__init__(key=tg_id)
 
     def get_tg_id(self) -> int:
         return self.tg_id
@@ -65,41 +124,37 @@ class Section(Enum):
 
 
 class Operator(CacheMixin):
+    cache_capacity = OPERATOR_CACHE_SIZE
+
     @classmethod
     def new(cls, tg_id: int, section: Section, name: str) -> Operator:
         operator_id = OperatorData.new_operator(
             tg_id=tg_id, section=section.value, name=name
         )
-        return Operator(operator_id)
+        operator_directory.reload()
+        return Operator.get(operator_id)
 
     @classmethod
     def delete(cls, operator_id: int) -> None:
         OperatorData.delete_operator(operator_id=operator_id)
+        cls.invalidate_cache(operator_id)
+        operator_directory.reload()
 
     @classmethod
     def get_operator_list(cls, section: Section = None) -> tuple[Operator]:
-        if section:
-            section = section.value
-        operators_id = OperatorData.get_operator_id_list(section)
-        return (Operator.get(operator_id) for operator_id in operators_id)
+        return operator_directory.get_operator_list(section)
 
     @classmethod
     def is_user_operator(cls, tg_id: int, section: Section = None) -> bool:
-        operators = cls.get_operator_list(section)
-        operators_id = [operator.get_tg_id() for operator in operators]
-        return tg_id in operators_id
+        return operator_directory.is_operator(tg_id, section)
 
     @classmethod
     def get_operator(cls, tg_id: int, section: Section) -> Operator:
-        operators = cls.get_operator_list(section)
-        for operator in operators:
-            if operator.get_tg_id() == tg_id:
-                return operator
-
+        return operator_directory.get_operator(tg_id, section)
 
-    def __init__(self, operator_id: int):
+    def __init__(self, operator_id: int, operator_data: OperatorData = None):
+        self.operator_data = operator_data or OperatorData(operator_id)
         super(Operator, self).__init__(key=operator_id)
-        self.operator_data = OperatorData(operator_id)
 
     def get_tg_id(self) -> int:
         return self.operator_data.get_tg_id()
@@ -118,7 +173,75 @@ class Operator(CacheMixin):
         pass
 
 
+class OperatorDirectory:
+    """All operators indexed by (tg_id, Section)
+
+    Loaded with one query, reloaded after Operator.new/Operator.delete
+    and when older than ttl (operators could be changed by another
+    process). Checks and lookups do not touch the database.
+    """
+
+    def __init__(self, ttl: float = OPERATOR_DIRECTORY_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._by_key = {}  # (tg_id, Section) -> Operator
+        self._by_section = {}  # Section -> tuple of Operators
+        self._by_tg_id = {}  # tg_id -> tuple of Operators
+        self._all = ()
+
+    def reload(self) -> None:
+        by_key, by_section, by_tg_id = {}, {}, {}
+        operators = []
+        for operator_data in OperatorData.get_all_operators():
+            operator = Operator(
+                operator_data.get_operator_id(), operator_data)
+            operators.append(operator)
+            by_key[(operator.get_tg_id(), operator.get_section())] = operator
+            by_section.setdefault(operator.get_section(), []).append(operator)
+            by_tg_id.setdefault(operator.get_tg_id(), []).append(operator)
+        with self._lock:
+            self._by_key = by_key
+            self._by_section = {
+                section: tuple(section_operators)
+                for section, section_operators in by_section.items()}
+            self._by_tg_id = {
+                tg_id: tuple(tg_operators)
+                for tg_id, tg_operators in by_tg_id.items()}
+            self._all = tuple(operators)
+            self._loaded_at = time.monotonic()
+        log.info(f'operator directory loaded: {len(operators)} operators')
+
+    def _ensure_loaded(self) -> None:
+        loaded_at = self._loaded_at
+        if (loaded_at is None
+                or (self.ttl is not None
+                    and time.monotonic() - loaded_at > self.ttl)):
+            self.reload()
+
+    def get_operator(self, tg_id: int, section: Section) -> Operator:
+        self._ensure_loaded()
+        return self._by_key.get((int(tg_id), section))
+
+    def is_operator(self, tg_id: int, section: Section = None) -> bool:
+        self._ensure_loaded()
+        if section is None:
+            return int(tg_id) in self._by_tg_id
+        return (int(tg_id), section) in self._by_key
+
+    def get_operator_list(self, section: Section = None) -> tuple[Operator]:
+        self._ensure_loaded()
+        if section is None:
+            return self._all
+        return self._by_section.get(section, ())
+
+
+operator_directory = OperatorDirectory()
+
+
 class Service(CacheMixin):
+    cache_capacity = SERVICE_CACHE_SIZE
+
     @classmethod
     def new(cls,
             tg_id: int,
@@ -132,10 +255,29 @@ class Service(CacheMixin):
         service_ids = ServiceData.get_service_id_list(tg_id)
         return (Service.get(service_id) for service_id in service_ids)
 
-    def __init__(self, service_id: int):
-        super(Service, self).__init__(key=service_id)
+    @classmethod
+    def get_actual(cls, service_id: int) -> Service:
+        """Service from cache with reloaded data"""
+        service = cls.get(service_id)
+        service.refresh()
+        return service
+
+    def __init__(self, service_id: int, service_data: ServiceData = None):
         self.service_id = service_id
-        self.service_data = ServiceData(service_id)
+        self.service_data = service_data or ServiceData(service_id)
+        super(Service, self).__init__(key=service_id)
+
+    def refresh(self) -> None:
+        """Reload all data of the service with one query"""
+        self.service_data.refresh()
+
+    def invalidate(self) -> None:
+        """Data of the service will be reloaded on next read"""
+        self.service_data.invalidate()
+
+    def data_changed(self) -> None:
+        """Other cached objects of this service have stale data now"""
+        self.invalidate_cache(self.service_id, keep=self)
 
     def get_service_id(self) -> int:
         return self.service_id
@@ -156,6 +298,7 @@ class Service(CacheMixin):
             f'{self.service_id} {payment_photo}'
             ))
         self.service_data.update_payment_photo(payment_photo)
+        self.data_changed()
 
     def is_paid(self) -> bool:
         return self.service_data.is_paid()
@@ -163,10 +306,12 @@ class Service(CacheMixin):
     def confirm_payment(self) -> None:
         log.info(f'confirm_payment for service: {self.service_id}')
         self.service_data.mark_paid()
+        self.data_changed()
 
     def cancel_payment(self) -> None:
         log.info(f'cancel_payment for service: {self.service_id}')
         self.service_data.mark_unpaid()
+        self.data_changed()
 
     def get_executor(self) -> Operator:
         operator_id = self.service_data.get_service_executor()
@@ -182,20 +327,23 @@ class Service(CacheMixin):
         else:
             return '---'
 
-    def change_executor(self, new_executor: Operator) -> None:
-        log.info(f'new operator for service: {self.service_id}')
-        self.service_data.change_service_executor(
-            new_operator_id=new_executor.get_operator_id()
+    def claim(self, operator: Operator) -> Operator:
+        """Makes the operator the executor if nobody has taken the service
+
+        Returns the executor: the operator if the claim won, the one who
+        took the service first if not. Concurrent claims have one winner.
+        """
+        executor_id = self.service_data.claim_service(
+            operator_id=operator.get_operator_id()
         )
+        log.info(f'service {self.service_id} claimed by: {executor_id}')
+        self.data_changed()
+        return Operator.get(executor_id)
 
 
 class Meeting():
-    def __init__(self, service_id: int):
-        self.meeting_data = MeetingData(service_id)
-
-    def set_time(self, time_for_meeting: datetime):
-        log.info(f'set_time: {time_for_meeting}')
-        self.meeting_data.set_time(time_for_meeting)
+    def __init__(self, service_id: int, service_data: ServiceData = None):
+        self.meeting_data = MeetingData(service_id, service_data)
 
     def get_time(self) -> datetime:
         """return datetime in clien timezone"""
@@ -212,29 +360,241 @@ class Meeting():
         else:
             return '--- | ---'
 
-    def set_place(self, place: Place):
-        log.info(f'set_place: {place.name}')
-        self.meeting_data.set_place(
-            address=place.address
-        )
-
     def get_place_address(self) -> str:
         return self.meeting_data.get_address()
 
-    def get_time_slots():
+    def request_meeting(self, place: Place, time_for_meeting: datetime):
+        """Place and time of day chosen by the customer, the day is
+        booked later by the operator
+        """
+        log.info(f'request_meeting: {place.name} {time_for_meeting}')
+        self.meeting_data.set_request(
+            address=place.address,
+            time=time_for_meeting
+        )
+        self.data_changed()
+
+    def data_changed(self) -> None:
         pass
 
+    @staticmethod
+    def get_scheduled_meetings() -> List[tuple]:
+        """(service_id, meeting_time) of upcoming meetings"""
+        return MeetingData.get_scheduled_meetings()
+
+    @staticmethod
+    def get_time_slots(
+            place: Place,
+            operator: Operator = None,
+            slot_times: tuple = None,
+            days: int = MEETING_DAYS_AHEAD,
+            service_id: int = None) -> List[datetime]:
+        """Free slots of the place on the next days in client timezone
+
+        A slot is free if the place and the operator have room in it.
+        slot_times: times of day to offer, all times of the place if None.
+        The meeting of service_id does not take room.
+        """
+        client_timezone = timezone(CLIENT_TIMEZONE_NAME)
+        today = datetime.now(client_timezone).date()
+        if slot_times is None:
+            slot_times = place.slot_times
+        slots = [
+            client_timezone.localize(datetime.combine(
+                today + timedelta(days=day), slot_time))
+            for day in range(1, days + 1)
+            for slot_time in sorted(slot_times)
+        ]
+        if not slots:
+            return []
+        operator_id = operator.get_operator_id() if operator else None
+        booked = MeetingData.get_booked_slots(
+            address=place.address,
+            operator_id=operator_id,
+            start=slots[0],
+            end=slots[-1] + timedelta(minutes=1),
+            service_id=service_id)
+        free_slots = []
+        for slot in slots:
+            place_meetings, operator_meetings = booked.get(slot, (0, 0))
+            if place_meetings < place.capacity \
+                    and operator_meetings < MEETING_OPERATOR_CAPACITY:
+                free_slots.append(slot)
+        return free_slots
+
+    def book_time_slot(
+            self,
+            place: Place,
+            slot_time: datetime,
+            operator: Operator = None) -> bool:
+        """Sets the place and the time of the meeting if the slot is
+        free, False if it is taken
+        """
+        booked = self.meeting_data.book_slot(
+            address=place.address,
+            slot_time=slot_time,
+            operator_id=operator.get_operator_id() if operator else None,
+            place_capacity=place.capacity,
+            operator_capacity=MEETING_OPERATOR_CAPACITY)
+        log.info(f'book_time_slot: {place.name} {slot_time} {booked}')
+        if booked:
+            self.data_changed()
+        return booked
+
+
+class ProductService(Service, Meeting):
+    """Service of a product
+
+    Subclasses with their data class are made by Product from its
+    documents, one per product.
+    """
+    product = None  # Product
+    data_class = ServiceData
+
+    @classmethod
+    def for_product(cls, product: Product) -> type:
+        data_class = ServiceData.for_product(
+            product_key=product.uniq_key,
+            product_table=product.table_name,
+            form_columns=product.get_form_columns(),
+            document_columns={
+                document.name_in_db: document.complete_in_db
+                for document in product.get_documents(DocumentType.FILE)}
+        )
+        class_name = data_class.__name__[:-len('Data')]
+        return type(class_name, (cls,), {
+            'product': product,
+            'data_class': data_class,
+            '__doc__': f'Продуктовый сервис для {product.product_name}',
+        })
+
+    @classmethod
+    def new(cls, tg_id: int, customer_name: str, request_data: date):
+        log.info(f'new {cls.__name__} from: {tg_id}')
+        service_id = cls.data_class.new_service(
+            tg_id=tg_id,
+            customer_name=customer_name,
+            request_date=request_data
+        )
+        return cls(service_id)
+
+    @classmethod
+    def does_service_exist(cls, service_id: int) -> bool:
+        return cls.data_class.does_service_exist(service_id)
+
+    @classmethod
+    def get_uncompleted_services(
+            cls, tg_id: int, customer_name: str = None) -> List:
+        services_data = cls.data_class.get_uncompleted_services(
+            tg_id=tg_id,
+            customer_name=customer_name
+        )
+        return [
+            cls(service_data.get_service_id(), service_data)
+            for service_data in services_data
+        ]
+
+    @classmethod
+    def get_service_by_customer_name(
+            cls, tg_id: int, customer_name: str, request_data: date = None):
+        services = cls.get_uncompleted_services(tg_id, customer_name)
+        if services:
+            return services[0]
+        return cls.new(tg_id, customer_name, request_data)
+
+    def __init__(self, service_id: int, service_data: ServiceData = None):
+        service_data = service_data or self.data_class(service_id)
+        Meeting.__init__(self, service_id, service_data)
+        Service.__init__(self, service_id, service_data)  # cached last
+
+    def is_service_ready(self) -> bool:
+        """Paid and every document of the product is complete"""
+        if not self.is_paid():
+            return False
+        return all(self.is_document_complete(document)
+                   for document in self.product.list_of_documents)
+
+    def is_document_complete(self, document: Document) -> bool:
+        if document.document_type is DocumentType.FORM:
+            return self.service_data.is_form_complete()
+        if document.document_type is DocumentType.MEETING:
+            return self.did_customer_chose_meeting()
+        return self.service_data.is_document_complete(document.name_in_db)
+
+    def put_data_to_field(self, name_field_in_db: str, value: Any) -> None:
+        log.info(f'{name_field_in_db}: {value}')
+        self.service_data.put_data_to_field(
+            field_name=name_field_in_db,
+            value=value
+        )
+        self.data_changed()
+
+    def put_data_to_fields(self, values: dict) -> None:
+        log.info(f'fields of {self.service_id}: {values}')
+        self.service_data.put_data_to_fields(values)
+        self.data_changed()
+
+    def submit_form(self, values: dict) -> None:
+        log.info(f'submit_form {self.service_id}: {values}')
+        self.service_data.submit_form(values)
+        self.data_changed()
+
+    def form_complete(self) -> None:
+        log.info(f'form_complete: {self.service_id}')
+        self.service_data.form_complete()
+        self.data_changed()
+
+    def form_incomplete(self) -> None:
+        log.info(f'form_incomplete: {self.service_id}')
+        self.service_data.form_incomplete()
+        self.data_changed()
+
+    def get_form(self) -> dict:
+        return self.service_data.get_form()
+
+    def put_document(self, document: Document, file_id: str) -> None:
+        """Save file of the document and mark it complete"""
+        log.info(f'new {document.name_in_db} for service '
+                 f'{self.service_id}: {file_id}')
+        self.service_data.put_document(document.name_in_db, file_id)
+        self.data_changed()
+
+    def document_incomplete(self, document: Document) -> None:
+        log.info(f'{document.name_in_db} incomplete: {self.service_id}')
+        self.service_data.document_incomplete(document.name_in_db)
+        self.data_changed()
+
+    def get_document(self, document: Document) -> str:
+        return self.service_data.get_document(document.name_in_db)
+
+    def did_customer_chose_meeting(self) -> bool:
+        if self.get_place_address():
+            if self.get_time():
+                return True
+        return False
+
 
 class Place:
+    """Place of meetings
+
+    slot_times: times of day of meetings, 'HH:MM' in client timezone,
+    capacity: meetings in one slot
+    """
     def __init__(
             self,
             name: str,
             address: str,
-            google_map_link: str) -> Place:
+            google_map_link: str,
+            slot_times: Tuple[str, ...] = (),
+            capacity: int = MEETING_PLACE_CAPACITY) -> Place:
 
         self.name = name
         self.address = address
         self.google_map_link = google_map_link
+        self.slot_times = tuple(
+            datetime.strptime(slot_time, '%H:%M').time()
+            for slot_time in slot_times)
+        self.capacity = capacity
 
 
 # -------------------------------------------------------------- PRODUCT STAFF
@@ -273,13 +633,65 @@ class ProductNotFound(Exception):
     """Product do not exist or uniq_key is wrong"""
 
 
+class DocumentType(Enum):
+    FORM = 'FORM'  # answers to Product.form
+    FILE = 'FILE'  # photo or file sent by the customer
+    MEETING = 'MEETING'  # place and time chosen by the customer
+
+
 class Document:
-    def __init__(self, document_name: str) -> None:
+    def __init__(
+            self,
+            document_name: str,
+            document_type: DocumentType = DocumentType.FILE,
+            name_in_db: str = None,
+            complete_in_db: str = None,
+            waiting_text: str = None,
+            getting_text: str = None) -> None:
+        """name_in_db and complete_in_db: columns of the product table
+        with file_id and with the flag of the FILE document"""
         self.document_name = document_name
+        self.document_type = document_type
+        self.name_in_db = name_in_db
+        self.complete_in_db = complete_in_db
+        self.waiting_text = waiting_text
+        self.getting_text = getting_text
 
 
 class Product:
+    """Registry of products
+
+    Indexes are rebuilt when a product is made (at import) and are
+    read without copying on the hot path, do not change them.
+    """
     _all_products = {}
+    _products = ()
+    _product_keys = ()
+    _product_names = ()  # in order of products, for keyboards
+    _products_by_name = MappingProxyType({})
+    _document_names = ()
+    # product of a service never changes, so entries do not expire
+    _service_product_keys = LRUCache(SERVICE_PRODUCT_CACHE_SIZE)
+
+    @classmethod
+    def _register(cls, product: Product) -> None:
+        if product.uniq_key in Product._all_products:
+            raise ValueError(f'product {product.uniq_key} is already set')
+        if product.product_name in Product._products_by_name:
+            raise ValueError(
+                f'product name {product.product_name} is already set')
+        Product._all_products[product.uniq_key] = product
+        products = tuple(Product._all_products.values())
+        Product._products = products
+        Product._product_keys = tuple(Product._all_products)
+        Product._product_names = tuple(
+            product.product_name for product in products)
+        Product._products_by_name = MappingProxyType(
+            {product.product_name: product for product in products})
+        Product._document_names = tuple(dict.fromkeys(
+            name
+            for product in products
+            for name in product.get_document_names()))
 
     @classmethod
     def get_product(cls, uniq_key: str) -> Product:
@@ -289,26 +701,42 @@ class Product:
             raise ProductNotFound
 
     @classmethod
-    def get_all_products(cls) -> List[Product]:
-        return [product for key, product in cls._all_products.items()]
+    def get_service_product(cls, service_id: int) -> Product:
+        """Product of the service: from cache or by one query"""
+        uniq_key = cls._service_product_keys.get(service_id)
+        if uniq_key is None:
+            uniq_key = ServiceData.get_product_key_by_id(service_id)
+            if uniq_key is None:
+                raise ProductNotFound
+            cls._service_product_keys.put(service_id, uniq_key)
+        return cls.get_product(uniq_key)
 
     @classmethod
-    def get_all_product_keys(cls) -> List[str]:
-        return [key for key, product in cls._all_products.items()]
+    def get_all_products(cls) -> Tuple[Product, ...]:
+        return cls._products
 
     @classmethod
-    def get_all_product_names(cls) -> List[str]:
-        return [
-            product.product_name
-            for key, product in cls._all_products.items()
-        ]
+    def get_all_product_keys(cls) -> Tuple[str, ...]:
+        return cls._product_keys
+
+    @classmethod
+    def get_all_product_names(cls) -> Tuple[str, ...]:
+        return cls._product_names
+
+    @classmethod
+    def get_all_document_names(cls) -> Tuple[str, ...]:
+        return cls._document_names
+
+    @classmethod
+    def is_product_name(cls, text: str) -> bool:
+        return text in cls._products_by_name
 
     @classmethod
     def get_product_by_name(cls, product_name: str) -> Product:
-        for key, product in cls._all_products.items():
-            if product.product_name == product_name:
-                return product
-        raise ProductNotFound
+        product = cls._products_by_name.get(product_name)
+        if product is None:
+            raise ProductNotFound
+        return product
 
     def __init__(
             self,
@@ -319,8 +747,11 @@ class Product:
             list_of_documents: List[Document],
             preparation_description: str,
             list_of_places: List[Place],
-            service_class,
-            operator_section: Section) -> Product:
+            operator_section: Section,
+            table_name: str,
+            form: Type[Enum] = None) -> Product:
+        """Service class of the product with its queries is made from
+        documents, form (Enum of FormField) and table_name"""
 
         self.product_name = product_name
         self.uniq_key = uniq_key
@@ -331,15 +762,31 @@ class Product:
         self.preparation_description = preparation_description
 
         self.list_of_places = list_of_places
-        self.service_class = service_class
-        service_class.product = self
         self.operator_section = operator_section
+        self.table_name = table_name
+        self.form = form
+        self.service_class = ProductService.for_product(self)
 
-        self._all_products[uniq_key] = self
+        self._register(self)
 
     def get_document_names(self) -> List[str]:
         return [doc.document_name for doc in self.list_of_documents]
 
+    def get_documents(self, document_type: DocumentType) -> List[Document]:
+        return [doc for doc in self.list_of_documents
+                if doc.document_type is document_type]
+
+    def find_document(self, document_name: str) -> Document:
+        for document in self.list_of_documents:
+            if document.document_name == document_name:
+                return document
+        return None
+
+    def get_form_columns(self) -> Tuple[str, ...]:
+        if self.form is None:
+            return ()
+        return tuple(field.value.name_in_db for field in self.form)
+
     def find_place(
             self,
             place_name: str = None,
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Dict, Hashable
+
+
+class LRUCache:
+    """Thread safe cache with capacity limit and time to live
+
+    The least recently used entry is evicted when capacity is reached,
+    entries older than ttl seconds are treated as missing.
+    ttl=None means entries never expire.
+    """
+
+    def __init__(self, capacity: int, ttl: float = None) -> None:
+        if capacity < 1:
+            raise ValueError('capacity should be positive')
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Value without touching order and counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._stats['invalidations'] += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['capacity'] = self.capacity
+        return stats
@@ -0,0 +1,161 @@
+"""Compact callback_data of inline buttons
+
+Telegram limits callback_data to 64 bytes, while questions and
+answers of buttons are Russian texts, place names and dates. The
+codec puts ids of the labels into callback_data instead:
+
+    b:<question id>:<answer id>:<data>      ids in base 36
+
+Ids are kept in the callback_label table and loaded by every process
+at startup, they never change, so buttons sent before a restart or by
+another process keep working. Labels may be of any length and contain
+':'. callback_data of the legacy format (btn:question:answer:data) is
+still parsed.
+
+new() and parse() do not touch the database, they run in the event
+loop. Ids made by another process after startup are read by
+parse_async() through db_call.
+"""
+from __future__ import annotations
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram.utils.callback_data import CallbackData
+
+from cache import LRUCache
+from db_managing import CallbackLabelData
+from db_pool import db_call
+
+log = logging.getLogger('callback_codec')
+
+PREFIX = 'b'
+MAX_LENGTH = 64  # bytes, Telegram limit of callback_data
+ADD_ATTEMPTS = 3
+MISSING_IDS_CACHE_SIZE = 10_000  # ids not in the table, e.g. forged
+MISSING_IDS_TTL = 60  # seconds
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def to_base36(number: int) -> str:
+    digits = ''
+    while True:
+        number, digit = divmod(number, 36)
+        digits = DIGITS[digit] + digits
+        if not number:
+            return digits
+
+
+class UnknownLabel(ValueError):
+    """callback_data has ids which are not loaded"""
+
+    def __init__(self, callback_data: str, label_ids: List[int]) -> None:
+        super().__init__(f'unknown labels {label_ids}: {callback_data!r}')
+        self.label_ids = label_ids
+
+
+class CallbackCodec:
+    """Encodes and parses callback_data like CallbackData.new/parse
+
+    Call load() at startup with the labels of the routes and
+    add_labels() through db_call for dynamic labels before the keyboard
+    is made. A label without id is put in callback_data of the legacy
+    format.
+    """
+
+    def __init__(self, legacy: CallbackData) -> None:
+        self.legacy = legacy
+        self._ids: Dict[str, int] = {}
+        self._labels: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._missing_ids = LRUCache(MISSING_IDS_CACHE_SIZE, MISSING_IDS_TTL)
+
+    def _remember(self, rows: List[Tuple[int, str]]) -> None:
+        with self._lock:
+            for label_id, label in rows:
+                self._ids[label] = label_id
+                self._labels[label_id] = label
+
+    def load(self, labels: Iterable[str] = ()) -> None:
+        """Load all labels of the table and add the given ones"""
+        self._remember(CallbackLabelData.get_all_labels())
+        self.add_labels(labels)
+        log.info(f'callback labels loaded: {len(self._ids)}')
+
+    def add_labels(self, labels: Iterable[str]) -> None:
+        """Give ids to labels which have none, one query if any"""
+        missing = [label for label in dict.fromkeys(labels)
+                   if label not in self._ids]
+        for _ in range(ADD_ATTEMPTS):
+            if not missing:
+                return
+            # a label inserted by a concurrent transaction is returned
+            # by the next attempt
+            self._remember(CallbackLabelData.add_labels(missing))
+            missing = [label for label in missing if label not in self._ids]
+        if missing:
+            raise RuntimeError(f'no ids for callback labels {missing}')
+
+    def get_label_id(self, label: str) -> Optional[int]:
+        return self._ids.get(label)
+
+    def new(self, question: str, answer: str, data) -> str:
+        question_id = self._ids.get(str(question))
+        answer_id = self._ids.get(str(answer))
+        if question_id is None or answer_id is None:
+            log.warning(f'no ids for labels of button {question!r}: '
+                        f'{answer!r}, legacy callback_data')
+            return self.legacy.new(question=question, answer=answer,
+                                   data=data)
+        callback_data = (f'{PREFIX}:{to_base36(question_id)}:'
+                         f'{to_base36(answer_id)}:{data}')
+        if len(callback_data.encode()) > MAX_LENGTH:
+            raise ValueError(f'callback_data is longer than {MAX_LENGTH} '
+                             f'bytes: {callback_data!r}')
+        return callback_data
+
+    def parse(self, callback_data: str) -> Dict[str, str]:
+        """Dict of CallbackData.parse(), ValueError if it is not ours,
+        UnknownLabel if its ids are not loaded
+        """
+        prefix, _, rest = callback_data.partition(':')
+        if prefix == self.legacy.prefix:
+            return self.legacy.parse(callback_data)
+        if prefix != PREFIX:
+            raise ValueError(f'not a button: {callback_data!r}')
+        try:
+            question_id, answer_id, data = rest.split(':', 2)
+            label_ids = (int(question_id, 36), int(answer_id, 36))
+        except ValueError:
+            raise ValueError(f'broken button: {callback_data!r}')
+        question, answer = (self._labels.get(label_id)
+                            for label_id in label_ids)
+        if question is None or answer is None:
+            raise UnknownLabel(callback_data, [
+                label_id for label_id in label_ids
+                if label_id not in self._labels])
+        return {'@': PREFIX, 'question': question, 'answer': answer,
+                'data': data}
+
+    def load_ids(self, label_ids: List[int]) -> None:
+        """Read labels of ids made by another process after load(),
+        ids missing from the table are not read again for a while
+        """
+        label_ids = [label_id for label_id in label_ids
+                     if self._missing_ids.get(label_id) is None]
+        if not label_ids:
+            return
+        rows = CallbackLabelData.get_labels(label_ids)
+        self._remember(rows)
+        found = {label_id for label_id, _ in rows}
+        for label_id in label_ids:
+            if label_id not in found:
+                self._missing_ids.put(label_id, True)
+
+    async def parse_async(self, callback_data: str) -> Dict[str, str]:
+        """parse(), unknown ids are read through db_call"""
+        try:
+            return self.parse(callback_data)
+        except UnknownLabel as error:
+            await db_call(self.load_ids, error.label_ids)
+        return self.parse(callback_data)
@@ -0,0 +1,126 @@
+"""Routing of inline button callbacks by (question, answer)
+
+aiogram checks the filters of every callback handler in turn and
+button_cb.filter() parses callback_data again for each of them.
+CallbackRouter is one aiogram handler: it parses callback_data once
+and finds the handler with at most three dict lookups, in this order:
+(question, answer), question with any answer, answer with any
+question.
+"""
+from __future__ import annotations
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple, \
+    Union
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.handler import ctx_data, current_handler
+from aiogram.types import CallbackQuery
+from aiogram.utils.callback_data import CallbackData
+
+log = logging.getLogger('callback_routing')
+
+ANY = None  # question or answer of a route matching any value
+
+
+def _as_tuple(value: Union[str, Iterable[str], None]) -> tuple:
+    if value is ANY or isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+class CallbackRouter:
+    """Handlers of button_cb callbacks by question and answer
+
+    Handlers are called as handler(query, callback_data, state), like
+    handlers with button_cb.filter(). Process middlewares are triggered
+    again with the routed handler as current_handler, so they see its
+    name and not the name of the router.
+    """
+
+    def __init__(self, callback_data: CallbackData) -> None:
+        """callback_data: CallbackData or CallbackCodec, parses buttons"""
+        self.callback_data = callback_data
+        self._routes: Dict[Tuple[Optional[str], Optional[str]],
+                           Callable] = {}
+
+    def add_route(self,
+                  handler: Callable,
+                  question: Union[str, Iterable[str], None] = ANY,
+                  answer: Union[str, Iterable[str], None] = ANY) -> None:
+        """question and answer: a value, values or ANY"""
+        if question is ANY and answer is ANY:
+            raise ValueError(f'{handler.__name__}: route matches anything')
+        for route_question in _as_tuple(question):
+            for route_answer in _as_tuple(answer):
+                key = (route_question, route_answer)
+                routed = self._routes.get(key)
+                if routed is not None and routed is not handler:
+                    raise ValueError(
+                        f'{handler.__name__}: button {key} is already '
+                        f'routed to {routed.__name__}')
+                self._routes[key] = handler
+
+    def route(self,
+              question: Union[str, Iterable[str], None] = ANY,
+              answer: Union[str, Iterable[str], None] = ANY) -> Callable:
+        """Decorator of add_route()"""
+        def decorator(handler: Callable) -> Callable:
+            self.add_route(handler, question, answer)
+            return handler
+        return decorator
+
+    def resolve(self, question: str, answer: str) -> Optional[Callable]:
+        routes = self._routes
+        return (routes.get((question, answer))
+                or routes.get((question, ANY))
+                or routes.get((ANY, answer)))
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get_labels(self) -> Set[str]:
+        """Questions and answers of all routes"""
+        return {label for route in self._routes for label in route
+                if label is not ANY}
+
+    async def parse(self, data: str) -> dict:
+        """parse_async() of the codec if it has one, it may query the
+        database through db_call, parse() otherwise
+        """
+        parse_async = getattr(self.callback_data, 'parse_async', None)
+        if parse_async is not None:
+            return await parse_async(data)
+        return self.callback_data.parse(data)
+
+    async def check(self, query: CallbackQuery) -> Union[bool, dict]:
+        """aiogram filter: parses callback_data and finds the handler"""
+        if not query.data:
+            return False
+        try:
+            callback_data = await self.parse(query.data)
+        except ValueError:
+            return False
+        handler = self.resolve(
+            callback_data['question'], callback_data['answer'])
+        if handler is None:
+            log.warning(f'no route for callback {query.data!r}')
+            return False
+        return {'callback_data': callback_data, 'routed_handler': handler}
+
+    async def handle(self,
+                     query: CallbackQuery,
+                     callback_data: dict,
+                     routed_handler: Callable,
+                     state):
+        token = current_handler.set(routed_handler)
+        try:
+            await Dispatcher.get_current().middleware.trigger(
+                'process_callback_query', (query, ctx_data.get()))
+            return await routed_handler(
+                query=query, callback_data=callback_data, state=state)
+        finally:
+            current_handler.reset(token)
+
+    def register(self, dp: Dispatcher, state='*') -> None:
+        dp.register_callback_query_handler(
+            self.handle, self.check, state=state)
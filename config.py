@@ -10,3 +10,59 @@ ADMINS_TG = [98244574, ]
 CLIENT_TIMEZONE_NAME = 'Asia/Makassar'
 
 PAYMENT_DETAILS = '1234567'
+
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+DB_POOL_ACQUIRE_TIMEOUT = 10  # seconds
+DB_POOL_HEALTH_CHECK_INTERVAL = 60  # seconds of idle before SELECT 1
+DB_EXECUTOR_WORKERS = DB_POOL_MAX_SIZE  # threads for blocking db calls
+
+CACHE_TTL = 600  # seconds, objects in cache are reloaded after it
+TG_USER_CACHE_SIZE = 1000
+OPERATOR_CACHE_SIZE = 100
+SERVICE_CACHE_SIZE = 1000
+SERVICE_PRODUCT_CACHE_SIZE = 100_000  # service_id -> product key, never stale
+OPERATOR_DIRECTORY_TTL = 60  # seconds, reload to see other processes
+
+FSM_STORAGE = 'postgres'  # memory, postgres or redis
+FSM_STATE_TTL = 7 * 24 * 60 * 60  # seconds, abandoned sessions are removed
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+REDIS_DB = 0
+REDIS_PASSWORD = None
+
+SCHEDULER_DB_URL = (f'postgresql+psycopg2://{DB_USER}:{DB_PASS}'
+                    f'@{DB_HOST}:{DB_PORT}/{DB_NAME}')
+SCHEDULER_MISFIRE_GRACE_TIME = 60 * 60  # seconds, late reminders still go
+
+# Answers of a form are kept in FSM data and written in one UPDATE on
+# the last field. Answers of an abandoned form are written after timeout
+FORM_BATCH_MODE = True
+FORM_FLUSH_TIMEOUT = 30 * 60  # seconds
+
+TG_GLOBAL_RATE_LIMIT = 30  # messages per second for the whole bot
+TG_CHAT_RATE_LIMIT = 1  # messages per second in one chat
+TG_SEND_RETRIES = 3  # retries after flood control RetryAfter
+
+BOT_MODE = 'polling'  # polling or webhook
+WEBHOOK_HOST = 'https://example.com'  # public address seen by Telegram
+WEBHOOK_PATH = '/paperwork_bot/webhook'
+WEBHOOK_URL = WEBHOOK_HOST + WEBHOOK_PATH
+WEBHOOK_SECRET = None  # X-Telegram-Bot-Api-Secret-Token, None to skip
+WEBAPP_HOST = '127.0.0.1'  # where the server listens behind a proxy
+WEBAPP_PORT = 8080
+SHUTDOWN_DRAIN_TIMEOUT = 30  # seconds to finish updates in flight
+
+# Bot API address, None for api.telegram.org. For load tests point it
+# to benchmarks.fake_telegram, e.g. 'http://127.0.0.1:8081'
+TELEGRAM_API_SERVER = None
+
+SLOW_QUERY_THRESHOLD = 0.1  # seconds, slower queries are logged
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9100  # GET /metrics, None to switch off
+
+# Meetings are booked in slots: times of day of a place on the next days
+MEETING_DAYS_AHEAD = 3  # days offered to book, starting tomorrow
+MEETING_PLACE_CAPACITY = 4  # meetings in one slot of a place by default
+MEETING_OPERATOR_CAPACITY = 2  # meetings of one operator in one slot
@@ -1,18 +1,215 @@
+"""Applies migrations/NNN_name.sql which are not applied yet
+
+    python db_deploy.py           apply pending migrations
+    python db_deploy.py --status  list applied and pending migrations
+
+Applied versions are kept in schema_migrations. Every migration runs
+in its own transaction together with its schema_migrations row, so a
+failed migration leaves nothing behind and is retried on next deploy.
+
+A migration starting with the line
+
+    -- migrate:no-transaction
+
+runs statement by statement outside of a transaction, which CREATE
+INDEX CONCURRENTLY needs. Statements are split on ';' at the end of a
+line outside of $$ quotes. Such a migration may stop half way, write
+it so it can be run again (IF NOT EXISTS, and DROP INDEX IF EXISTS
+before CREATE INDEX CONCURRENTLY, because a failed build leaves an
+invalid index).
+
+Never edit a migration which is applied somewhere, add a new one.
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+from typing import List, NamedTuple
+
 import psycopg2
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT
-
-db_config = {'host': DB_HOST,
-             'dbname': DB_NAME,
-             'user': DB_USER,
-             'password': DB_PASS,
-             'port': DB_PORT}
-
-print('connection to database')
-connection = psycopg2.connect(**db_config)
-with connection.cursor() as cursor:
-    print('starting sql file')
-    cursor.execute(open("./migrations/001_init_tables.sql", "r").read())
-    print('end of sql file')
-connection.commit()
-connection.close()
-print('data base successfully deployed')
+
+from db_pool import db_config
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+NO_TRANSACTION = '-- migrate:no-transaction'
+# 001_init_tables.sql starts with DROP TABLE, on a database deployed
+# before schema_migrations existed it is recorded without running
+BASELINE_VERSION = '001'
+LOCK_ID = 4_711_001  # pg_advisory_lock, one deploy at a time
+
+CREATE_MIGRATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version varchar(32) PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now(),
+        duration_ms int NOT NULL
+    );'''
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    path: Path
+
+    def get_sql(self) -> str:
+        return self.path.read_text()
+
+    def is_transactional(self) -> bool:
+        return not self.get_sql().lstrip().startswith(NO_TRANSACTION)
+
+
+class MigrationError(Exception):
+    """Migration failed, the message names it"""
+
+
+def find_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for path in sorted(directory.glob('*.sql')):
+        version, _, name = path.stem.partition('_')
+        if not version.isdigit():
+            raise MigrationError(f'{path.name}: name must be NNN_name.sql')
+        migrations.append(Migration(version, name, path))
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f'two migrations with one version: {versions}')
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Statements of a no-transaction migration, comments are kept"""
+    statements = []
+    lines = []
+    quoted = False  # inside $$ of a function or DO block
+    for line in sql.splitlines():
+        lines.append(line)
+        if line.count('$$') % 2:
+            quoted = not quoted
+        if not quoted and line.rstrip().endswith(';'):
+            statements.append('\n'.join(lines))
+            lines = []
+    statements.append('\n'.join(lines))
+    return [statement.strip() for statement in statements
+            if _strip_comments(statement)]
+
+
+def _strip_comments(sql: str) -> str:
+    return '\n'.join(line for line in sql.splitlines()
+                     if not line.strip().startswith('--')).strip()
+
+
+def get_applied_versions(connection) -> set:
+    with connection, connection.cursor() as cursor:
+        cursor.execute('SELECT version FROM schema_migrations;')
+        return {version for version, in cursor.fetchall()}
+
+
+def _record(cursor, migration: Migration, duration_ms: int) -> None:
+    cursor.execute(
+        '''INSERT INTO schema_migrations (version, name, duration_ms)
+            VALUES (%s, %s, %s);''',
+        (migration.version, migration.name, duration_ms))
+
+
+def ensure_migrations_table(connection,
+                            migrations: List[Migration]) -> None:
+    """Create schema_migrations, baseline a database deployed before it"""
+    with connection, connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_migrations');")
+        exists, = cursor.fetchone()
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        if exists:
+            return
+        cursor.execute("SELECT to_regclass('service');")
+        deployed, = cursor.fetchone()
+        if not deployed:
+            return
+        for migration in migrations:
+            if migration.version <= BASELINE_VERSION:
+                print(f'baseline {migration.path.name}: tables exist, '
+                      'recorded without running')
+                _record(cursor, migration, 0)
+
+
+def apply_migration(connection, migration: Migration) -> int:
+    """Run migration and record it, returns duration in ms"""
+    started = time.perf_counter()
+    try:
+        if migration.is_transactional():
+            with connection, connection.cursor() as cursor:
+                cursor.execute(migration.get_sql())
+                duration_ms = _get_duration_ms(started)
+                _record(cursor, migration, duration_ms)
+        else:
+            connection.autocommit = True
+            try:
+                with connection.cursor() as cursor:
+                    for statement in split_statements(migration.get_sql()):
+                        cursor.execute(statement)
+                    duration_ms = _get_duration_ms(started)
+                    _record(cursor, migration, duration_ms)
+            finally:
+                connection.autocommit = False
+    except psycopg2.Error as error:
+        raise MigrationError(
+            f'{migration.path.name} failed: {error}') from error
+    return duration_ms
+
+
+def _get_duration_ms(started: float) -> int:
+    return round((time.perf_counter() - started) * 1000)
+
+
+def deploy(connection, migrations: List[Migration]) -> int:
+    """Apply pending migrations in order, returns how many were applied"""
+    applied = get_applied_versions(connection)
+    pending = [migration for migration in migrations
+               if migration.version not in applied]
+    for migration in pending:
+        mode = '' if migration.is_transactional() else ' (no transaction)'
+        print(f'applying {migration.path.name}{mode}')
+        duration_ms = apply_migration(connection, migration)
+        print(f'applied {migration.path.name} in {duration_ms} ms')
+    return len(pending)
+
+
+def print_status(connection, migrations: List[Migration]) -> None:
+    with connection, connection.cursor() as cursor:
+        cursor.execute('''SELECT version, applied_at, duration_ms
+                            FROM schema_migrations;''')
+        applied = {version: (applied_at, duration_ms)
+                   for version, applied_at, duration_ms in cursor.fetchall()}
+    for migration in migrations:
+        if migration.version in applied:
+            applied_at, duration_ms = applied[migration.version]
+            print(f'applied  {migration.path.name} at '
+                  f'{applied_at:%Y-%m-%d %H:%M:%S} in {duration_ms} ms')
+        else:
+            print(f'pending  {migration.path.name}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--status', action='store_true',
+                        help='list migrations, apply nothing')
+    args = parser.parse_args()
+
+    migrations = find_migrations()
+    print('connection to database')
+    connection = psycopg2.connect(**db_config)
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s);', (LOCK_ID,))
+        ensure_migrations_table(connection, migrations)
+        if args.status:
+            print_status(connection, migrations)
+            return
+        count = deploy(connection, migrations)
+        print(f'data base successfully deployed, {count} migrations applied')
+    except MigrationError as error:
+        sys.exit(str(error))
+    finally:
+        connection.close()  # releases the advisory lock
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,10 @@
+from __future__ import annotations
 from datetime import date, datetime
 import psycopg2
-from typing import List
+from psycopg2 import sql
+from typing import Any, Dict, List, Tuple
 
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT
-
-db_config = {'host': DB_HOST,
-             'dbname': DB_NAME,
-             'user': DB_USER,
-             'password': DB_PASS,
-             'port': DB_PORT}
+from db_pool import get_cursor
 
 
 class UserNotFound(Exception):
@@ -27,19 +23,20 @@ class FieldNotFound(Exception):
     pass
 
 
+class ServiceNotFound(Exception):
+    pass
+
+
 class TgUserData:
     def __init__(self, tg_id: int):
         self._tg_id = tg_id
 
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             select_script = '''SELECT tg_username
                                 FROM tg_user
                                 WHERE tg_id = %s;'''
             cursor.execute(select_script, (tg_id,))
             select_username, = cursor.fetchone()
-        connection.commit()
-        connection.close()
 
         self._tg_username = select_username
 
@@ -51,8 +48,7 @@ class TgUserData:
 
     @staticmethod
     def new_tg_user(tg_id, tg_username) -> int:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             insert_values = (tg_id, tg_username)
             insert_script = '''
                 INSERT INTO tg_user (tg_id, tg_username)
@@ -61,14 +57,11 @@ class TgUserData:
                 DO UPDATE
                 SET tg_username = EXCLUDED.tg_username;'''
             cursor.execute(insert_script, insert_values)
-        connection.commit()
-        connection.close()
         return tg_id
 
     @staticmethod
     def does_tg_user_exist(tg_id) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             select_script = '''
             SELECT exists(
                 SELECT tg_id
@@ -76,24 +69,22 @@ class TgUserData:
                 WHERE tg_id = %s);'''
             cursor.execute(select_script, (tg_id,))
             exists, = cursor.fetchone()
-        connection.commit()
-        connection.close()
         return exists
 
 
 class OperatorData:
-    def __init__(self, operator_id: int):
+    def __init__(self, operator_id: int, row: tuple = None):
+        """row: (tg_id, name, operation_section) if already loaded"""
         self._operator_id = operator_id
 
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''SELECT tg_id, name, operation_section
-                                FROM operator
-                                WHERE operator_id = %s;'''
-            cursor.execute(select_script, (operator_id,))
-            tg_id, name, operation_section = cursor.fetchone()
-        connection.commit()
-        connection.close()
+        if row is None:
+            with get_cursor() as cursor:
+                select_script = '''SELECT tg_id, name, operation_section
+                                    FROM operator
+                                    WHERE operator_id = %s;'''
+                cursor.execute(select_script, (operator_id,))
+                row = cursor.fetchone()
+        tg_id, name, operation_section = row
 
         self._tg_id = tg_id
         self._name = name
@@ -114,8 +105,7 @@ class OperatorData:
     @staticmethod
     def new_operator(tg_id: int, section: str, name: str) -> int:
         if TgUserData.does_tg_user_exist(tg_id):
-            connection = psycopg2.connect(**db_config)
-            with connection.cursor() as cursor:
+            with get_cursor() as cursor:
                 insert_values = (tg_id, section, name)
                 insert_script = '''
                     INSERT INTO operator (tg_id, operation_section, name)
@@ -126,16 +116,13 @@ class OperatorData:
                     operator_id, = cursor.fetchone()
                 except psycopg2.errors.UniqueViolation:
                     raise OperatorAlreadySet
-            connection.commit()
-            connection.close()
         else:
             raise UserNotFound
         return operator_id
 
     @staticmethod
     def does_operator_exist(operator_id) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             select_script = '''
             SELECT exists(
                 SELECT operator_id
@@ -143,28 +130,33 @@ class OperatorData:
                 WHERE operator_id = %s);'''
             cursor.execute(select_script, (operator_id,))
             exists, = cursor.fetchone()
-        connection.commit()
-        connection.close()
         return exists
 
     @staticmethod
     def delete_operator(operator_id: int) -> int:
         if OperatorData.does_operator_exist(operator_id):
-            connection = psycopg2.connect(**db_config)
-            with connection.cursor() as cursor:
+            with get_cursor() as cursor:
                 select_script = '''DELETE FROM operator
                                     WHERE operator_id = %s;'''
                 cursor.execute(select_script, (operator_id,))
-            connection.commit()
-            connection.close()
         else:
             raise OperatorNotFound
         return operator_id
 
+    @staticmethod
+    def get_all_operators() -> List[OperatorData]:
+        with get_cursor() as cursor:
+            select_script = '''
+                SELECT operator_id, tg_id, name, operation_section
+                FROM operator
+                ORDER BY operator_id;'''
+            cursor.execute(select_script)
+            rows = cursor.fetchall()
+        return [OperatorData(row[0], row[1:]) for row in rows]
+
     @staticmethod
     def get_operator_id_list(section: str = None) -> List[int]:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             if section:
                 select_script = '''SELECT operator_id FROM operator
                                     WHERE operation_section = %s;'''
@@ -176,166 +168,395 @@ class OperatorData:
                 id_list = cursor.fetchall()
             except TypeError:
                 id_list = []
-        connection.commit()
-        connection.close()
         return [id_tuple[0] for id_tuple in id_list]
 
 
 class ServiceData:
-    def __init__(self, service_id: int):
+    """Data of one service
+
+    All columns of the service, its meeting and its product table are
+    loaded by one query into a snapshot. Getters read the snapshot,
+    setters write to the database and update the snapshot. Use
+    refresh() to reload it or invalidate() to reload on next read.
+
+    Columns of the product table are written by _update_product(),
+    answers of the form only by put_data_to_fields(), which accepts
+    _form_columns only.
+
+    Data classes of products are made by for_product().
+    """
+    _service_columns = ('user_tg_id', 'customer_name', 'request_date',
+                        'payment_photo', 'is_paid', 'service_executor',
+                        'product_key')
+    _meeting_columns = ('meeting_time', 'meeting_address')
+    _product_key = None  # uniq_key of the product in service.product_key
+    _product_table = None
+    _form_columns = ()
+    _document_columns = {}  # file column -> its is_*_complete column
+    _product_columns = ()
+
+    @classmethod
+    def for_product(cls,
+                    product_key: str,
+                    product_table: str,
+                    form_columns: Tuple[str, ...],
+                    document_columns: Dict[str, str]) -> type:
+        """Data class of a product, its queries are built here once"""
+        product_columns = tuple(form_columns)
+        if form_columns:
+            product_columns += ('is_form_complete',)
+        for column, complete_column in document_columns.items():
+            product_columns += (column, complete_column)
+        class_name = ''.join(
+            part.title() for part in product_key.split('_')) + 'ServiceData'
+        data_class = type(class_name, (cls,), {
+            '_product_key': product_key,
+            '_product_table': product_table,
+            '_form_columns': tuple(form_columns),
+            '_document_columns': dict(document_columns),
+            '_product_columns': product_columns,
+        })
+        data_class._get_snapshot_script()
+        data_class._get_insert_script()
+        data_class._get_exists_script()
+        return data_class
+
+    def __init__(self, service_id: int, snapshot: dict = None):
         self._service_id = service_id
+        self._snapshot = snapshot
+        if snapshot is None:
+            self.refresh()
 
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT user_tg_id, request_date
-                FROM service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (service_id,))
-            user_tg_id, request_date = cursor.fetchone()
-        connection.commit()
-        connection.close()
+    @classmethod
+    def _get_snapshot_columns(cls) -> tuple:
+        return (cls._service_columns + cls._meeting_columns
+                + cls._product_columns)
+
+    @classmethod
+    def _get_snapshot_script(cls) -> str:
+        """SELECT of the snapshot without WHERE, built once per class"""
+        if '_snapshot_script' not in cls.__dict__:
+            columns = (
+                [f's.{column}' for column in cls._service_columns]
+                + [f'm.{column}' for column in cls._meeting_columns]
+                + [f'p.{column}' for column in cls._product_columns])
+            script = (
+                f'SELECT s.service_id, {", ".join(columns)} '
+                'FROM service s '
+                'LEFT JOIN meeting m ON m.service_id = s.service_id ')
+            if cls._product_table:
+                script += (f'JOIN {cls._product_table} p '
+                           'ON p.service_id = s.service_id ')
+            cls._snapshot_script = script
+        return cls._snapshot_script
+
+    @classmethod
+    def _from_row(cls, row: tuple) -> ServiceData:
+        service_id, *values = row
+        return cls(service_id, snapshot=dict(
+            zip(cls._get_snapshot_columns(), values)))
+
+    def refresh(self) -> None:
+        """Reload snapshot from the database"""
+        with get_cursor() as cursor:
+            select_script = (self._get_snapshot_script()
+                             + 'WHERE s.service_id = %s;')
+            cursor.execute(select_script, (self._service_id,))
+            row = cursor.fetchone()
+        if row is None:
+            raise ServiceNotFound
+        self._snapshot = dict(zip(self._get_snapshot_columns(), row[1:]))
+
+    def invalidate(self) -> None:
+        """Forget snapshot, next read will reload it"""
+        self._snapshot = None
+
+    def _get(self, column: str) -> Any:
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot[column]
+
+    def _update_snapshot(self, **values) -> None:
+        if self._snapshot is not None:
+            self._snapshot.update(values)
+
+    @classmethod
+    def _get_update_script(cls, columns: Tuple[str, ...],
+                           cursor) -> str:
+        """UPDATE of the product table, built once per set of columns"""
+        if '_update_scripts' not in cls.__dict__:
+            cls._update_scripts = {}
+        script = cls._update_scripts.get(columns)
+        if script is None:
+            script = sql.SQL(
+                'UPDATE {table} SET {values} WHERE service_id = %s;'
+            ).format(
+                table=sql.Identifier(cls._product_table),
+                values=sql.SQL(', ').join(
+                    sql.SQL('{} = %s').format(sql.Identifier(column))
+                    for column in columns)
+            ).as_string(cursor)
+            cls._update_scripts[columns] = script
+        return script
+
+    def _update_product(self, values: Dict[str, Any]) -> None:
+        """Write columns of the product table in one statement"""
+        if not values:
+            return
+        columns = tuple(values)
+        if not set(columns).issubset(self._product_columns):
+            raise FieldNotFound
+        with get_cursor() as cursor:
+            cursor.execute(self._get_update_script(columns, cursor),
+                           (*values.values(), self._service_id))
+        self._update_snapshot(**values)
+
+    def put_data_to_field(self, field_name: str, value: Any) -> None:
+        self.put_data_to_fields({field_name: value})
+
+    def put_data_to_fields(self, values: Dict[str, Any]) -> None:
+        """Write answers of the form, raises FieldNotFound for columns
+        which are not in the form"""
+        if not set(values).issubset(self._form_columns):
+            raise FieldNotFound
+        self._update_product(values)
+
+    def submit_form(self, values: Dict[str, Any]) -> None:
+        """Write answers of the form and mark it complete at once"""
+        if not set(values).issubset(self._form_columns):
+            raise FieldNotFound
+        self._update_product(dict(values, is_form_complete=True))
+
+    def get_form(self) -> dict:
+        return {column: self._get(column)
+                for column in self._form_columns}
+
+    def is_form_complete(self) -> bool:
+        return self._get('is_form_complete')
+
+    def form_complete(self) -> None:
+        self._update_product({'is_form_complete': True})
+
+    def form_incomplete(self) -> None:
+        self._update_product({'is_form_complete': False})
 
-        self._user_tg_id = user_tg_id
-        self._request_date = request_date
+    def _get_complete_column(self, column: str) -> str:
+        if column not in self._document_columns:
+            raise FieldNotFound
+        return self._document_columns[column]
+
+    def get_document(self, column: str) -> str:
+        """file_id of the document"""
+        self._get_complete_column(column)
+        return self._get(column)
+
+    def is_document_complete(self, column: str) -> bool:
+        return self._get(self._get_complete_column(column))
+
+    def put_document(self, column: str, file_id: str) -> None:
+        """Write file_id and mark the document complete at once"""
+        self._update_product(
+            {column: file_id, self._get_complete_column(column): True})
+
+    def document_incomplete(self, column: str) -> None:
+        self._update_product({self._get_complete_column(column): False})
+
+    def get_service_id(self) -> int:
+        return self._service_id
 
     def get_user_tg_id(self) -> int:
-        return self._user_tg_id
+        return self._get('user_tg_id')
 
     def get_customer_name(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT customer_name
-                FROM service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            customer_name, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return customer_name
+        return self._get('customer_name')
 
     def get_request_date(self) -> date:
-        return self._request_date
+        return self._get('request_date')
 
     def get_payment_photo(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''SELECT payment_photo
-                                FROM service
-                                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            payment_photo, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return payment_photo
+        return self._get('payment_photo')
 
     def is_paid(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''SELECT is_paid
-                                FROM service
-                                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_paid, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_paid
+        return self._get('is_paid')
 
     def get_service_executor(self) -> int:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''SELECT service_executor
-                                FROM service
-                                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            service_executor, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return service_executor
+        return self._get('service_executor')
+
+    def get_product_key(self) -> str:
+        return self._get('product_key')
+
+    def get_meeting_time(self) -> datetime:
+        return self._get('meeting_time')
+
+    def get_meeting_address(self) -> str:
+        return self._get('meeting_address')
 
     def update_payment_photo(self, new_payment_photo: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             update_script = '''UPDATE service
                                 SET payment_photo = %s
                                 WHERE service_id = %s;'''
             cursor.execute(update_script, (new_payment_photo,
                                            self._service_id,))
-        connection.commit()
-        connection.close()
+        self._update_snapshot(payment_photo=new_payment_photo)
 
     def change_customer_name(self, new_customer_name: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             update_script = '''
                 UPDATE service
                 SET customer_name = %s
                 WHERE service_id = %s;'''
             cursor.execute(update_script, (new_customer_name,
                                            self._service_id,))
-        connection.commit()
-        connection.close()
+        self._update_snapshot(customer_name=new_customer_name)
 
     def mark_paid(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             update_script = '''UPDATE service
                                 SET is_paid = TRUE
                                 WHERE service_id = %s;'''
             cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
+        self._update_snapshot(is_paid=True)
 
     def mark_unpaid(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             update_script = '''UPDATE service
                                 SET is_paid = FALSE
                                 WHERE service_id = %s;'''
             cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_service_executor(self, new_operator_id: int) -> None:
-        if OperatorData.does_operator_exist(new_operator_id):
-            connection = psycopg2.connect(**db_config)
-            with connection.cursor() as cursor:
-                update_script = '''
+        self._update_snapshot(is_paid=False)
+
+    def claim_service(self, operator_id: int) -> int:
+        """Sets the executor if the service has none, in one statement.
+        Returns the executor: operator_id if the claim won, the operator
+        who claimed first if not.
+
+        The row is locked before it is checked, so a concurrent claim
+        waits for the winner and reads its committed executor.
+        """
+        with get_cursor() as cursor:
+            claim_script = '''
+                WITH current AS (
+                    SELECT service_executor
+                    FROM service
+                    WHERE service_id = %(service_id)s
+                    FOR NO KEY UPDATE
+                ), claimed AS (
                     UPDATE service
-                    SET service_executor = %s
-                    WHERE service_id = %s;'''
-                cursor.execute(update_script, (new_operator_id,
-                                               self._service_id,))
-            connection.commit()
-            connection.close()
-        else:
-            raise OperatorNotFound
+                    SET service_executor = %(operator_id)s
+                    FROM current
+                    WHERE service.service_id = %(service_id)s
+                        AND current.service_executor IS NULL
+                    RETURNING service.service_executor)
+                SELECT coalesce(
+                    (SELECT service_executor FROM claimed),
+                    service_executor)
+                FROM current;'''
+            try:
+                cursor.execute(claim_script, {
+                    'service_id': self._service_id,
+                    'operator_id': operator_id})
+            except psycopg2.errors.ForeignKeyViolation:
+                raise OperatorNotFound
+            row = cursor.fetchone()
+        if row is None:
+            raise ServiceNotFound
+        executor_id, = row
+        self._update_snapshot(service_executor=executor_id)
+        return executor_id
+
+    @classmethod
+    def _get_insert_script(cls) -> str:
+        """INSERT of the service, its meeting and its product row in one
+        statement, built once per class"""
+        if '_insert_script' not in cls.__dict__:
+            script = '''
+                WITH s AS (
+                    INSERT INTO service (user_tg_id, customer_name,
+                        request_date, product_key)
+                    SELECT %(tg_id)s, %(customer_name)s, %(request_date)s,
+                        %(product_key)s
+                    WHERE EXISTS (
+                        SELECT 1 FROM tg_user WHERE tg_id = %(tg_id)s)
+                    RETURNING service_id)'''
+            if cls._product_table:
+                script += ''',
+                m AS (
+                    INSERT INTO meeting (service_id)
+                    SELECT service_id FROM s),
+                p AS (
+                    INSERT INTO {table} (service_id)
+                    SELECT service_id FROM s)'''.format(
+                    table=cls._product_table)
+            cls._insert_script = script + '''
+                SELECT service_id FROM s;'''
+        return cls._insert_script
 
     @classmethod
     def new_service(cls, tg_id: int, customer_name: str,
                     request_date: date) -> int:
-        if TgUserData.does_tg_user_exist(tg_id):
-            connection = psycopg2.connect(**db_config)
-            with connection.cursor() as cursor:
-                insert_values = (tg_id, customer_name, request_date)
-                insert_script = '''
-                    INSERT INTO service (user_tg_id, customer_name,
-                        request_date)
-                    VALUES (%s, %s, %s)
-                    RETURNING service_id;'''
-                cursor.execute(insert_script, insert_values)
-                service_id, = cursor.fetchone()
-            connection.commit()
-            connection.close()
-        else:
+        with get_cursor() as cursor:
+            cursor.execute(cls._get_insert_script(), {
+                'tg_id': tg_id,
+                'customer_name': customer_name,
+                'request_date': request_date,
+                'product_key': cls._product_key})
+            row = cursor.fetchone()
+        if row is None:
             raise UserNotFound
-        return service_id
+        return row[0]
+
+    @classmethod
+    def _get_exists_script(cls) -> str:
+        if '_exists_script' not in cls.__dict__:
+            cls._exists_script = f'''
+                SELECT exists(
+                    SELECT 1
+                    FROM {cls._product_table or 'service'}
+                    WHERE service_id = %s);'''
+        return cls._exists_script
+
+    @classmethod
+    def does_service_exist(cls, service_id: int) -> bool:
+        with get_cursor() as cursor:
+            cursor.execute(cls._get_exists_script(), (service_id,))
+            exists, = cursor.fetchone()
+        return exists
+
+    @classmethod
+    def get_uncompleted_services(
+            cls,
+            tg_id: int,
+            customer_name: str = None) -> List[ServiceData]:
+        """Services of the user without executor with one query"""
+        select_script = (cls._get_snapshot_script()
+                         + 'WHERE s.user_tg_id = %s '
+                         'AND s.service_executor IS NULL ')
+        values = (tg_id,)
+        if customer_name is not None:
+            select_script += 'AND s.customer_name = %s '
+            values += (customer_name,)
+        select_script += 'ORDER BY s.service_id;'
+        with get_cursor() as cursor:
+            cursor.execute(select_script, values)
+            rows = cursor.fetchall()
+        return [cls._from_row(row) for row in rows]
+
+    @staticmethod
+    def get_product_key_by_id(service_id: int) -> str:
+        """Product of the service by primary key, no product tables"""
+        with get_cursor() as cursor:
+            select_script = '''SELECT product_key FROM service
+                                WHERE service_id = %s;'''
+            cursor.execute(select_script, (service_id,))
+            row = cursor.fetchone()
+        if row is None:
+            raise ServiceNotFound
+        return row[0]
 
     @classmethod
     def get_service_id_list(cls, tg_id: int) -> int:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             select_script = '''SELECT service_id FROM service
                                 WHERE user_tg_id = %s;'''
             cursor.execute(select_script, (tg_id,))
@@ -343,649 +564,223 @@ class ServiceData:
                 id_list = cursor.fetchall()
             except TypeError:
                 id_list = []
-        connection.commit()
-        connection.close()
         return [id_tuple[0] for id_tuple in id_list]
 
 
 class MeetingData:
-    def __init__(self, service_id: int):
+    """Meeting of the service
+
+    With service_data the meeting is read from its snapshot and
+    updates are written through to it.
+    """
+    def __init__(self, service_id: int, service_data: ServiceData = None):
         self._service_id = service_id
+        self._service_data = service_data
 
     def get_time(self) -> datetime:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        if self._service_data:
+            return self._service_data.get_meeting_time()
+        with get_cursor() as cursor:
             select_script = '''
                 SELECT meeting_time
                 FROM meeting
                 WHERE service_id = %s;'''
             cursor.execute(select_script, (self._service_id,))
             time, = cursor.fetchone()
-        connection.commit()
-        connection.close()
         return time
 
     def get_address(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        if self._service_data:
+            return self._service_data.get_meeting_address()
+        with get_cursor() as cursor:
             select_script = '''
                 SELECT meeting_address
                 FROM meeting
                 WHERE service_id = %s;'''
             cursor.execute(select_script, (self._service_id,))
             address, = cursor.fetchone()
-        connection.commit()
-        connection.close()
         return address
 
-    def set_time(self, time: datetime) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+    def set_request(self, address: str, time: datetime) -> None:
+        """Place and time the customer asked for, the booking of an
+        earlier request is dropped
+        """
+        with get_cursor() as cursor:
             update_script = '''
+                WITH dropped AS (
+                    DELETE FROM meeting_booking
+                    WHERE service_id = %(service_id)s)
                 UPDATE meeting
-                SET meeting_time = %s
-                WHERE service_id = %s;'''
-            cursor.execute(update_script, (time, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def set_place(self, address: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''
-                UPDATE meeting
-                SET meeting_address = %s
-                WHERE service_id = %s;'''
-            cursor.execute(update_script, (address, self._service_id,))
-        connection.commit()
-        connection.close()
+                SET meeting_address = %(address)s,
+                    meeting_time = %(time)s
+                WHERE service_id = %(service_id)s;'''
+            cursor.execute(update_script, {
+                'service_id': self._service_id,
+                'address': address,
+                'time': time})
+        if self._service_data:
+            self._service_data._update_snapshot(
+                meeting_time=time, meeting_address=address)
 
     @staticmethod
     def new_meeting(service_id: int) -> int:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+        with get_cursor() as cursor:
             insert_script = '''
                 INSERT INTO meeting (service_id)
                 VALUES (%s)
                 ON CONFLICT DO NOTHING;'''
             cursor.execute(insert_script, (service_id,))
-        connection.commit()
-        connection.close()
         return service_id
 
+    def book_slot(self,
+                  address: str,
+                  slot_time: datetime,
+                  operator_id: int,
+                  place_capacity: int,
+                  operator_capacity: int) -> bool:
+        """Books the slot for the meeting if the place and the operator
+        have room in it, False if not or if the service has no meeting.
+        The previous booking of the service is moved.
+
+        Bookings of the place and of the operator are serialized by
+        advisory locks, place first, so concurrent clicks do not
+        overbook a slot.
+        """
+        with get_cursor() as cursor:
+            book_script = '''
+                SELECT pg_advisory_xact_lock(
+                    hashtext('meeting_booking_place'),
+                    hashtext(%(address)s));
+                SELECT pg_advisory_xact_lock(
+                    hashtext('meeting_booking_operator'),
+                    %(operator_id)s);
+                WITH taken AS (
+                    SELECT
+                        count(*) FILTER (
+                            WHERE place_address = %(address)s) AS place,
+                        count(*) FILTER (
+                            WHERE operator_id = %(operator_id)s) AS operator
+                    FROM meeting_booking
+                    WHERE slot_time = %(slot_time)s
+                        AND service_id <> %(service_id)s
+                        AND (place_address = %(address)s
+                             OR operator_id = %(operator_id)s)
+                ), booking AS (
+                    INSERT INTO meeting_booking (service_id, place_address,
+                        slot_time, operator_id)
+                    SELECT %(service_id)s, %(address)s, %(slot_time)s,
+                        %(operator_id)s
+                    FROM taken
+                    WHERE place < %(place_capacity)s
+                        AND operator < %(operator_capacity)s
+                        AND EXISTS (
+                            SELECT FROM meeting
+                            WHERE service_id = %(service_id)s)
+                    ON CONFLICT (service_id) DO UPDATE
+                    SET place_address = EXCLUDED.place_address,
+                        slot_time = EXCLUDED.slot_time,
+                        operator_id = EXCLUDED.operator_id,
+                        booked_at = now()
+                    RETURNING service_id)
+                UPDATE meeting
+                SET meeting_time = %(slot_time)s,
+                    meeting_address = %(address)s
+                WHERE service_id IN (SELECT service_id FROM booking)
+                RETURNING service_id;'''
+            cursor.execute(book_script, {
+                'service_id': self._service_id,
+                'address': address,
+                'slot_time': slot_time,
+                'operator_id': operator_id,
+                'place_capacity': place_capacity,
+                'operator_capacity': operator_capacity})
+            booked = cursor.fetchone() is not None
+        if booked and self._service_data:
+            self._service_data._update_snapshot(
+                meeting_time=slot_time, meeting_address=address)
+        return booked
 
-class DriverLicenseServiceData(ServiceData):
-    def __init__(self, service_id: int):
-        super().__init__(service_id)
-
-    def get_form(self) -> dict:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT blood_type, height_cm, category_a, category_b,
-                    international
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            # blood_type, height_cm, category_a, category_b, \
-            #     international = cursor.fetchone()
-            form = dict(zip(('blood_type', 'height_cm', 'category_a',
-                             'category_b', 'international'),
-                            cursor.fetchone()))
-        connection.commit()
-        connection.close()
-        return form
-
-    def is_form_complete(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT is_form_complete
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_form_complete, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_form_complete
-
-    def get_passport(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT passport
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            passport, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return passport
-
-    def is_passport_complete(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT is_passport_complete
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_passport_complete, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_passport_complete
-
-    def get_e_visa(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT e_visa
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            e_visa, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return e_visa
-
-    def is_visa_complete(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+    @staticmethod
+    def get_booked_slots(address: str,
+                         operator_id: int,
+                         start: datetime,
+                         end: datetime,
+                         service_id: int = None) -> Dict[datetime, tuple]:
+        """slot_time -> (meetings of the place, meetings of the operator)
+        of slots in [start, end) which have any, the meeting of
+        service_id is not counted
+        """
+        with get_cursor() as cursor:
             select_script = '''
-                SELECT is_visa_complete
-                FROM driver_license_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_visa_complete, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_visa_complete
-
-    def change_blood_type(self, blood_type: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET blood_type = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (blood_type, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_height_cm(self, height_cm: int) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET height_cm = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (height_cm, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_category_a(self, category_a: bool) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET category_a = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (category_a, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_category_b(self, category_b: bool) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET category_b = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (category_b, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_international(self, international: bool) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET international = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (international, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_passport(self, passport: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET passport = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (passport, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def passport_complete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_passport_complete = TRUE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def passport_incomplete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_passport_complete = FALSE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_e_visa(self, e_visa: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET e_visa = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (e_visa, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def visa_complete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_visa_complete = TRUE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def visa_incomplete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_visa_complete = FALSE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def form_complete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_form_complete = TRUE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def form_incomplete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE driver_license_service
-                                SET is_form_complete = FALSE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def put_data_to_field(self, field_name: str, value: any) -> None:
-        if field_name == 'blood_type':
-            self.change_blood_type(value)
-        elif field_name == 'height_cm':
-            self.change_height_cm(value)
-        elif field_name == 'category_a':
-            self.change_category_a(value)
-        elif field_name == 'category_b':
-            self.change_category_b(value)
-        elif field_name == 'international':
-            self.change_international(value)
-        else:
-            raise FieldNotFound
-
-    @classmethod
-    def new_service(cls, tg_id: int, customer_name: str,
-                    request_date: date) -> int:
-        service_id = super().new_service(tg_id, customer_name, request_date)
-        MeetingData.new_meeting(service_id)
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            insert_script = '''INSERT INTO driver_license_service (service_id)
-                                VALUES (%s)
-                                RETURNING service_id;'''
-            cursor.execute(insert_script, (service_id,))
-            service_id, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return service_id
+                SELECT slot_time,
+                    count(*) FILTER (WHERE place_address = %(address)s),
+                    count(*) FILTER (WHERE operator_id = %(operator_id)s)
+                FROM meeting_booking
+                WHERE slot_time >= %(start)s AND slot_time < %(end)s
+                    AND (place_address = %(address)s
+                         OR operator_id = %(operator_id)s)
+                    AND service_id IS DISTINCT FROM %(service_id)s
+                GROUP BY slot_time;'''
+            cursor.execute(select_script, {
+                'address': address,
+                'operator_id': operator_id,
+                'start': start,
+                'end': end,
+                'service_id': service_id})
+            rows = cursor.fetchall()
+        return {slot_time: (place, operator)
+                for slot_time, place, operator in rows}
 
     @staticmethod
-    def does_driver_license_service_exist(service_id: int) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+    def get_scheduled_meetings() -> List[tuple]:
+        """(service_id, meeting_time) of meetings in the future"""
+        with get_cursor() as cursor:
             select_script = '''
-            SELECT exists(
-                SELECT service_id
-                FROM driver_license_service
-                WHERE service_id = %s);'''
-            cursor.execute(select_script, (service_id,))
-            exists, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return exists
+                SELECT service_id, meeting_time
+                FROM meeting
+                WHERE meeting_time > now()
+                ORDER BY service_id;'''
+            cursor.execute(select_script)
+            meetings = cursor.fetchall()
+        return meetings
 
 
-class BankCardServiceData(ServiceData):
-    def __init__(self, service_id: int):
-        super().__init__(service_id)
+class CallbackLabelData:
+    """Labels of inline buttons by id, ids never change"""
 
-    def get_form(self) -> dict:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT full_name, mother_name, marital_status, last_education,
-                    indonesian_phone_number, overseas_phone_number,
-                    indonesian_address, overseas_address, address_email,
-                    occupation, company_name, business_type_company,
-                    address_company
-                FROM bank_card_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            form = dict(zip(('full_name', 'mother_name', 'marital_status',
-                             'last_education', 'indonesian_phone_number',
-                             'overseas_phone_number', 'indonesian_address',
-                             'overseas_address', 'address_email', 'occupation',
-                             'company_name', 'business_type_company',
-                             'address_company'),
-                            cursor.fetchone()))
-        connection.commit()
-        connection.close()
-        return form
+    @staticmethod
+    def get_all_labels() -> List[Tuple[int, str]]:
+        with get_cursor() as cursor:
+            cursor.execute('SELECT label_id, label FROM callback_label;')
+            return cursor.fetchall()
 
-    def is_form_complete(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT is_form_complete
-                FROM bank_card_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_form_complete, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_form_complete
-
-    def get_passport(self) -> str:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-                SELECT passport
-                FROM bank_card_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            passport, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return passport
-
-    def is_passport_complete(self) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
+    @staticmethod
+    def get_labels(label_ids: List[int]) -> List[Tuple[int, str]]:
+        """(label_id, label) of the ids which are in the table"""
+        with get_cursor() as cursor:
             select_script = '''
-                SELECT is_passport_complete
-                FROM bank_card_service
-                WHERE service_id = %s;'''
-            cursor.execute(select_script, (self._service_id,))
-            is_passport_complete, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return is_passport_complete
-
-    def change_full_name(self, full_name: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET full_name = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (full_name, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_mother_name(self, mother_name: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET mother_name = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (mother_name, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_marital_status(self, marital_status: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET marital_status = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (marital_status, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_last_education(self, last_education: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET last_education = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (last_education, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_indonesian_phone_number(self,
-                                       indonesian_phone_number: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET indonesian_phone_number = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (indonesian_phone_number,
-                                           self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_overseas_phone_number(self, overseas_phone_number: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET overseas_phone_number = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (overseas_phone_number,
-                                           self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_indonesian_address(self, indonesian_address: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET indonesian_address = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (indonesian_address,
-                                           self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_overseas_address(self, overseas_address: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET overseas_address = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script,
-                           (overseas_address, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_address_email(self, address_email: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET address_email = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (address_email, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_occupation(self, occupation: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET occupation = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (occupation, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_company_name(self, company_name: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET company_name = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (company_name, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_business_type_company(self, business_type_company: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET business_type_company = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (business_type_company,
-                                           self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_address_company(self, address_company: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET address_company = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (address_company, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def form_complete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET is_form_complete = TRUE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def form_incomplete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET is_form_complete = FALSE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def change_passport(self, passport: str) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET passport = %s
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (passport, self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def passport_complete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET is_passport_complete = TRUE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def passport_incomplete(self) -> None:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            update_script = '''UPDATE bank_card_service
-                                SET is_passport_complete = FALSE
-                                WHERE service_id = %s;'''
-            cursor.execute(update_script, (self._service_id,))
-        connection.commit()
-        connection.close()
-
-    def put_data_to_field(self, field_name: str, value: any) -> None:
-        if field_name == 'full_name':
-            self.change_full_name(value)
-        elif field_name == 'mother_name':
-            self.change_mother_name(value)
-        elif field_name == 'marital_status':
-            self.change_marital_status(value)
-        elif field_name == 'last_education':
-            self.change_last_education(value)
-        elif field_name == 'indonesian_phone_number':
-            self.change_indonesian_phone_number(value)
-        elif field_name == 'overseas_phone_number':
-            self.change_overseas_phone_number(value)
-        elif field_name == 'indonesian_address':
-            self.change_indonesian_address(value)
-        elif field_name == 'overseas_address':
-            self.change_overseas_address(value)
-        elif field_name == 'address_email':
-            self.change_address_email(value)
-        elif field_name == 'occupation':
-            self.change_occupation(value)
-        elif field_name == 'company_name':
-            self.change_company_name(value)
-        elif field_name == 'business_type_company':
-            self.change_business_type_company(value)
-        elif field_name == 'address_company':
-            self.change_address_company(value)
-        else:
-            raise FieldNotFound
-
-    @classmethod
-    def new_service(cls, tg_id: int, customer_name: str,
-                    request_date: date) -> int:
-        service_id = super().new_service(tg_id, customer_name, request_date)
-        MeetingData.new_meeting(service_id)
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            insert_script = '''INSERT INTO bank_card_service (service_id)
-                                VALUES (%s)
-                                RETURNING service_id;'''
-            cursor.execute(insert_script, (service_id,))
-            service_id, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return service_id
+                SELECT label_id, label FROM callback_label
+                WHERE label_id = ANY(%s);'''
+            cursor.execute(select_script, (list(label_ids),))
+            return cursor.fetchall()
 
     @staticmethod
-    def does_bank_card_service_exist(service_id: int) -> bool:
-        connection = psycopg2.connect(**db_config)
-        with connection.cursor() as cursor:
-            select_script = '''
-            SELECT exists(
-                SELECT service_id
-                FROM bank_card_service
-                WHERE service_id = %s);'''
-            cursor.execute(select_script, (service_id,))
-            exists, = cursor.fetchone()
-        connection.commit()
-        connection.close()
-        return exists
+    def add_labels(labels: List[str]) -> List[Tuple[int, str]]:
+        """(label_id, label) of labels, new labels are inserted
+
+        A label inserted by a concurrent transaction is not seen by
+        this statement, it is missing from the result.
+        """
+        with get_cursor() as cursor:
+            insert_script = '''
+                WITH new AS (
+                    INSERT INTO callback_label (label)
+                    SELECT unnest(%(labels)s::text[])
+                    ON CONFLICT (label) DO NOTHING
+                    RETURNING label_id, label)
+                SELECT label_id, label FROM new
+                UNION ALL
+                SELECT label_id, label FROM callback_label
+                WHERE label = ANY(%(labels)s::text[]);'''
+            cursor.execute(insert_script, {'labels': list(labels)})
+            return cursor.fetchall()
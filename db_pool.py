@@ -0,0 +1,293 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List
+
+import psycopg2
+
+from config import DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT, \
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, \
+    DB_POOL_HEALTH_CHECK_INTERVAL, DB_EXECUTOR_WORKERS
+from instrumentation import InstrumentedCursor
+from metrics import Counter, Gauge
+
+log = logging.getLogger('db_pool')
+
+db_config = {'host': DB_HOST,
+             'dbname': DB_NAME,
+             'user': DB_USER,
+             'password': DB_PASS,
+             'port': DB_PORT}
+
+
+class PoolTimeout(Exception):
+    """No free connection appeared during acquire timeout"""
+
+
+class PoolClosed(Exception):
+    """Pool was closed and can not give connections anymore"""
+
+
+class ConnectionPool:
+    """Thread safe pool of psycopg2 connections
+
+    Connections are checked before they are given out: closed ones are
+    replaced and connections idle longer than health_check_interval
+    are pinged with SELECT 1. A connection broken during a query is
+    dropped and a new one is opened on next acquire.
+    """
+
+    def __init__(
+            self,
+            min_size: int = DB_POOL_MIN_SIZE,
+            max_size: int = DB_POOL_MAX_SIZE,
+            acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT,
+            health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL,
+            connect: Callable = None) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('wrong pool size')
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect or (lambda: psycopg2.connect(
+            cursor_factory=InstrumentedCursor, **db_config))
+
+        self._lock = threading.Condition()
+        self._idle: List[tuple] = []  # (connection, released_at)
+        self._in_use = 0
+        self._closed = False
+
+        self._stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'acquired': 0,
+            'released': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'broken_connections': 0,
+            'wait_time_total': 0.0,
+            'max_in_use': 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._open_connection(), time.monotonic()))
+
+    def _open_connection(self):
+        connection = self._connect()
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return connection
+
+    def _close_connection(self, connection) -> None:
+        with self._lock:
+            self._stats['connections_closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, connection, released_at: float) -> bool:
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1;')
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def acquire(self, timeout: float = None):
+        """Return connection from the pool, open new one if needed"""
+        if timeout is None:
+            timeout = self.acquire_timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._lock:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolClosed
+                size = self._in_use + len(self._idle)
+                if self._idle or size < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'no free connection in {timeout} sec')
+                if not waited:
+                    waited = True
+                    self._stats['waits'] += 1
+                self._lock.wait(remaining)
+
+            idle = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            self._stats['max_in_use'] = max(
+                self._stats['max_in_use'], self._in_use)
+            self._stats['wait_time_total'] += time.monotonic() - started
+
+        # connecting and pinging are done outside of the lock
+        try:
+            if idle is not None:
+                connection, released_at = idle
+                if self._is_healthy(connection, released_at):
+                    return connection
+                log.warning('unhealthy connection in pool, reconnecting')
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                self._close_connection(connection)
+            return self._open_connection()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, connection, broken: bool = False) -> None:
+        """Give connection back to the pool"""
+        with self._lock:
+            self._in_use -= 1
+            self._stats['released'] += 1
+            if broken or connection.closed or self._closed:
+                if broken:
+                    self._stats['broken_connections'] += 1
+                self._close_connection(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Connection from the pool: commit on success, rollback on error"""
+        connection = self.acquire()
+        try:
+            yield connection
+            connection.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(connection, broken=True)
+            raise
+        except BaseException:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                self.release(connection, broken=True)
+                raise
+            self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._close_connection(connection)
+            self._lock.notify_all()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_use'] = self._in_use
+            stats['idle'] = len(self._idle)
+            stats['size'] = self._in_use + len(self._idle)
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        return stats
+
+
+_pool: ConnectionPool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Module level pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_stats() -> Dict[str, float]:
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
+
+
+def _pool_metric(*keys: str) -> Callable:
+    """Values of pool stats for a metric, read at exposition time"""
+    def read() -> Dict[tuple, float]:
+        stats = get_pool_stats()
+        if not stats:
+            return {}
+        if len(keys) == 1:
+            return {(): stats[keys[0]]}
+        return {(key,): stats[key] for key in keys}
+    return read
+
+
+Gauge('db_pool_connections', 'Connections of the pool by state',
+      ['state'], function=_pool_metric('in_use', 'idle'))
+Gauge('db_pool_max_size', 'Connections the pool may open',
+      function=_pool_metric('max_size'))
+Counter('db_pool_acquired_total', 'Connections given out',
+        function=_pool_metric('acquired'))
+Counter('db_pool_waits_total', 'Acquires that waited for a connection',
+        function=_pool_metric('waits'))
+Counter('db_pool_wait_seconds_total', 'Time spent waiting for connections',
+        function=_pool_metric('wait_time_total'))
+Counter('db_pool_timeouts_total', 'Acquires failed with PoolTimeout',
+        function=_pool_metric('timeouts'))
+Counter('db_pool_broken_connections_total', 'Connections dropped as broken',
+        function=_pool_metric('broken_connections'))
+
+
+@contextmanager
+def get_cursor():
+    """Cursor on a pooled connection, transaction ends with the block"""
+    with get_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            yield cursor
+
+
+# Blocking psycopg2 code must not run inside the event loop. Handlers
+# await db_call() and the query runs in one of the executor threads;
+# the executor is not bigger than the pool so threads do not wait for
+# connections.
+_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+
+async def db_call(func: Callable, *args, **kwargs):
+    """Run blocking database code in the bounded executor"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    """Waits for running db calls, queued ones are cancelled"""
+    _executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, NamedTuple
+
+from aiogram.utils import exceptions
+
+from cache import LRUCache
+from config import TG_GLOBAL_RATE_LIMIT, TG_CHAT_RATE_LIMIT, \
+    TG_SEND_RETRIES
+
+log = logging.getLogger('fanout')
+
+# Chats with a limiter kept in memory, idle ones are full anyway
+CHAT_LIMITERS_SIZE = 10000
+
+
+class RateLimiter:
+    """Token bucket: rate tokens per second, at most burst in a row"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError('rate should be positive')
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait for a token, waiters are served in arrival order"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class DeliveryResult(NamedTuple):
+    chat_id: int
+    ok: bool
+    result: Any = None  # what send returned, usually Message
+    error: Exception = None
+    attempts: int = 0
+    elapsed: float = 0.0  # seconds including waits for limiters
+
+
+class FanOut:
+    """Sends one message to many chats concurrently
+
+    Every send waits for the global limiter and the limiter of its
+    chat, so bursts stay within Telegram limits: about 30 messages
+    per second overall and one per second in a chat. RetryAfter is
+    waited out and retried up to retries times, other errors fail the
+    delivery to that chat only.
+    """
+
+    def __init__(self,
+                 global_rate: float = TG_GLOBAL_RATE_LIMIT,
+                 chat_rate: float = TG_CHAT_RATE_LIMIT,
+                 retries: int = TG_SEND_RETRIES) -> None:
+        self.global_limiter = RateLimiter(global_rate, burst=global_rate)
+        self.chat_rate = chat_rate
+        self.retries = retries
+        self._chat_limiters = LRUCache(CHAT_LIMITERS_SIZE)
+
+    def _get_chat_limiter(self, chat_id: int) -> RateLimiter:
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = RateLimiter(self.chat_rate)
+            self._chat_limiters.put(chat_id, limiter)
+        return limiter
+
+    async def send(
+            self,
+            chat_id: int,
+            send: Callable[[int], Awaitable]) -> DeliveryResult:
+        """Call send(chat_id) within limits and retry on RetryAfter"""
+        started = time.monotonic()
+        chat_limiter = self._get_chat_limiter(chat_id)
+        attempts = 0
+        while True:
+            attempts += 1
+            await chat_limiter.acquire()
+            await self.global_limiter.acquire()
+            try:
+                result = await send(chat_id)
+            except exceptions.RetryAfter as error:
+                if attempts > self.retries:
+                    return self._failed(chat_id, error, attempts, started)
+                log.warning(f'flood control for {chat_id}, '
+                            f'retry in {error.timeout} s')
+                await asyncio.sleep(error.timeout)
+            except exceptions.TelegramAPIError as error:
+                return self._failed(chat_id, error, attempts, started)
+            else:
+                return DeliveryResult(
+                    chat_id=chat_id,
+                    ok=True,
+                    result=result,
+                    attempts=attempts,
+                    elapsed=time.monotonic() - started
+                )
+
+    @staticmethod
+    def _failed(chat_id: int, error: Exception, attempts: int,
+                started: float) -> DeliveryResult:
+        log.warning(f'not delivered to {chat_id}: {error!r}')
+        return DeliveryResult(
+            chat_id=chat_id,
+            ok=False,
+            error=error,
+            attempts=attempts,
+            elapsed=time.monotonic() - started
+        )
+
+    async def send_to_all(
+            self,
+            chat_ids: Iterable[int],
+            send: Callable[[int], Awaitable]) -> List[DeliveryResult]:
+        """Results in order of chat_ids, a chat is sent to once"""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        results = await asyncio.gather(
+            *(self.send(chat_id, send) for chat_id in chat_ids))
+        failed = sum(not result.ok for result in results)
+        if failed:
+            log.warning(f'fan out: {failed} of {len(results)} not delivered')
+        return results
@@ -0,0 +1,285 @@
+from __future__ import annotations
+import json
+import logging
+import typing
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+
+from config import FSM_STORAGE, FSM_STATE_TTL, \
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from db_pool import db_call, get_cursor
+from metrics import Gauge, registry
+
+log = logging.getLogger('fsm_storage')
+
+FSM_STATES = Gauge(
+    'fsm_states',
+    'Chats in every FSM state, empty state is no state',
+    ['state'])
+
+
+# columns of a record and their values in an empty one
+EMPTY_RECORD = {'state': 'NULL', 'data': "'{}'", 'bucket': "'{}'"}
+IS_ALIVE = '''(%(ttl)s IS NULL
+    OR fsm_storage.updated_at > now() - %(ttl)s * interval '1 second')'''
+
+
+def dumps(data: dict) -> str:
+    """Compact json for state data"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+class PostgresStorage(BaseStorage):
+    """FSM storage in fsm_storage table of the bot database
+
+    Every call is one query made through the connection pool in the
+    db executor. Records not updated for ttl seconds are treated as
+    absent and removed by delete_expired().
+    """
+
+    def __init__(self, ttl: int = FSM_STATE_TTL) -> None:
+        self.ttl = ttl
+
+    async def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    def _address(self, chat, user) -> tuple:
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    @staticmethod
+    def _select(column: str, chat: int, user: int, ttl: int):
+        with get_cursor() as cursor:
+            select_script = f'''
+                SELECT {column}
+                FROM fsm_storage
+                WHERE chat_id = %s AND user_id = %s
+                    AND (%s IS NULL
+                         OR updated_at > now() - %s * interval '1 second');'''
+            cursor.execute(select_script, (chat, user, ttl, ttl))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _kept_columns(*changed: str) -> str:
+        """SET of the other columns: kept in a live record, emptied in an
+        expired one, so writing to it does not bring them back
+        """
+        return ''.join(
+            f', {column} = CASE WHEN {IS_ALIVE} '
+            f'THEN fsm_storage.{column} ELSE {empty} END'
+            for column, empty in EMPTY_RECORD.items()
+            if column not in changed)
+
+    @staticmethod
+    def _upsert(column: str, chat: int, user: int, value, ttl: int,
+                merge: bool = False) -> None:
+        """Write one column, merge=True joins json objects of a live
+        record
+        """
+        if merge:
+            new_value = (f'CASE WHEN {IS_ALIVE} '
+                         f'THEN fsm_storage.{column} || EXCLUDED.{column} '
+                         f'ELSE EXCLUDED.{column} END')
+        else:
+            new_value = f'EXCLUDED.{column}'
+        kept = PostgresStorage._kept_columns(column)
+        with get_cursor() as cursor:
+            upsert_script = f'''
+                INSERT INTO fsm_storage (chat_id, user_id, {column})
+                VALUES (%(chat)s, %(user)s, %(value)s)
+                ON CONFLICT (chat_id, user_id)
+                DO UPDATE
+                SET {column} = {new_value}{kept}, updated_at = now();'''
+            cursor.execute(upsert_script, {
+                'chat': chat, 'user': user, 'value': value, 'ttl': ttl})
+
+    @staticmethod
+    def _reset(chat: int, user: int, with_data: bool, ttl: int) -> None:
+        with get_cursor() as cursor:
+            if with_data:
+                reset_script = '''
+                    DELETE FROM fsm_storage
+                    WHERE chat_id = %(chat)s AND user_id = %(user)s;'''
+            else:
+                kept = PostgresStorage._kept_columns('state')
+                reset_script = f'''
+                    UPDATE fsm_storage
+                    SET state = NULL{kept}, updated_at = now()
+                    WHERE chat_id = %(chat)s AND user_id = %(user)s;'''
+            cursor.execute(reset_script, {
+                'chat': chat, 'user': user, 'ttl': ttl})
+
+    @staticmethod
+    def _delete_expired(ttl: int) -> int:
+        with get_cursor() as cursor:
+            delete_script = '''
+                DELETE FROM fsm_storage
+                WHERE updated_at < now() - %s * interval '1 second';'''
+            cursor.execute(delete_script, (ttl,))
+            return cursor.rowcount
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None
+                        ) -> typing.Optional[str]:
+        chat, user = self._address(chat, user)
+        state = await db_call(self._select, 'state', chat, user, self.ttl)
+        if state is None:
+            return self.resolve_state(default)
+        return state
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> dict:
+        chat, user = self._address(chat, user)
+        data = await db_call(self._select, 'data', chat, user, self.ttl)
+        if data is None:
+            return dict(default or {})
+        return data
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.Optional[typing.AnyStr] = None):
+        chat, user = self._address(chat, user)
+        await db_call(
+            self._upsert, 'state', chat, user, self.resolve_state(state),
+            self.ttl)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: dict = None):
+        chat, user = self._address(chat, user)
+        await db_call(
+            self._upsert, 'data', chat, user, dumps(data or {}), self.ttl)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: dict = None,
+                          **kwargs):
+        chat, user = self._address(chat, user)
+        data = dict(data or {}, **kwargs)
+        await db_call(
+            self._upsert, 'data', chat, user, dumps(data), self.ttl,
+            merge=True)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        chat, user = self._address(chat, user)
+        await db_call(self._reset, chat, user, with_data, self.ttl)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> dict:
+        chat, user = self._address(chat, user)
+        bucket = await db_call(self._select, 'bucket', chat, user, self.ttl)
+        if bucket is None:
+            return dict(default or {})
+        return bucket
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: dict = None):
+        chat, user = self._address(chat, user)
+        await db_call(
+            self._upsert, 'bucket', chat, user, dumps(bucket or {}),
+            self.ttl)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: dict = None,
+                            **kwargs):
+        chat, user = self._address(chat, user)
+        bucket = dict(bucket or {}, **kwargs)
+        await db_call(
+            self._upsert, 'bucket', chat, user, dumps(bucket), self.ttl,
+            merge=True)
+
+    @staticmethod
+    def _count_states(ttl: int) -> typing.Dict[str, int]:
+        with get_cursor() as cursor:
+            count_script = '''
+                SELECT coalesce(state, ''), count(*)
+                FROM fsm_storage
+                WHERE %s IS NULL
+                    OR updated_at > now() - %s * interval '1 second'
+                GROUP BY 1;'''
+            cursor.execute(count_script, (ttl, ttl))
+            return dict(cursor.fetchall())
+
+    async def get_state_counts(self) -> typing.Dict[str, int]:
+        return await db_call(self._count_states, self.ttl)
+
+    async def delete_expired(self) -> int:
+        """Remove abandoned sessions"""
+        if self.ttl is None:
+            return 0
+        deleted = await db_call(self._delete_expired, self.ttl)
+        log.info(f'expired fsm records deleted: {deleted}')
+        return deleted
+
+
+async def get_state_counts(
+        storage: BaseStorage) -> typing.Optional[typing.Dict[str, int]]:
+    """Number of chats in every state, None if the storage can not
+    count them cheaply
+    """
+    if isinstance(storage, PostgresStorage):
+        return await storage.get_state_counts()
+    if isinstance(storage, MemoryStorage):
+        counts = {}
+        for chat in storage.data.values():
+            for record in chat.values():
+                state = record.get('state') or ''
+                counts[state] = counts.get(state, 0) + 1
+        return counts
+    return None
+
+
+def setup_fsm_metrics(storage: BaseStorage) -> None:
+    async def collect() -> None:
+        counts = await get_state_counts(storage)
+        if counts is not None:
+            FSM_STATES.replace(
+                {(state,): count for state, count in counts.items()})
+
+    registry.add_collector(collect)
+
+
+def make_storage(kind: str = FSM_STORAGE) -> BaseStorage:
+    """FSM storage by name from config: memory, postgres or redis"""
+    if kind == 'postgres':
+        return PostgresStorage()
+    if kind == 'redis':
+        # needs aioredis from requirements.txt, any server speaking the
+        # redis protocol works, benchmarks.fake_redis in tests
+        from aiogram.contrib.fsm_storage.redis import RedisStorage2
+        return RedisStorage2(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL,
+            bucket_ttl=FSM_STATE_TTL,
+        )
+    if kind == 'memory':
+        return MemoryStorage()
+    raise ValueError(f'unknown fsm storage: {kind}')
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils import exceptions
+import psycopg2.extensions
+
+from config import SLOW_QUERY_THRESHOLD
+from metrics import Counter, Histogram
+
+log = logging.getLogger('instrumentation')
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+
+
+class UpdateStats:
+    """Database work done while handling one update"""
+
+    def __init__(self, update_id: int) -> None:
+        self.update_id = update_id
+        self.handler = None
+        self.queries = 0
+        self.db_time = 0.0  # seconds
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_query(self, elapsed: float) -> None:
+        # queries of one update may run in several db threads at once
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+
+
+current_update: contextvars.ContextVar[Optional[UpdateStats]] = \
+    contextvars.ContextVar('current_update', default=None)
+
+
+UPDATE_DURATION = Histogram(
+    'bot_update_duration_seconds',
+    'Time to handle one update',
+    ['handler'], buckets=TIME_BUCKETS)
+UPDATE_QUERIES = Histogram(
+    'bot_update_db_queries',
+    'Database queries made while handling one update',
+    ['handler'], buckets=QUERY_COUNT_BUCKETS)
+UPDATE_DB_TIME = Histogram(
+    'bot_update_db_seconds',
+    'Time spent in database while handling one update',
+    ['handler'], buckets=TIME_BUCKETS)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'Time of one database query',
+    buckets=TIME_BUCKETS)
+DB_SLOW_QUERIES = Counter(
+    'db_slow_queries_total',
+    'Queries slower than SLOW_QUERY_THRESHOLD')
+API_REQUEST_DURATION = Histogram(
+    'telegram_api_request_duration_seconds',
+    'Time of one Bot API request',
+    ['method'], buckets=TIME_BUCKETS)
+API_ERRORS = Counter(
+    'telegram_api_errors_total',
+    'Bot API requests failed with an error',
+    ['method', 'error'])
+
+
+def get_sql_template(query, cursor) -> str:
+    """SQL with placeholders in one line, values are never logged"""
+    if not isinstance(query, (str, bytes)):
+        query = query.as_string(cursor)  # psycopg2.sql.Composable
+    elif isinstance(query, bytes):
+        query = query.decode()
+    return ' '.join(query.split())
+
+
+def record_query(query, cursor, elapsed: float) -> None:
+    stats = current_update.get()
+    if stats is not None:
+        stats.add_query(elapsed)
+    DB_QUERY_DURATION.observe(elapsed)
+    if elapsed >= SLOW_QUERY_THRESHOLD:
+        DB_SLOW_QUERIES.inc()
+        where = ''
+        if stats is not None:
+            where = f' update {stats.update_id} handler {stats.handler}'
+        log.warning(f'slow query {elapsed * 1000:.1f} ms{where}: '
+                    f'{get_sql_template(query, cursor)}')
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor reporting every query to the current update"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, self, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, self, time.perf_counter() - started)
+
+
+class UpdateInstrumentation(BaseMiddleware):
+    """Binds UpdateStats to the update and collects them per handler"""
+
+    async def trigger(self, action, args):
+        if action == 'pre_process_update':
+            update, data = args
+            data['_update_stats'] = UpdateStats(update.update_id)
+            data['_update_stats_token'] = current_update.set(
+                data['_update_stats'])
+        elif action == 'post_process_update':
+            update, results, data = args
+            self._finish(data)
+        elif action.startswith('process_') and action != 'process_update':
+            # current_handler is set only around the event handler
+            stats = current_update.get()
+            if stats is not None:
+                stats.handler = current_handler.get().__name__
+
+    @staticmethod
+    def _finish(data: dict) -> None:
+        stats: UpdateStats = data.pop('_update_stats', None)
+        if stats is None:
+            return
+        current_update.reset(data.pop('_update_stats_token'))
+        duration = time.perf_counter() - stats.started
+        handler = stats.handler or '(no handler)'
+        UPDATE_DURATION.observe(duration, handler=handler)
+        UPDATE_QUERIES.observe(stats.queries, handler=handler)
+        UPDATE_DB_TIME.observe(stats.db_time, handler=handler)
+        log.debug(f'update {stats.update_id} {handler}: '
+                  f'{stats.queries} queries, '
+                  f'{stats.db_time * 1000:.1f} ms in db, '
+                  f'{duration * 1000:.1f} ms total')
+
+
+class InstrumentedBot(Bot):
+    """Bot measuring every Bot API request"""
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except exceptions.TelegramAPIError as error:
+            API_ERRORS.inc(method=method, error=type(error).__name__)
+            raise
+        finally:
+            API_REQUEST_DURATION.observe(
+                time.perf_counter() - started, method=method)
+
+
+def get_handler_stats() -> Dict[str, dict]:
+    """Histograms of queries, db time and duration per handler"""
+    return {
+        handler: {
+            'queries': UPDATE_QUERIES.get_stats(handler=handler),
+            'db_time': UPDATE_DB_TIME.get_stats(handler=handler),
+            'duration': UPDATE_DURATION.get_stats(handler=handler),
+        }
+        for (handler,) in UPDATE_DURATION.get_label_values()
+    }
+
+
+def get_query_totals() -> Dict[str, float]:
+    queries = DB_QUERY_DURATION.get_stats() or {'count': 0, 'sum': 0.0}
+    return {'queries': queries['count'],
+            'db_time': queries['sum'],
+            'slow_queries': DB_SLOW_QUERIES.get()}
+
+
+def reset_stats() -> None:
+    for metric in (UPDATE_DURATION, UPDATE_QUERIES, UPDATE_DB_TIME,
+                   DB_QUERY_DURATION, DB_SLOW_QUERIES):
+        metric.clear()
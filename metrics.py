@@ -0,0 +1,253 @@
+from __future__ import annotations
+import asyncio
+from bisect import bisect_left
+import logging
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+log = logging.getLogger('metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Metrics of the process in Prometheus text exposition format
+
+    Collectors are called before every exposition, they refresh
+    values that are cheaper to read at scrape time than to keep up to
+    date on the hot path.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} is already set')
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable) -> None:
+        """collector() or await collector() before every exposition"""
+        self._collectors.append(collector)
+
+    async def collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                result = collector()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                log.exception(f'metrics collector {collector!r} failed')
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(metric.expose() for metric in metrics)
+
+
+registry = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"'
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Sequence[str] = (),
+                 function: Callable[[], Dict[tuple, float]] = None,
+                 registry: Registry = registry) -> None:
+        """function() gives {label values: value} at exposition time"""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} needs labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Tuple[str, tuple, float]]:
+        if self.function is not None:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+            if not self.labelnames and not values:
+                values = {(): 0}
+        return [('', key, value) for key, value in sorted(values.items())]
+
+    def expose(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        for suffix, key, value, *extra in self._samples():
+            names = self.labelnames + tuple(name for name, _ in extra)
+            values = key + tuple(value for _, value in extra)
+            lines.append(f'{self.name}{suffix}'
+                         f'{_format_labels(names, values)} '
+                         f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def replace(self, values: Dict[tuple, float]) -> None:
+        """Set all label values at once, others are removed"""
+        with self._lock:
+            self._values = dict(values)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Registry = registry) -> None:
+        super().__init__(name, documentation, labelnames, registry=registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = _HistogramValue(
+                    len(self.buckets) + 1)  # last is +Inf
+            state.counts[index] += 1
+            state.sum += value
+            state.count += 1
+
+    def get_stats(self, **labels) -> Optional[dict]:
+        """count, sum and not cumulative counts per bucket"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return None
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            return {'count': state.count,
+                    'sum': state.sum,
+                    'buckets': dict(zip(bounds, state.counts))}
+
+    def get_label_values(self) -> List[tuple]:
+        with self._lock:
+            return list(self._values)
+
+    def _samples(self) -> List[tuple]:
+        with self._lock:
+            values = [(key, list(state.counts), state.sum, state.count)
+                      for key, state in sorted(self._values.items())]
+        samples = []
+        bounds = self.buckets + (math.inf,)
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, cumulative,
+                                ('le', _format_value(bound))))
+            samples.append(('_sum', key, total))
+            samples.append(('_count', key, count))
+        return samples
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    metrics_registry = request.app.get('metrics_registry', registry)
+    await metrics_registry.collect()
+    return web.Response(
+        body=metrics_registry.expose().encode(),
+        headers={'Content-Type': CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int,
+                               metrics_registry: Registry = registry
+                               ) -> web.AppRunner:
+    """Serve GET /metrics, stop it with await runner.cleanup()"""
+    app = web.Application()
+    app['metrics_registry'] = metrics_registry
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info(f'metrics on http://{host}:{port}/metrics')
+    return runner
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS fsm_storage (
+    chat_id int8 NOT NULL,
+    user_id int8 NOT NULL,
+    state varchar(255),
+    data jsonb NOT NULL DEFAULT '{}',
+    bucket jsonb NOT NULL DEFAULT '{}',
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (chat_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS fsm_storage_updated_at_idx
+    ON fsm_storage (updated_at);
@@ -0,0 +1,55 @@
+-- migrate:no-transaction
+-- Indexes for lookups of db_managing.py, built without blocking writes.
+-- Every step can be run again after a failure.
+
+-- Product tables get primary keys: the unique index is built
+-- concurrently and then attached, which only checks NOT NULL under lock
+DROP INDEX CONCURRENTLY IF EXISTS bank_card_service_service_id_idx;
+CREATE UNIQUE INDEX CONCURRENTLY bank_card_service_service_id_idx
+    ON bank_card_service (service_id);
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_constraint
+               WHERE conname = 'bank_card_service_pkey') THEN
+        DROP INDEX bank_card_service_service_id_idx;
+    ELSE
+        ALTER TABLE bank_card_service
+            ADD CONSTRAINT bank_card_service_pkey
+            PRIMARY KEY USING INDEX bank_card_service_service_id_idx;
+    END IF;
+END $$;
+
+DROP INDEX CONCURRENTLY IF EXISTS driver_license_service_service_id_idx;
+CREATE UNIQUE INDEX CONCURRENTLY driver_license_service_service_id_idx
+    ON driver_license_service (service_id);
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_constraint
+               WHERE conname = 'driver_license_service_pkey') THEN
+        DROP INDEX driver_license_service_service_id_idx;
+    ELSE
+        ALTER TABLE driver_license_service
+            ADD CONSTRAINT driver_license_service_pkey
+            PRIMARY KEY USING INDEX driver_license_service_service_id_idx;
+    END IF;
+END $$;
+
+-- services of a user: get_uncompleted_services, get_service_id_list
+DROP INDEX CONCURRENTLY IF EXISTS service_user_tg_id_idx;
+CREATE INDEX CONCURRENTLY service_user_tg_id_idx
+    ON service (user_tg_id);
+
+-- services of an operator, also ON DELETE CASCADE of an operator
+DROP INDEX CONCURRENTLY IF EXISTS service_service_executor_idx;
+CREATE INDEX CONCURRENTLY service_service_executor_idx
+    ON service (service_executor);
+
+-- get_operator_id_list(section)
+DROP INDEX CONCURRENTLY IF EXISTS operator_operation_section_idx;
+CREATE INDEX CONCURRENTLY operator_operation_section_idx
+    ON operator (operation_section);
+
+-- upcoming meetings: get_scheduled_meetings on every start
+DROP INDEX CONCURRENTLY IF EXISTS meeting_meeting_time_idx;
+CREATE INDEX CONCURRENTLY meeting_meeting_time_idx
+    ON meeting (meeting_time);
@@ -0,0 +1,13 @@
+-- Product of the service, read by one primary key lookup instead of
+-- probing every product table
+ALTER TABLE service ADD COLUMN IF NOT EXISTS product_key varchar(32);
+
+UPDATE service s
+SET product_key = 'bank_card'
+FROM bank_card_service p
+WHERE p.service_id = s.service_id AND s.product_key IS NULL;
+
+UPDATE service s
+SET product_key = 'driver_license'
+FROM driver_license_service p
+WHERE p.service_id = s.service_id AND s.product_key IS NULL;
@@ -0,0 +1,6 @@
+-- Labels of inline buttons (questions and answers), callback_data
+-- carries their ids instead of the text
+CREATE TABLE IF NOT EXISTS callback_label (
+    label_id serial PRIMARY KEY,
+    label text NOT NULL UNIQUE
+);
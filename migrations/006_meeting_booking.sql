@@ -0,0 +1,25 @@
+-- Booked meeting slots. A slot is a time of a place, a place and an
+-- operator take a limited number of meetings in one slot. Free slots
+-- of a place are read with one range scan of the indexes.
+CREATE TABLE IF NOT EXISTS meeting_booking (
+    service_id int PRIMARY KEY
+        REFERENCES service(service_id) ON DELETE CASCADE,
+    place_address varchar(255) NOT NULL,
+    slot_time timestamptz NOT NULL,
+    operator_id int REFERENCES operator(operator_id) ON DELETE SET NULL,
+    booked_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS meeting_booking_place_slot_idx
+    ON meeting_booking (place_address, slot_time);
+CREATE INDEX IF NOT EXISTS meeting_booking_operator_slot_idx
+    ON meeting_booking (operator_id, slot_time);
+
+-- upcoming meetings chosen before the slots
+INSERT INTO meeting_booking (service_id, place_address, slot_time,
+    operator_id)
+SELECT m.service_id, m.meeting_address, m.meeting_time, s.service_executor
+FROM meeting m
+JOIN service s USING (service_id)
+WHERE m.meeting_time > now() AND m.meeting_address IS NOT NULL
+ON CONFLICT (service_id) DO NOTHING;
@@ -1,7 +1,10 @@
+import json
 import logging
 import typing
+from enum import Enum
 
-from aiogram import Bot, Dispatcher, executor
+from aiogram import Dispatcher, executor
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.types import Message, \
     ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton, \
     InlineKeyboardMarkup, InlineKeyboardButton, \
@@ -9,22 +12,33 @@ from aiogram.types import Message, \
 from aiogram.utils import callback_data, exceptions
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.types.message import ContentType
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from pytz import timezone
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 
 # Import modules of this project
-from config import ADMINS_TG, API_TOKEN, CLIENT_TIMEZONE_NAME, PAYMENT_DETAILS
-from business_logic import FieldType, Operator,\
-    Service, TgUser, get_next_enum, Section
-from products import BankCardForm, DriveLicenseService,\
-    DriverLicenseForm, Product, \
-    bank_card_product, driver_license_product, \
-    BankCardService
+from callback_codec import CallbackCodec
+from callback_routing import CallbackRouter
+from db_pool import close_pool, db_call, shutdown_executor
+from fanout import FanOut
+from fsm_storage import PostgresStorage, make_storage, setup_fsm_metrics
+from instrumentation import InstrumentedBot, UpdateInstrumentation
+from metrics import Gauge, start_metrics_server
+from webhook import InFlightMiddleware, start_webhook
+from config import ADMINS_TG, API_TOKEN, BOT_MODE, CLIENT_TIMEZONE_NAME, \
+    PAYMENT_DETAILS, SCHEDULER_DB_URL, SCHEDULER_MISFIRE_GRACE_TIME, \
+    SHUTDOWN_DRAIN_TIMEOUT, TELEGRAM_API_SERVER, METRICS_HOST, METRICS_PORT, \
+    FORM_BATCH_MODE, FORM_FLUSH_TIMEOUT
+from scheduling import cancel_form_flush, reconcile_meeting_notifications, \
+    schedule_form_flush, schedule_meeting_notification, \
+    setup_scheduler_metrics
+from business_logic import Document, DocumentType, FieldType, FormField, \
+    Meeting, Operator, Place, Service, TgUser, Section
+from products import Product
 from texts_for_replay import get_cancel_payment_text, \
     get_confirm_payment_text, get_form_text, get_meeting_text, \
     get_text_for_new_service, get_text_for_payment_control, \
@@ -33,27 +47,59 @@ from texts_for_replay import get_cancel_payment_text, \
     reply_on_random_message, waiting_customer_name_text,\
     customer_name_exist_text, \
     get_text_for_payment, got_payment_screenshot_text, got_customer_name_text,\
-    get_text_for_form_field, waiting_pasport_text, pasport_getting_text,\
+    get_text_for_form_field, \
     start_form_filling_text, form_is_end_text, chose_meeting_place, \
-    chose_meeting_time, waiting_evisa_text, evisa_getting_text, \
+    chose_meeting_time, \
     answer_shoud_be_bool, chose_meeting_date, meeting_date_chosing_operator, \
-    documents_is_ready_text
+    documents_is_ready_text, meeting_slot_taken, no_free_meeting_slots, \
+    service_already_taken_text
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger('paperwork_bot')
 
 # Initialize bot and dispatcher
-bot = Bot(token=API_TOKEN, parse_mode="HTML")
-dp = Dispatcher(bot, storage=MemoryStorage())
+if TELEGRAM_API_SERVER:
+    telegram_server = TelegramAPIServer.from_base(TELEGRAM_API_SERVER)
+else:
+    telegram_server = TELEGRAM_PRODUCTION
+bot = InstrumentedBot(
+    token=API_TOKEN, parse_mode="HTML", server=telegram_server)
+dp = Dispatcher(bot, storage=make_storage())
+in_flight = InFlightMiddleware()
+dp.middleware.setup(in_flight)
+dp.middleware.setup(UpdateInstrumentation())
+setup_fsm_metrics(dp.storage)
+Gauge('bot_updates_in_flight', 'Updates being handled',
+      function=lambda: in_flight.in_flight)
+# Sends to many chats at once within Telegram limits
+notifier = FanOut()
 
 # Initialize scheduler
-scheduler = AsyncIOScheduler()
-scheduler.start()
-
-# Sructure of callback buttons
+# Reminders live in the bot database and survive restarts,
+# housekeeping jobs are recreated on every start in memory
+jobstores = {
+    'default': SQLAlchemyJobStore(url=SCHEDULER_DB_URL),
+    'memory': MemoryJobStore(),
+}
+scheduler = AsyncIOScheduler(
+    jobstores=jobstores,
+    job_defaults={
+        'misfire_grace_time': SCHEDULER_MISFIRE_GRACE_TIME,
+        'coalesce': True,
+    },
+    timezone=timezone(CLIENT_TIMEZONE_NAME)
+)
+setup_scheduler_metrics(scheduler, jobstores)
+
+# Sructure of callback buttons, buttons are made by callback_codec,
+# button_cb is the format of buttons sent before it
 button_cb = callback_data.CallbackData(
     'btn', 'question', 'answer', 'data')
+callback_codec = CallbackCodec(legacy=button_cb)
+# Callback handlers by question and answer of the button
+router = CallbackRouter(callback_codec)
+router.register(dp)
 
 
 #  ------------------------------------------------------------ ВСПОМОГАТЕЛЬНОЕ
@@ -82,7 +128,7 @@ def make_inline_keyboard(
     keyboard = InlineKeyboardMarkup()
     row = []
     for answer in answers:  # make a botton for every answer
-        cb_data = button_cb.new(
+        cb_data = callback_codec.new(
             question=question,
             answer=answer,
             data=data)
@@ -105,6 +151,15 @@ def make_replay_keyboard(answers: typing.List[str]) -> ReplyKeyboardMarkup:
     return keyboard
 
 
+def freeze_keyboard(keyboard) -> str:
+    """Клавиатура, сериализованная один раз
+
+    aiogram отправляет reply_markup-строку как есть, поэтому одна
+    неизменяемая клавиатура служит всем сообщениям.
+    """
+    return json.dumps(keyboard.to_python(), ensure_ascii=False)
+
+
 def is_message_private(message: Message) -> bool:
     """Сообщение из личного чата с ботом?"""
     if message.chat.type == 'private':
@@ -169,22 +224,18 @@ async def operator_command(message: Message, state: FSMContext):
         text='Запрос отправлен',
         reply_markup=ReplyKeyboardRemove()
     )
-    for admin_id in ADMINS_TG:
-        await bot.send_message(
-            chat_id=admin_id,
+    keyboard = get_keyboard_for_made_operator(message.from_user.id)
+    await notifier.send_to_all(
+        chat_ids=ADMINS_TG,
+        send=lambda chat_id: bot.send_message(
+            chat_id=chat_id,
             text=message.from_user.full_name,
-            reply_markup=get_keyboard_for_made_operator(
-                message.from_user.id
-            )
+            reply_markup=keyboard
         )
+    )
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=made_operator,
-        answer=buttons_for_made_operator
-    ),
-    state='*')
+@router.route(question=made_operator, answer=buttons_for_made_operator)
 async def made_operator_callback_button(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
@@ -197,7 +248,8 @@ async def made_operator_callback_button(
 
     operator_tg_id = callback_data['data']
     try:
-        Operator.new(
+        await db_call(
+            Operator.new,
             tg_id=operator_tg_id,
             section=Section[section_for_operator],
             name=query.message.text
@@ -245,7 +297,8 @@ def get_keyboard_for_operator(operator_id: int) -> InlineKeyboardMarkup:
     commands=['all_operators'], state="*")
 async def send_all_operators(message: Message, state: FSMContext):
     log.info('send_all_operators from: %r', message.from_user.id)
-    for operator in Operator.get_operator_list():
+    operators = await db_call(lambda: list(Operator.get_operator_list()))
+    for operator in operators:
         await message.answer(
             text=(
                 operator.get_name()
@@ -255,27 +308,24 @@ async def send_all_operators(message: Message, state: FSMContext):
         )
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=made_operator,
-        answer=[delete_button, ]),
-    state='*')
+@router.route(question=made_operator, answer=[delete_button])
 async def delete_operator_callback_button(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
     log.info('Got this callback data: %r', callback_data)
-    operator_id = callback_data['data']
-    Operator.delete(operator_id)
+    operator_id = int(callback_data['data'])
+    await db_call(Operator.delete, operator_id)
     await query.message.delete()
 
 
 #  -------------------------------------------------------------- ВХОД ТГ ЮЗЕРА
-def get_keyboard_services() -> ReplyKeyboardMarkup:
-    keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
-    for product_name in Product.get_all_product_names():
-        keyboard.add(KeyboardButton(text=product_name))
-    return keyboard
+services_keyboard = freeze_keyboard(
+    make_replay_keyboard(Product.get_all_product_names()))
+
+
+def get_keyboard_services() -> str:
+    return services_keyboard
 
 
 @dp.message_handler(
@@ -284,7 +334,8 @@ def get_keyboard_services() -> ReplyKeyboardMarkup:
 async def start_command(message: Message, state: FSMContext):
     log.info('start command from: %r', message.from_user.id)
 
-    TgUser.new(
+    await db_call(
+        TgUser.new,
         tg_id=message.from_user.id,
         tg_username=message.from_user.username
     )
@@ -321,12 +372,107 @@ bool_dict_for_yes_no = {
 start_service_button = 'Начать оформление'
 
 
+async def save_service_to_state(state: FSMContext, service: Service) -> None:
+    """В состоянии хранятся только айди сервиса и ключ продукта"""
+    await state.update_data(
+        service_id=service.get_service_id(),
+        product_key=service.__class__.product.uniq_key
+    )
+
+
+async def get_service_from_state(
+        state: FSMContext, state_data: dict = None) -> Service:
+    """Продуктовый сервис по айди из состояния (через кеш)
+
+    state_data - уже прочитанные данные состояния, чтобы не читать
+    хранилище еще раз
+    """
+    if state_data is None:
+        state_data = await state.get_data()
+    product = Product.get_product(state_data['product_key'])
+    return await db_call(
+        product.service_class.get, state_data['service_id'])
+
+
+def get_form_field(form: typing.Type[Enum], field_index: int) -> Enum:
+    """Поле формы по номеру, который хранится в состоянии"""
+    return list(form)[field_index]
+
+
+async def start_form(state: FSMContext) -> None:
+    """Анкета с первого поля, старые ответы из буфера забываются"""
+    await state.update_data(
+        field_index=0, form_answers={}, form_flush_scheduled=False)
+
+
+async def save_form_answer(
+        state: FSMContext,
+        state_data: dict,
+        service: Service,
+        name_field_in_db: str,
+        value: typing.Any,
+        is_last: bool) -> None:
+    """Сохраняет ответ на поле анкеты и переходит к следующему полю
+
+    В режиме FORM_BATCH_MODE ответы копятся в состоянии и пишутся
+    в базу одним UPDATE вместе с отметкой о заполнении анкеты, поэтому
+    операторы не видят недозаполненных анкет. Ответы брошенной анкеты
+    через FORM_FLUSH_TIMEOUT сохраняет flush_form_job.
+    """
+    if not FORM_BATCH_MODE:
+        await db_call(
+            service.put_data_to_field,
+            name_field_in_db=name_field_in_db,
+            value=value
+        )
+        if is_last:
+            await db_call(service.form_complete)
+        else:
+            await state.update_data(field_index=state_data['field_index'] + 1)
+        return
+
+    answers = dict(state_data.get('form_answers') or {})
+    answers[name_field_in_db] = value
+    if is_last:
+        await db_call(service.submit_form, answers)
+        await state.update_data(form_answers={}, form_flush_scheduled=False)
+        await db_call(cancel_form_flush, scheduler, state.chat, state.user)
+        return
+
+    new_data = {'field_index': state_data['field_index'] + 1,
+                'form_answers': answers,
+                'form_service_id': service.get_service_id()}
+    if not state_data.get('form_flush_scheduled'):
+        await db_call(
+            schedule_form_flush,
+            scheduler,
+            flush_form_job,
+            state.chat,
+            state.user,
+            FORM_FLUSH_TIMEOUT
+        )
+        new_data['form_flush_scheduled'] = True
+    await state.update_data(**new_data)
+
+
 def is_message_product_button(message: Message) -> bool:
     """Сообщение это кнопка из клавиатуры сервисов?"""
-    if message.text in Product.get_all_product_names():
-        return True
-    else:
-        return False
+    return Product.is_product_name(message.text)
+
+
+start_service_keyboards = {}  # uniq_key of product -> keyboard
+
+
+def get_start_service_keyboard(product: Product) -> str:
+    """Собирается при первом нажатии: ключи кнопок из базы"""
+    keyboard = start_service_keyboards.get(product.uniq_key)
+    if keyboard is None:
+        keyboard = freeze_keyboard(make_inline_keyboard(
+            question=product.uniq_key,
+            answers=[start_service_button, ]
+        ))
+        start_service_keyboards[product.uniq_key] = keyboard
+    return keyboard
 
 
 @dp.message_handler(
@@ -338,13 +484,9 @@ async def replay_for_product_button(message: Message, state: FSMContext):
     log.info('new_text_message from: %r', message.from_user.id)
 
     product = Product.get_product_by_name(message.text)
-    keyboard = make_inline_keyboard(
-        question=product.uniq_key,
-        answers=[start_service_button, ]
-    )
     await message.answer(
         text=product.terms_description,
-        reply_markup=keyboard
+        reply_markup=get_start_service_keyboard(product)
     )
 
 
@@ -361,12 +503,9 @@ def get_keyboard_exist_customer_name(
     return keyboard
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=Product.get_all_product_keys(),
-        answer=[start_service_button, ]
-    ),
-    state='*')
+@router.route(
+    question=Product.get_all_product_keys(),
+    answer=[start_service_button])
 async def start_service_callback_button(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
@@ -379,9 +518,10 @@ async def start_service_callback_button(
     product = Product.get_product(product_key)
 
     await CustomerState.waiting_for_customer_name.set()
-    await state.update_data(product_name=product.product_name)
+    await state.update_data(product_key=product.uniq_key)
 
-    keyboard = get_keyboard_exist_customer_name(
+    keyboard = await db_call(
+        get_keyboard_exist_customer_name,
         product=product,
         tg_id=query.from_user.id
     )
@@ -405,18 +545,18 @@ async def new_customer_name(message: Message, state: FSMContext):
         reply_markup=get_keyboard_services()
     )
     state_data = await state.get_data()
-    product_name = state_data['product_name']
-    product = Product.get_product_by_name(product_name)
+    product = Product.get_product(state_data['product_key'])
 
     Service_Class = product.service_class
-    service = Service_Class.get_service_by_customer_name(
+    service = await db_call(
+        Service_Class.get_service_by_customer_name,
         tg_id=message.from_user.id,
         customer_name=message.text,
         request_data=datetime.today().date()
     )
-    await state.update_data(service=service)
+    await save_service_to_state(state, service)
 
-    if service.is_paid():
+    if await db_call(service.is_paid):
         await send_actions_for_service(service)
     else:
         await send_form_for_pay(
@@ -451,25 +591,28 @@ async def new_payment_photo(message: Message, state: FSMContext):
     log.info(f'new_payment_photo from: { message.from_user.id }')
     await message.reply(got_payment_screenshot_text)
 
-    state_data = await state.get_data()
-    service = state_data['service']
+    service = await get_service_from_state(state)
 
     file_id = await get_file_id_from_message(message)
-    service.put_payment_photo(payment_photo=file_id)
+    await db_call(service.put_payment_photo, payment_photo=file_id)
     await send_payment_to_control(service=service)
     await send_actions_for_service(service=service)
 
 
+def get_customer_tg_id(service: Service) -> int:
+    return service.get_tg_user().get_tg_id()
+
+
 async def send_confirm_payment_notification(service: Service):
     await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
+        chat_id=await db_call(get_customer_tg_id, service),
         text=get_confirm_payment_text()
     )
 
 
 async def send_cancel_payment_notification(service: Service):
     await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
+        chat_id=await db_call(get_customer_tg_id, service),
         text=get_cancel_payment_text()
     )
 
@@ -484,120 +627,145 @@ async def send_actions_for_service(service: Service):
         data=service.get_service_id()
     )
     await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
+        chat_id=await db_call(get_customer_tg_id, service),
         text=product.preparation_description,
         reply_markup=keyboard
     )
 
 
-#  ------------------------------------------------ ОФОРМЛЕНИЕ БАНКОВСКОЙ КАРТЫ
-class BankCardState(StatesGroup):
+#  --------------------------------------------------------- ДОКУМЕНТЫ ПРОДУКТА
+# Одни обработчики для документов всех продуктов, фильтры собираются
+# из описаний продуктов в products.py
+class DocumentState(StatesGroup):
     waiting_form = State()
-    waiting_pasport = State()
+    waiting_file = State()
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=bank_card_product.uniq_key,
-        answer=bank_card_product.get_document_names()),
-    state='*')
-async def callback_button_bank_card(
+@router.route(
+    question=Product.get_all_product_keys(),
+    answer=Product.get_all_document_names())
+async def callback_product_document(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
     log.info('Got this callback data: %r', callback_data)
 
-    if callback_data['answer'] == 'Анкета для Банка':
-        await start_form_filling_for_bank(query.message, state)
-    elif callback_data['answer'] == 'Фото паспорта':
-        await start_pasport_getting(query.message, state)
+    product = Product.get_product(callback_data['question'])
+    document = product.find_document(callback_data['answer'])
     await query.answer()  # stop circle on button
+    if document is None:
+        log.warning('no document %r in %s',
+                    callback_data['answer'], product.uniq_key)
+        return
+
+    await state.update_data(
+        service_id=int(callback_data['data']),
+        product_key=product.uniq_key,
+        document_name=document.document_name
+    )
+    if document.document_type is DocumentType.FORM:
+        await start_form_filling(query.message, state, product)
+    elif document.document_type is DocumentType.FILE:
+        await start_file_getting(query.message, document)
+    elif document.document_type is DocumentType.MEETING:
+        await start_chosing_meeting(query.message, state)
 
-    state_data = await state.get_data()
-    product_name = state_data['product_name']
-    product = Product.get_product_by_name(product_name)
     await query.message.edit_text(
         text=product.preparation_description,
     )
 
 
-async def start_form_filling_for_bank(message: Message, state: FSMContext):
-    log.info('start_form_filling_for_bank from: %r', message.from_user.id)
-    await message.answer(
-        text=start_form_filling_text
-    )
+yes_no_keyboard = freeze_keyboard(make_replay_keyboard(yes_no_buttons))
+
 
-    await BankCardState.waiting_form.set()
-    field_enum = BankCardForm.full_name
-    field = field_enum.value
-    await state.update_data(field_enum=field_enum)
+def get_form_field_keyboard(field: FormField) -> str:
+    if field.field_type == FieldType.YES_NO:
+        return yes_no_keyboard
+    return None
+
+
+async def send_form_field(message: Message, field: FormField) -> None:
     await message.answer(
         text=get_text_for_form_field(
             field_name=field.name_for_human,
             field_type_discription=field.field_type.value
-        )
+        ),
+        reply_markup=get_form_field_keyboard(field)
     )
 
 
+async def start_form_filling(
+        message: Message, state: FSMContext, product: Product):
+    log.info('start_form_filling from: %r', message.chat.id)
+    await message.answer(
+        text=start_form_filling_text
+    )
+
+    await DocumentState.waiting_form.set()
+    await start_form(state)
+    await send_form_field(message, get_form_field(product.form, 0).value)
+
+
 @dp.message_handler(
     lambda message: is_message_private(message),
     content_types=[ContentType.TEXT],
-    state=BankCardState.waiting_form)
-async def bankcard_form_filling(message: Message, state: FSMContext):
+    state=DocumentState.waiting_form)
+async def form_filling(message: Message, state: FSMContext):
     log.info('form_filling from: %r', message.from_user.id)
 
     state_data = await state.get_data()
-    field_enum = state_data['field_enum']
-    service = state_data['service']
-
-    field = field_enum.value
-    print(f'{field.name_in_db}: {message.text}')
-    service.put_data_to_field(
-        name_field_in_db=field.name_in_db,
-        value=message.text
-    )
+    product = Product.get_product(state_data['product_key'])
+    field_index = state_data['field_index']
+    field = get_form_field(product.form, field_index).value
+    service = await get_service_from_state(state, state_data)
 
-    if field_enum == BankCardForm.address_company:
+    if field.field_type == FieldType.YES_NO:
+        if message.text not in yes_no_buttons:
+            await message.reply(text=answer_shoud_be_bool)
+            return
+        value = bool_dict_for_yes_no[message.text]
+    else:
+        value = message.text
+
+    is_last = field_index == len(product.form) - 1
+    await save_form_answer(
+        state, state_data, service, field.name_in_db, value, is_last)
+
+    if is_last:
         await message.answer(text=form_is_end_text)
         await state.reset_state(with_data=False)
-        service.form_complete()
         if not await check_readiness_and_do_next_step(service):
             await send_actions_for_service(service)
         return
 
-    field_enum = get_next_enum(field_enum)
-    field = field_enum.value
-    await state.update_data(field_enum=field_enum)
-    await message.answer(
-        text=get_text_for_form_field(
-            field_name=field.name_for_human,
-            field_type_discription=field.field_type.value
-        )
-    )
+    await send_form_field(
+        message, get_form_field(product.form, field_index + 1).value)
 
 
-async def start_pasport_getting(message: Message, state: FSMContext):
-    log.info('start_pasport_getting from: %r', message.from_user.id)
-    await BankCardState.waiting_pasport.set()
+async def start_file_getting(message: Message, document: Document):
+    log.info('start_file_getting %s from: %r',
+             document.name_in_db, message.chat.id)
+    await DocumentState.waiting_file.set()
     await message.answer(
-        text=waiting_pasport_text
+        text=document.waiting_text
     )
 
 
 @dp.message_handler(
     lambda message: is_message_private(message),
     content_types=[ContentType.PHOTO, ContentType.DOCUMENT],
-    state=BankCardState.waiting_pasport)
-async def pasport_getting(message: Message, state: FSMContext):
-    log.info('form_filling from: %r', message.from_user.id)
+    state=DocumentState.waiting_file)
+async def file_getting(message: Message, state: FSMContext):
+    log.info('file_getting from: %r', message.from_user.id)
 
     state_data = await state.get_data()
-    service = state_data['service']
+    product = Product.get_product(state_data['product_key'])
+    document = product.find_document(state_data['document_name'])
+    service = await get_service_from_state(state, state_data)
     file_id = await get_file_id_from_message(message)
-    service.new_pasport(pasport=file_id)
-    service.passport_complete()
+    await db_call(service.put_document, document, file_id)
     await message.reply(
-        text=pasport_getting_text
+        text=document.getting_text
     )
 
     if not await check_readiness_and_do_next_step(service):
@@ -619,12 +787,10 @@ def payment_control_keyboard(service: Service):
     return keyboard
 
 
-async def send_payment_to_control(service: Service):
-    """Отправляет оплату на проверку"""
-    log.info('send_payment_to_control')
+def get_payment_control_text(service: Service) -> str:
     product = service.__class__.product
     tg_user = service.get_tg_user()
-    text = get_text_for_payment_control(
+    return get_text_for_payment_control(
         product_name=product.product_name,
         payment_amount=product.payment_amount,
         from_customer=(
@@ -632,43 +798,53 @@ async def send_payment_to_control(service: Service):
         )
     )
 
-    payment_operators = Operator.get_operator_list(Section.PAYMENT_CONTROL)
-    for operator in payment_operators:
-        await send_document(
-            chat_id=operator.get_tg_id(),
-            file_id=service.get_payment_photo_id(),
+
+async def send_payment_to_control(service: Service):
+    """Отправляет оплату на проверку"""
+    log.info('send_payment_to_control')
+    text = await db_call(get_payment_control_text, service)
+    payment_photo_id = await db_call(service.get_payment_photo_id)
+
+    payment_operators = await db_call(
+        lambda: list(Operator.get_operator_list(Section.PAYMENT_CONTROL)))
+    keyboard = payment_control_keyboard(service)
+    await notifier.send_to_all(
+        chat_ids=[operator.get_tg_id() for operator in payment_operators],
+        send=lambda chat_id: send_document(
+            chat_id=chat_id,
+            file_id=payment_photo_id,
             caption=text,
-            reply_markup=payment_control_keyboard(service)
+            reply_markup=keyboard
         )
+    )
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=Section.PAYMENT_CONTROL.name,
-        answer=payment_control_buttons),
-    state='*')
+@router.route(
+    question=Section.PAYMENT_CONTROL.name,
+    answer=payment_control_buttons)
 async def callback_button_payment_control(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
     log.info('Got this callback data: %r', callback_data)
-    if not Operator.is_user_operator(
+    if not await db_call(
+            Operator.is_user_operator,
             tg_id=query.from_user.id,
             section=Section.PAYMENT_CONTROL):
         log.warning('user is not payment_control_operator')
         return
 
     service_id = callback_data['data']
-    service = Service(service_id)
+    service = await db_call(Service, int(service_id))
     if callback_data['answer'] == confirm_payment:
-        service.confirm_payment()
+        await db_call(service.confirm_payment)
         await send_confirm_payment_notification(service)
         await query.message.edit_caption(
             caption=query.message.caption + '\nПОДТВЕРЖДЕН'
         )
         await check_readiness_and_do_next_step(service)
     elif callback_data['answer'] == cancel_payment:
-        service.cancel_payment()
+        await db_call(service.cancel_payment)
         await query.message.edit_caption(
             caption=query.message.caption + '\nОТМЕНА'
         )
@@ -678,14 +854,12 @@ async def callback_button_payment_control(
 #  ---------------------------------------------------------- ВЫПОЛНЕНИЕ УСЛУГИ
 async def find_product_service(service_id: int):
     """Возвращает полноценный продуктовый сервис
+    с актуальными данными из базы
     """
     log.info('find_product_service')
-    if BankCardService.does_service_exist(service_id):
-        service = BankCardService.get(service_id)
-    elif DriveLicenseService.does_service_exist(service_id):
-        service = DriveLicenseService.get(service_id)
-
-    return service
+    service_id = int(service_id)
+    product = await db_call(Product.get_service_product, service_id)
+    return await db_call(product.service_class.get_actual, service_id)
 
 
 async def check_readiness_and_do_next_step(service: Service) -> bool:
@@ -697,13 +871,13 @@ async def check_readiness_and_do_next_step(service: Service) -> bool:
     log.info('check_readiness_bank_card_service')
 
     service = await find_product_service(service.get_service_id())
-    if not service.is_service_ready():
+    if not await db_call(service.is_service_ready):
         log.info('Service is not ready')
         return False
 
     log.info('Service is ready')
     await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
+        chat_id=await db_call(get_customer_tg_id, service),
         text=documents_is_ready_text
     )
     await send_service_to_operator(service)
@@ -725,67 +899,77 @@ def take_customer_operator_keyboard(service: Service, section: Section):
     return keyboard
 
 
+def get_new_service_text(service: Service) -> str:
+    product = service.__class__.product
+    return get_text_for_new_service(
+        product_name=product.product_name,
+        customer_name=service.get_customer_name(),
+        operator_name=service.get_executor_name(),
+        place_name=service.get_place_address(),
+        date_time=service.get_time_str()
+    )
+
+
 async def send_service_to_operator(service: Service):
     """Отправляет исполнителю-оператору"""
     log.info('send_service_to_bank_operator')
     product = service.__class__.product
     operator_section = product.operator_section
-    operators = Operator.get_operator_list(operator_section)
-    for operator in operators:
-        await bot.send_message(
-            chat_id=operator.get_tg_id(),
-            text=get_text_for_new_service(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name=service.get_executor_name(),
-                place_name=service.get_place_address(),
-                date_time=service.get_time_str()
-            ),
-            reply_markup=take_customer_operator_keyboard(
-                service=service,
-                section=operator_section
-            )
+    operators = await db_call(
+        lambda: list(Operator.get_operator_list(operator_section)))
+    text = await db_call(get_new_service_text, service)
+    keyboard = take_customer_operator_keyboard(
+        service=service,
+        section=operator_section
+    )
+    await notifier.send_to_all(
+        chat_ids=[operator.get_tg_id() for operator in operators],
+        send=lambda chat_id: bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=keyboard
         )
+    )
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        answer=operator_buttons),
-    state='*')
+@router.route(answer=operator_buttons)
 async def callback_operator_taking_service(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
     log.info('Got this callback data: %r', callback_data)
-    if not Operator.is_user_operator(
+    service_id = int(callback_data['data'])
+    product = await db_call(Product.get_service_product, service_id)
+    section = product.operator_section
+    if not await db_call(
+            Operator.is_user_operator,
             tg_id=query.from_user.id,
-            section=Section.BANK_CARD):
-        log.warning('user is not bank_card_operator')
+            section=section):
+        log.warning('user is not %s operator', section.name)
+        await query.answer()
         return
 
-    service_id = callback_data['data']
     service = await find_product_service(service_id)
-    product = service.__class__.product
     if callback_data['answer'] == take_customer:
-        operator = Operator.get_operator(query.from_user.id, Section.BANK_CARD)
-        service.change_executor(operator)
+        operator = await db_call(
+            Operator.get_operator, query.from_user.id, section)
+        executor = await db_call(service.claim, operator)
+        if executor.get_operator_id() != operator.get_operator_id():
+            log.info('service %s is already taken', service_id)
+            await query.answer(text=service_already_taken_text)
+            await query.message.edit_text(
+                text=await db_call(get_new_service_text, service)
+            )
+            return
+        await query.answer()
         await send_documents_to_operator(service)
-        if product is bank_card_product:
-            await send_bankcard_meeting_message(service)
-        elif product is driver_license_product:
-            await send_drivelic_meeting_message(service)
+        await send_meeting_to_operator(service)
 
     elif callback_data['answer'] == refuse_customer:
-        pass
+        await query.answer()
 
     await query.message.edit_text(
-        text=get_text_for_new_service(
-            product_name=product.product_name,
-            customer_name=service.get_customer_name(),
-            operator_name=service.get_executor_name(),
-            place_name=service.get_place_address(),
-            date_time=service.get_time_str()
-        )
+        text=await db_call(get_new_service_text, service)
     )
 
 
@@ -793,546 +977,431 @@ async def send_documents_to_operator(service: Service):
     """Отправляет документы исполнителю-оператору"""
     log.info('send_service_to_bank_operator')
     product = service.__class__.product
-    operator = service.get_executor()
-
-    await bot.send_message(
-        chat_id=operator.get_tg_id(),
-        text=get_form_text(
-            title=product.list_of_documents[0].document_name,
-            form_dict=service.get_form()
-        )
-    )
-    await send_document(
-        chat_id=operator.get_tg_id(),
-        file_id=service.get_passport(),
-        caption=product.list_of_documents[1].document_name
-    )
-    if product is driver_license_product:
-        await send_document(
-            chat_id=operator.get_tg_id(),
-            file_id=service.get_evisa(),
-            caption=product.list_of_documents[2].document_name
-        )
+    operator = await db_call(service.get_executor)
+
+    for document in product.list_of_documents:
+        if document.document_type is DocumentType.FORM:
+            await bot.send_message(
+                chat_id=operator.get_tg_id(),
+                text=get_form_text(
+                    title=document.document_name,
+                    form_dict=await db_call(service.get_form)
+                )
+            )
+        elif document.document_type is DocumentType.FILE:
+            await send_document(
+                chat_id=operator.get_tg_id(),
+                file_id=await db_call(service.get_document, document),
+                caption=document.document_name
+            )
 
 
-chosing_date_bankcard_question = 'bankcard_date'
-chosing_date_drivelic_question = 'drivelic_date'
+SLOT_FORMAT = '%Y-%m-%d %H:%M'  # ответ кнопки слота встречи
+TIME_FORMAT = '%H.%M'  # ответ кнопки времени, которое выбирает клиент
 
 
-def operator_days_keyboard(service: Service, question: str):
-    today = datetime.now(tz=timezone(CLIENT_TIMEZONE_NAME)).date()
-    days = [str(today + timedelta(days=i)) for i in range(1, 4)]
-    keyboard = make_inline_keyboard(
-        question=question,
-        answers=days,
-        data=service.get_service_id()
+def get_service_meeting_text(
+        service: Service,
+        place_name: str = None,
+        data_time: str = None,
+        time_format: str = '%Y-%m-%d | %H:%M',
+        place_link: str = None,
+        operator_name: str = None) -> str:
+    """Текст встречи, все что не передано берется из сервиса"""
+    product = service.__class__.product
+    if place_name is None:
+        place_name = service.get_place_address()
+    if data_time is None:
+        meet_time = service.get_time()
+        data_time = meet_time.strftime(time_format) if meet_time \
+            else '--- | ---'
+    if operator_name is None:
+        operator_name = service.get_executor_name()
+    return get_meeting_text(
+        product_name=product.product_name,
+        customer_name=service.get_customer_name(),
+        operator_name=operator_name,
+        place_name=place_name,
+        data_time=data_time,
+        place_link=place_link
     )
-    return keyboard
-
 
-#  ------------------------------------------------- ВЫПОЛНЕНИЕ УСЛУГИ BANKCARD
-bank_place_name_buttons = [
-    place.name for place in bank_card_product.list_of_places]
 
+async def operator_slots_keyboard(
+        service: Service,
+        place: Place,
+        slot_times: tuple = None) -> typing.Optional[InlineKeyboardMarkup]:
+    """Свободные слоты места для исполнителя сервиса, None если их нет
 
-def bank_places_keyboard(service: Service):
+    slot_times: время дня, которое выбрал клиент, если оно занято -
+    предлагается любое время места
+    """
+    operator = await db_call(service.get_executor)
+    slots = []
+    for times in (slot_times, None):
+        slots = await db_call(
+            Meeting.get_time_slots,
+            place,
+            operator=operator,
+            slot_times=times,
+            service_id=service.get_service_id())
+        if slots or times is None:
+            break
+    if not slots:
+        return None
+    answers = [slot.strftime(SLOT_FORMAT) for slot in slots]
+    await db_call(callback_codec.add_labels, answers)  # новые слоты
     keyboard = make_inline_keyboard(
-        question=Section.BANK_CARD.name,
-        answers=bank_place_name_buttons,
+        question=get_slot_question(service.__class__.product, place),
+        answers=answers,
         data=service.get_service_id()
     )
     return keyboard
 
 
-async def send_bankcard_meeting_message(service: Service):
-    """Отправляет исполнителю-оператору сообщение
-    для назначения времени/места встречи
-    """
-    log.info('send_bankcard_meeting_message')
-    operator = service.get_executor()
-    product = service.__class__.product
-
-    await bot.send_message(
-        chat_id=operator.get_tg_id(),
-        text=(
-            get_meeting_text(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name=service.get_executor_name(),
-                place_name='---',
-                data_time='--- | 7:40')
-            + chose_meeting_place
-        ),
-        reply_markup=bank_places_keyboard(service)
-    )
-
-
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=Section.BANK_CARD.name,
-        answer=bank_place_name_buttons),
-    state='*')
-async def callback_meeting_message(
+async def book_meeting_slot(
         query: CallbackQuery,
-        callback_data: typing.Dict[str, str],
-        state: FSMContext):
-    log.info('Got this callback data: %r', callback_data)
-    if not Operator.is_user_operator(
-            tg_id=query.from_user.id,
-            section=Section.BANK_CARD):
-        log.warning('user is not bank_card_operator')
-        return
-
-    service_id = callback_data['data']
-    service = BankCardService(service_id)
-    product = service.__class__.product
-    place_name = callback_data['answer']
-    place = product.find_place(place_name=place_name)
-    service.set_place(place)
-    await query.message.edit_text(
-        text=(
-            get_meeting_text(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name=service.get_executor_name(),
-                place_name=service.get_place_address(),
-                data_time='--- | 7:40')
-            + chose_meeting_time
-        ),
-        reply_markup=operator_days_keyboard(
-            service=service,
-            question=chosing_date_bankcard_question)
-    )
-
-
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=chosing_date_bankcard_question),
-    state='*')
-async def callback_time_meeting_message(
-        query: CallbackQuery,
-        callback_data: typing.Dict[str, str],
-        state: FSMContext):
-    log.info('Got this callback data: %r', callback_data)
-    if not Operator.is_user_operator(
-            tg_id=query.from_user.id,
-            section=Section.BANK_CARD):
-        log.warning('user is not bank_card_operator')
+        service: Service,
+        place: Place,
+        slot: datetime):
+    """Бронирует слот, выбранный исполнителем. Если слот успели
+    занять - предлагает оставшиеся
+    """
+    operator = await db_call(service.get_executor)
+    if not await db_call(service.book_time_slot, place, slot, operator):
+        keyboard = await operator_slots_keyboard(
+            service, place, slot_times=(slot.time(),))
+        meeting_text = await db_call(
+            get_service_meeting_text,
+            service,
+            place_name=place.address,
+            data_time='--- | ---',
+            place_link=place.google_map_link
+        )
+        await query.message.edit_text(
+            text=meeting_text + (
+                meeting_slot_taken if keyboard else no_free_meeting_slots),
+            reply_markup=keyboard
+        )
         return
 
-    service_id = callback_data['data']
-    service = BankCardService(service_id)
-    product = service.__class__.product
-
-    day_str = callback_data['answer']
-    meeting_day = datetime(
-        year=int(day_str[0:4]),
-        month=int(day_str[5:7]),
-        day=int(day_str[8:10]),
-        hour=7,
-        minute=40
-    )
-    meeting_day = timezone(CLIENT_TIMEZONE_NAME).localize(meeting_day)
-    service.set_time(meeting_day)
-
     await query.message.edit_text(
-        text=get_meeting_text(
-            product_name=product.product_name,
-            customer_name=service.get_customer_name(),
-            operator_name=service.get_executor_name(),
-            place_name=service.get_place_address(),
-            data_time=service.get_time().strftime('%Y-%m-%d | %H:%M')
-        )
+        text=await db_call(get_service_meeting_text, service)
     )
     await add_meeting_notification(service)
     await send_meeting_notification(service)
 
 
-#  ------------------------------------------------ ВЫПОЛНЕНИЕ УСЛУГИ DRIVERLIC
-async def send_drivelic_meeting_message(service: Service):
-    """Отправляет исполнителю-оператору сообщение
-    для назначения даты встречи
+async def send_meeting_to_operator(service: Service):
+    """Отправляет исполнителю-оператору сообщение для назначения
+    встречи: слоты места, которое выбрал клиент, или места продукта
     """
-    log.info('send_bankcard_meeting_message')
-    operator = service.get_executor()
+    log.info('send_meeting_to_operator')
+    operator = await db_call(service.get_executor)
     product = service.__class__.product
-    place = product.find_place(place_address=service.get_place_address())
+    if not does_customer_chose_place(product):
+        meeting_text = await db_call(
+            get_service_meeting_text,
+            service,
+            place_name='---',
+            data_time='--- | ---'
+        )
+        await bot.send_message(
+            chat_id=operator.get_tg_id(),
+            text=meeting_text + chose_meeting_place,
+            reply_markup=get_places_keyboard(service)
+        )
+        return
 
+    place = product.find_place(
+        place_address=await db_call(service.get_place_address))
+    chosen_time = await db_call(service.get_time)
+    keyboard = await operator_slots_keyboard(
+        service, place, slot_times=(chosen_time.time(),))
+    meeting_text = await db_call(
+        get_service_meeting_text,
+        service,
+        place_name=place.address,
+        time_format='--- | %H:%M',
+        place_link=place.google_map_link
+    )
     await bot.send_message(
         chat_id=operator.get_tg_id(),
-        text=(
-            get_meeting_text(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name=service.get_executor_name(),
-                place_name=place.address,
-                data_time=service.get_time().strftime('--- | %H:%M'),
-                place_link=place.google_map_link)
-            + chose_meeting_date
-        ),
-        reply_markup=operator_days_keyboard(
-            service=service,
-            question=chosing_date_drivelic_question)
+        text=meeting_text + (
+            chose_meeting_date if keyboard else no_free_meeting_slots),
+        reply_markup=keyboard
     )
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=chosing_date_drivelic_question),
-    state='*')
-async def callback_date_meeting_for_drivelic_message(
-        query: CallbackQuery,
-        callback_data: typing.Dict[str, str],
-        state: FSMContext):
-    log.info('Got this callback data: %r', callback_data)
-    if not Operator.is_user_operator(
-            tg_id=query.from_user.id,
-            section=Section.DRIVER_LICENSE):
-        log.warning('user is not driver_lic_operator')
-        return
-
-    service_id = callback_data['data']
-    service = await find_product_service(service_id)
-    product = service.__class__.product
+#  ----------------------------------------------------- ДЕЙСТВИЯ ПО РАСПИСАНИЮ
+async def add_meeting_notification(service: Service):
+    """Настраивает отложенное напоминание,
+    у сервиса всегда одно напоминание - на последнее время встречи
+    """
+    log.info('meeting_notification')
 
-    day_str = callback_data['answer']
-    meeting_day = datetime(
-        year=int(day_str[0:4]),
-        month=int(day_str[5:7]),
-        day=int(day_str[8:10]),
-        hour=service.get_time().hour,
-        minute=service.get_time().minute
+    meeting_time = await db_call(service.get_time)
+    await db_call(
+        schedule_meeting_notification,
+        scheduler,
+        send_meeting_notification_job,
+        service.service_id,
+        meeting_time
     )
-    meeting_day = timezone(CLIENT_TIMEZONE_NAME).localize(meeting_day)
-    service.set_time(meeting_day)
 
-    await query.message.edit_text(
-        text=get_meeting_text(
-            product_name=product.product_name,
-            customer_name=service.get_customer_name(),
-            operator_name=service.get_executor_name(),
-            place_name=service.get_place_address(),
-            data_time=service.get_time().strftime('%Y-%m-%d | %H:%M')
-        )
-    )
-    await add_meeting_notification(service)
-    await send_meeting_notification(service)
 
+async def send_meeting_notification_job(service_id: int):
+    """Задача планировщика: хранит только service_id,
+    сервис загружается из базы в момент отправки
+    """
+    service = await find_product_service(service_id)
+    await send_meeting_notification(service)
 
-#  ----------------------------------------------------- ДЕЙСТВИЯ ПО РАСПИСАНИЮ
-async def add_meeting_notification(service: Service):
-    """Настраивает отложенное напоминание"""
-    log.info('meeting_notification')
 
-    meeting_time = service.get_time()
-    time_for_notifi = (
-        meeting_time - timedelta(days=1)
-        ).replace(hour=21, minute=00)
+async def flush_form_job(chat_id: int, user_id: int):
+    """Задача планировщика: пишет в базу ответы брошенной анкеты
 
-    scheduler.add_job(
-        func=send_meeting_notification,
-        trigger=DateTrigger(
-            run_date=time_for_notifi
-        ),
-        kwargs={'service': service}
-    )
+    Ответы остаются в буфере, на последнем поле анкета все равно
+    записывается целиком
+    """
+    state = dp.current_state(chat=chat_id, user=user_id)
+    state_data = await state.get_data()
+    answers = state_data.get('form_answers')
+    if answers:
+        log.info('flush_form for: %r', user_id)
+        service = await find_product_service(state_data['form_service_id'])
+        await db_call(service.put_data_to_fields, answers)
+    await state.update_data(form_flush_scheduled=False)
 
 
 async def send_meeting_notification(service: Service):
     """Отправляет клиенту напоминание о встрече"""
     log.info('notification')
     product = service.__class__.product
-    place = product.find_place(place_address=service.get_place_address())
+    place = product.find_place(
+        place_address=await db_call(service.get_place_address))
     await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
-        text=get_meeting_text(
-            product_name=product.product_name,
-            customer_name=service.get_customer_name(),
-            operator_name=service.get_executor_name(),
+        chat_id=await db_call(get_customer_tg_id, service),
+        text=await db_call(
+            get_service_meeting_text,
+            service,
             place_name=place.address,
-            place_link=place.google_map_link,
-            data_time=service.get_time().strftime('%Y-%m-%d | %H:%M')
+            place_link=place.google_map_link
         )
     )
 
 
-#  ----------------------------------------------- ОФОРМЛЕНИЕ ВОДИТЕЛЬСКИХ ПРАВ
-class DriverLicenseState(StatesGroup):
-    waiting_form = State()
-    waiting_pasport = State()
-    waiting_evisa = State()
+#  ------------------------------------------------------ МЕСТО И ВРЕМЯ ВСТРЕЧИ
+def does_customer_chose_place(product: Product) -> bool:
+    """Место и время дня выбирает клиент, если встреча - документ
+    продукта, исполнитель потом выбирает день. Иначе место и слот
+    назначает исполнитель
+    """
+    return bool(product.get_documents(DocumentType.MEETING))
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=driver_license_product.uniq_key,
-        answer=driver_license_product.get_document_names()),
-    state='*')
-async def callback_button_driver_license(
-        query: CallbackQuery,
-        callback_data: typing.Dict[str, str],
-        state: FSMContext):
-    log.info('Got this callback data: %r', callback_data)
+def get_place_question(product: Product) -> str:
+    return f'{product.uniq_key}:place'
 
-    service_id = callback_data['data']
-    service = await find_product_service(service_id)
-    await state.update_data(service=service)
-
-    if callback_data['answer'] == 'Анкета':
-        await start_form_filling_for_driver_lic(query.message, state)
-    elif callback_data['answer'] == 'Фото паспорта':
-        await start_pasport_getting_for_driver_lic(query.message, state)
-    elif callback_data['answer'] == 'Электронная виза':
-        await start_evisa_getting_for_driver_lic(query.message, state)
-    elif callback_data['answer'] == 'Место встречи':
-        await start_chosing_meeting(query.message, state)
-    await query.answer()  # stop circle on button
-
-    product = service.__class__.product
-    await query.message.edit_text(
-        text=product.preparation_description
-    )
 
+def get_time_question(product: Product, place: Place) -> str:
+    return f'{product.uniq_key}:time:{place.name}'
 
-async def start_pasport_getting_for_driver_lic(
-        message: Message, state: FSMContext):
-    log.info('start_pasport_getting from: %r', message.from_user.id)
-    await DriverLicenseState.waiting_pasport.set()
-    await message.answer(
-        text=waiting_pasport_text
-    )
 
+def get_slot_question(product: Product, place: Place) -> str:
+    return f'{product.uniq_key}:slot:{place.name}'
 
-@dp.message_handler(
-    lambda message: is_message_private(message),
-    content_types=[ContentType.PHOTO, ContentType.DOCUMENT],
-    state=DriverLicenseState.waiting_pasport)
-async def pasport_getting_for_driver_lic(message: Message, state: FSMContext):
-    log.info('pasport_getting_for_driver_lic from: %r', message.from_user.id)
 
-    state_data = await state.get_data()
-    service = state_data['service']
-    file_id = await get_file_id_from_message(message)
-    service.new_pasport(pasport=file_id)
-    service.passport_complete()
-    await message.reply(
-        text=pasport_getting_text
-    )
-    if not await check_readiness_and_do_next_step(service):
-        await send_actions_for_service(service)
+def get_question_place(product: Product, question: str) -> Place:
+    """Место из вопроса кнопки времени или слота"""
+    return product.find_place(place_name=question.split(':', 2)[2])
 
 
-async def start_evisa_getting_for_driver_lic(
-        message: Message, state: FSMContext):
-    log.info(f'start_evisa_getting from: {message.from_user.id}')
-    await DriverLicenseState.waiting_evisa.set()
-    await message.answer(
-        text=waiting_evisa_text
+def get_places_keyboard(service: Service) -> InlineKeyboardMarkup:
+    product = service.__class__.product
+    keyboard = make_inline_keyboard(
+        question=get_place_question(product),
+        answers=[place.name for place in product.list_of_places],
+        data=service.get_service_id()
     )
+    return keyboard
 
 
-@dp.message_handler(
-    lambda message: is_message_private(message),
-    content_types=[ContentType.PHOTO, ContentType.DOCUMENT],
-    state=DriverLicenseState.waiting_evisa)
-async def evisa_getting_for_driver_lic(message: Message, state: FSMContext):
-    log.info('pasport_getting_for_driver_lic from: %r', message.from_user.id)
-
-    state_data = await state.get_data()
-    service = state_data['service']
-    file_id = await get_file_id_from_message(message)
-    service.new_evisa(file_id)
-    service.evisa_complete()
-    await message.reply(
-        text=evisa_getting_text
-    )
-    if not await check_readiness_and_do_next_step(service):
-        await send_actions_for_service(service)
+async def is_product_operator(query: CallbackQuery, product: Product) -> bool:
+    section = product.operator_section
+    if await db_call(
+            Operator.is_user_operator,
+            tg_id=query.from_user.id,
+            section=section):
+        return True
+    log.warning('user is not %s operator', section.name)
+    return False
 
 
-async def start_form_filling_for_driver_lic(
+async def start_chosing_meeting(
         message: Message, state: FSMContext):
-    log.info('start_form_filling_for_bank from: %r', message.from_user.id)
-    await message.answer(
-        text=start_form_filling_text
+    log.info('start_chosing_meeting from: %r', message.from_user.id)
+    service = await get_service_from_state(state)
+    meeting_text = await db_call(
+        get_service_meeting_text,
+        service,
+        place_name='---',
+        data_time='--- | ---',
+        operator_name='---'
     )
 
-    await DriverLicenseState.waiting_form.set()
-    field_enum = DriverLicenseForm.blood_type
-    field = field_enum.value
-    await state.update_data(field_enum=field_enum)
-    await message.answer(
-        text=get_text_for_form_field(
-            field_name=field.name_for_human,
-            field_type_discription=field.field_type.value
-        )
+    await bot.send_message(
+        chat_id=await db_call(get_customer_tg_id, service),
+        text=meeting_text + chose_meeting_place,
+        reply_markup=get_places_keyboard(service)
     )
 
 
-@dp.message_handler(
-    lambda message: is_message_private(message),
-    content_types=[ContentType.TEXT],
-    state=DriverLicenseState.waiting_form)
-async def driver_lic_form_filling(message: Message, state: FSMContext):
-    log.info('form_filling from: %r', message.from_user.id)
-
-    state_data = await state.get_data()
-    field_enum = state_data['field_enum']
-    service = state_data['service']
-
-    field = field_enum.value
-    print(f'{field.name_in_db}: {message.text}')
-
-    if field.field_type == FieldType.YES_NO:
-        if message.text not in yes_no_buttons:
-            message.reply(text=answer_shoud_be_bool)
-            return
-        value = bool_dict_for_yes_no[message.text]
-    else:
-        value = message.text
-
-    service.put_data_to_field(
-        name_field_in_db=field.name_in_db,
-        value=value
+async def get_customer_times_keyboard(
+        service: Service,
+        place: Place) -> typing.Optional[InlineKeyboardMarkup]:
+    """Время дня, в которое у места есть свободные слоты"""
+    slots = await db_call(Meeting.get_time_slots, place)
+    answers = [slot_time.strftime(TIME_FORMAT)
+               for slot_time in sorted({slot.time() for slot in slots})]
+    if not answers:
+        return None
+    await db_call(callback_codec.add_labels, answers)
+    keyboard = make_inline_keyboard(
+        question=get_time_question(service.__class__.product, place),
+        answers=answers,
+        data=service.get_service_id()
     )
+    return keyboard
 
-    if field_enum == DriverLicenseForm.international:
-        await message.answer(text=form_is_end_text)
-        await state.reset_state(with_data=False)
-        service.form_complete()
-        if not await check_readiness_and_do_next_step(service):
-            await send_actions_for_service(service)
+
+async def callback_meeting_place(
+        query: CallbackQuery,
+        callback_data: typing.Dict[str, str],
+        state: FSMContext):
+    """Место выбрано: клиенту - время дня, исполнителю - слоты"""
+    log.info('Got this callback data: %r', callback_data)
+    service = await find_product_service(callback_data['data'])
+    product = service.__class__.product
+    customer_chooses = does_customer_chose_place(product)
+    if not customer_chooses and not await is_product_operator(
+            query, product):
         return
 
-    field_enum = get_next_enum(field_enum)
-    field = field_enum.value
-    await state.update_data(field_enum=field_enum)
-    if field.field_type == FieldType.YES_NO:
-        keybord = make_replay_keyboard(yes_no_buttons)
+    place = product.find_place(place_name=callback_data['answer'])
+    if customer_chooses:
+        keyboard = await get_customer_times_keyboard(service, place)
     else:
-        keybord = None
-    await message.answer(
-        text=get_text_for_form_field(
-            field_name=field.name_for_human,
-            field_type_discription=field.field_type.value
-        ),
-        reply_markup=keybord
-    )
-
-
-police_place_name_buttons = [
-    place.name for place in driver_license_product.list_of_places]
-
-
-async def start_chosing_meeting(
-        message: Message, state: FSMContext):
-    log.info('start_chosing_meeting from: %r', message.from_user.id)
-    state_data = await state.get_data()
-    service = state_data['service']
-    product = service.__class__.product
+        keyboard = await operator_slots_keyboard(service, place)
+    if keyboard is None:
+        meeting_text = await db_call(
+            get_service_meeting_text,
+            service,
+            place_name=place.address,
+            data_time='--- | ---'
+        )
+        await query.message.edit_text(
+            text=meeting_text + no_free_meeting_slots + chose_meeting_place,
+            reply_markup=get_places_keyboard(service)
+        )
+        return
 
-    keyboard = make_inline_keyboard(
-        question=Section.DRIVER_LICENSE.name,
-        answers=police_place_name_buttons,
-        data=service.get_service_id()
+    meeting_text = await db_call(
+        get_service_meeting_text,
+        service,
+        place_name=place.address,
+        data_time='--- | ---',
+        place_link=place.google_map_link
     )
-
-    await bot.send_message(
-        chat_id=service.get_tg_user().get_tg_id(),
-        text=(
-            get_meeting_text(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name='---',
-                place_name='---',
-                data_time='--- | ---')
-            + chose_meeting_place
-        ),
+    await query.message.edit_text(
+        text=meeting_text + chose_meeting_time,
         reply_markup=keyboard
     )
 
 
-time_name_buttons = ('09.00', '12.00')
-
-
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=Section.DRIVER_LICENSE.name,
-        answer=police_place_name_buttons),
-    state='*')
-async def callback_meeting_place_message(
+async def callback_meeting_time(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
+    """Клиент выбрал время дня, день выберет исполнитель"""
     log.info('Got this callback data: %r', callback_data)
-
-    service_id = callback_data['data']
-    service = DriveLicenseService.get(service_id)
+    service = await find_product_service(callback_data['data'])
     product = service.__class__.product
-    place_name = callback_data['answer']
-    place = product.find_place(place_name=place_name)
-    service.set_place(place)
-
-    keyboard = make_inline_keyboard(
-        question=Section.DRIVER_LICENSE.name,
-        answers=time_name_buttons,
-        data=service.get_service_id()
+    place = get_question_place(product, callback_data['question'])
+
+    chosen_time = datetime.strptime(callback_data['answer'], TIME_FORMAT)
+    meeting_day = timezone(CLIENT_TIMEZONE_NAME).localize(
+        datetime.combine(datetime(2020, 1, 1), chosen_time.time()))
+    await db_call(service.request_meeting, place, meeting_day)
+
+    meeting_text = await db_call(
+        get_service_meeting_text,
+        service,
+        place_name=place.address,
+        time_format='--- | %H:%M',
+        place_link=place.google_map_link
     )
-
     await query.message.edit_text(
-        text=(
-            get_meeting_text(
-                product_name=product.product_name,
-                customer_name=service.get_customer_name(),
-                operator_name=service.get_executor_name(),
-                place_name=place.address,
-                data_time='--- | ---',
-                place_link=place.google_map_link)
-            + chose_meeting_time
-        ),
-        reply_markup=keyboard
+        text=meeting_text + meeting_date_chosing_operator
     )
+    if not await check_readiness_and_do_next_step(service):
+        await send_actions_for_service(service)
 
 
-@dp.callback_query_handler(
-    button_cb.filter(
-        question=Section.DRIVER_LICENSE.name,
-        answer=time_name_buttons),
-    state='*')
-async def callback_time_meeting_message_for_driver(
+async def callback_meeting_slot(
         query: CallbackQuery,
         callback_data: typing.Dict[str, str],
         state: FSMContext):
+    """Исполнитель выбрал слот встречи"""
     log.info('Got this callback data: %r', callback_data)
-
-    service_id = callback_data['data']
-    service = DriveLicenseService.get(service_id)
+    service = await find_product_service(callback_data['data'])
     product = service.__class__.product
+    if not await is_product_operator(query, product):
+        return
+
+    place = get_question_place(product, callback_data['question'])
+    slot = timezone(CLIENT_TIMEZONE_NAME).localize(
+        datetime.strptime(callback_data['answer'], SLOT_FORMAT))
+    await book_meeting_slot(query, service, place, slot)
 
-    time_str = callback_data['answer']
-    meeting_day = datetime(
-        year=2020,
-        month=1,
-        day=1,
-        hour=int(time_str[0:2]),
-        minute=int(time_str[3:5])
-    )
-    meeting_day = timezone(CLIENT_TIMEZONE_NAME).localize(meeting_day)
-    service.set_time(meeting_day)
 
-    place = product.find_place(place_address=service.get_place_address())
+# вопросы кнопок дня встречи, отправленных до слотов
+legacy_day_questions = ('bankcard_date', 'drivelic_date')
+
+
+@router.route(question=legacy_day_questions)
+async def callback_legacy_meeting_day(
+        query: CallbackQuery,
+        callback_data: typing.Dict[str, str],
+        state: FSMContext):
+    """Старая кнопка дня: выбор встречи начинается заново"""
+    log.info('Got this callback data: %r', callback_data)
+    await query.answer()
+    service = await find_product_service(callback_data['data'])
+    if not await is_product_operator(query, service.__class__.product):
+        return
+
     await query.message.edit_text(
-        text=get_meeting_text(
-            product_name=product.product_name,
-            customer_name=service.get_customer_name(),
-            operator_name=service.get_executor_name(),
-            place_name=place.address,
-            data_time=service.get_time().strftime('--- | %H:%M'),
-            place_link=place.google_map_link
-        ) + meeting_date_chosing_operator
+        text=await db_call(get_service_meeting_text, service)
     )
-    if not await check_readiness_and_do_next_step(service):
-        await send_actions_for_service(service)
+    await send_meeting_to_operator(service)
+
+
+for meeting_product in Product.get_all_products():
+    if meeting_product.list_of_places:
+        router.add_route(
+            callback_meeting_place,
+            question=get_place_question(meeting_product),
+            answer=[place.name for place in meeting_product.list_of_places])
+        router.add_route(
+            callback_meeting_slot,
+            question=[get_slot_question(meeting_product, place)
+                      for place in meeting_product.list_of_places])
+        if does_customer_chose_place(meeting_product):
+            router.add_route(
+                callback_meeting_time,
+                question=[get_time_question(meeting_product, place)
+                          for place in meeting_product.list_of_places])
 
 
 #  ---------------------------------------------------------- ОБРАБОТКА ДРУГОГО
@@ -1348,5 +1417,57 @@ async def random_message(message: Message, state: FSMContext):
         )
 
 
+async def on_startup(dp: Dispatcher):
+    """Запускает планировщик и сверяет напоминания с таблицей meeting"""
+    await db_call(callback_codec.load, router.get_labels())
+    scheduler.start(paused=True)
+    meetings = await db_call(Meeting.get_scheduled_meetings)
+    await db_call(
+        reconcile_meeting_notifications,
+        scheduler,
+        send_meeting_notification_job,
+        meetings,
+        datetime.now(tz=timezone(CLIENT_TIMEZONE_NAME)),
+        grace_time=SCHEDULER_MISFIRE_GRACE_TIME
+    )
+    if isinstance(dp.storage, PostgresStorage):
+        scheduler.add_job(
+            func=dp.storage.delete_expired,
+            trigger='interval',
+            hours=1,
+            id='fsm_cleanup',
+            jobstore='memory'
+        )
+    scheduler.resume()
+    if METRICS_PORT:
+        dp['metrics_server'] = await start_metrics_server(
+            METRICS_HOST, METRICS_PORT)
+
+
+async def on_shutdown(dp: Dispatcher):
+    """Перестает принимать обновления, дожидается начатых и закрывает
+    соединения с базой
+    """
+    dp.stop_polling()
+    await in_flight.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    scheduler.shutdown(wait=False)
+    shutdown_executor()
+    close_pool()
+    if 'metrics_server' in dp:
+        await dp['metrics_server'].cleanup()
+
+
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=False)
+    if BOT_MODE == 'webhook':
+        start_webhook(
+            dp,
+            on_startup=[on_startup],
+            on_shutdown=[on_shutdown]
+        )
+    else:
+        executor.start_polling(
+            dp,
+            skip_updates=False,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown
+        )
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta
+import logging
+from typing import Callable, Dict, Iterable, Tuple
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, \
+    EVENT_JOB_MISSED, JobExecutionEvent
+from apscheduler.jobstores.base import BaseJobStore, JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.triggers.date import DateTrigger
+from pytz import timezone
+from sqlalchemy import func, select
+
+from config import CLIENT_TIMEZONE_NAME
+from metrics import Counter, Gauge, registry
+
+log = logging.getLogger('scheduling')
+
+NOTIFICATION_JOB_PREFIX = 'meeting_notification:'
+FORM_FLUSH_JOB_PREFIX = 'form_flush:'
+
+JOB_RUNS = Counter(
+    'scheduler_job_runs_total',
+    'Scheduler jobs run by kind and outcome',
+    ['job', 'outcome'])
+SCHEDULED_JOBS = Gauge(
+    'scheduler_jobs',
+    'Jobs waiting in a job store',
+    ['jobstore'])
+_JOB_OUTCOMES = {
+    EVENT_JOB_EXECUTED: 'executed',
+    EVENT_JOB_ERROR: 'error',
+    EVENT_JOB_MISSED: 'missed',
+}
+
+
+def get_notification_job_id(service_id: int) -> str:
+    """One reminder job per service"""
+    return f'{NOTIFICATION_JOB_PREFIX}{service_id}'
+
+
+def get_notification_time(meeting_time: datetime) -> datetime:
+    """21:00 of the day before the meeting in client timezone"""
+    client_time = meeting_time.astimezone(timezone(CLIENT_TIMEZONE_NAME))
+    return (client_time - timedelta(days=1)).replace(
+        hour=21, minute=0, second=0, microsecond=0)
+
+
+def schedule_meeting_notification(
+        scheduler: BaseScheduler,
+        func: Callable,
+        service_id: int,
+        meeting_time: datetime) -> None:
+    """Add or move reminder job of the service"""
+    scheduler.add_job(
+        func=func,
+        trigger=DateTrigger(run_date=get_notification_time(meeting_time)),
+        id=get_notification_job_id(service_id),
+        kwargs={'service_id': service_id},
+        replace_existing=True
+    )
+
+
+def reconcile_meeting_notifications(
+        scheduler: BaseScheduler,
+        func: Callable,
+        meetings: Iterable[Tuple[int, datetime]],
+        now: datetime,
+        grace_time: int = 0) -> Dict[str, int]:
+    """Make reminder jobs match meetings (service_id, meeting_time)
+
+    Missing jobs are added, jobs with another time are moved, jobs of
+    services without upcoming meeting are removed. Jobs late by less
+    than grace_time seconds are kept to be run as misfired, but never
+    recreated: a job missing from the store has already been run.
+    """
+    existing = {
+        job.id: job for job in scheduler.get_jobs()
+        if job.id.startswith(NOTIFICATION_JOB_PREFIX)
+    }
+
+    not_before = now - timedelta(seconds=grace_time)
+    wanted = {}
+    for service_id, meeting_time in meetings:
+        job_id = get_notification_job_id(service_id)
+        run_date = get_notification_time(meeting_time)
+        if run_date > now or (job_id in existing and run_date > not_before):
+            wanted[job_id] = (service_id, run_date)
+
+    result = {'added': 0, 'moved': 0, 'removed': 0, 'kept': 0}
+    for job_id in existing.keys() - wanted.keys():
+        scheduler.remove_job(job_id)
+        result['removed'] += 1
+
+    for job_id, (service_id, run_date) in wanted.items():
+        job = existing.get(job_id)
+        if job is not None and job.next_run_time == run_date:
+            result['kept'] += 1
+            continue
+        scheduler.add_job(
+            func=func,
+            trigger=DateTrigger(run_date=run_date),
+            id=job_id,
+            kwargs={'service_id': service_id},
+            replace_existing=True
+        )
+        result['moved' if job is not None else 'added'] += 1
+
+    log.info(f'meeting notifications reconciled: {result}')
+    return result
+
+
+def get_form_flush_job_id(chat_id: int, user_id: int) -> str:
+    """One flush job per FSM address"""
+    return f'{FORM_FLUSH_JOB_PREFIX}{chat_id}:{user_id}'
+
+
+def schedule_form_flush(
+        scheduler: BaseScheduler,
+        func: Callable,
+        chat_id: int,
+        user_id: int,
+        timeout: int) -> None:
+    """Add or move job writing buffered form answers in timeout seconds"""
+    run_date = (datetime.now(tz=timezone(CLIENT_TIMEZONE_NAME))
+                + timedelta(seconds=timeout))
+    scheduler.add_job(
+        func=func,
+        trigger=DateTrigger(run_date=run_date),
+        id=get_form_flush_job_id(chat_id, user_id),
+        kwargs={'chat_id': chat_id, 'user_id': user_id},
+        replace_existing=True
+    )
+
+
+def cancel_form_flush(
+        scheduler: BaseScheduler, chat_id: int, user_id: int) -> None:
+    try:
+        scheduler.remove_job(get_form_flush_job_id(chat_id, user_id))
+    except JobLookupError:
+        pass  # already run
+
+
+def get_job_kind(job_id: str) -> str:
+    """meeting_notification:42 -> meeting_notification"""
+    return job_id.split(':', 1)[0]
+
+
+def count_jobs(jobstore: BaseJobStore) -> int:
+    if isinstance(jobstore, SQLAlchemyJobStore):
+        # get_all_jobs would unpickle every job
+        with jobstore.engine.connect() as connection:
+            return connection.execute(
+                select(func.count()).select_from(jobstore.jobs_t)).scalar()
+    return len(jobstore.get_all_jobs())
+
+
+def setup_scheduler_metrics(
+        scheduler: BaseScheduler,
+        jobstores: Dict[str, BaseJobStore]) -> None:
+    """Count job runs and jobs waiting in every job store"""
+    def on_job_event(event: JobExecutionEvent) -> None:
+        JOB_RUNS.inc(job=get_job_kind(event.job_id),
+                     outcome=_JOB_OUTCOMES[event.code])
+
+    scheduler.add_listener(
+        on_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+    def count_all() -> Dict[tuple, int]:
+        return {(alias,): count_jobs(jobstore)
+                for alias, jobstore in jobstores.items()}
+
+    async def collect() -> None:
+        loop = asyncio.get_running_loop()
+        SCHEDULED_JOBS.replace(await loop.run_in_executor(None, count_all))
+
+    registry.add_collector(collect)
@@ -154,3 +154,7 @@ chose_meeting_time = """\n\n<b>Выберете, какое время встр
 chose_meeting_date = """\n\n<b>Выберете, дату встречи?</b>"""
 meeting_date_chosing_operator = """
 \n\n<b>Дату встречи выберет исполнитель</b>"""
+meeting_slot_taken = """\n\n<b>Это время уже заняли, выберете другое</b>"""
+no_free_meeting_slots = """
+\n\n<b>Свободного времени встречи на ближайшие дни нет</b>"""
+service_already_taken_text = """Клиента уже взял другой исполнитель"""
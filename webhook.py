@@ -0,0 +1,91 @@
+from __future__ import annotations
+import asyncio
+import hmac
+import logging
+from typing import Callable, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.types import Update
+from aiogram.utils import executor
+from aiohttp import web
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, \
+    WEBAPP_HOST, WEBAPP_PORT
+
+log = logging.getLogger('webhook')
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Counts updates being handled so shutdown can wait for them"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def on_pre_process_update(self, update: Update, data: dict):
+        self.in_flight += 1
+        self._idle.clear()
+
+    async def on_post_process_update(self, update: Update, results: list,
+                                      data: dict):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until all started updates are handled"""
+        if self.in_flight:
+            log.info(f'waiting for {self.in_flight} updates in flight')
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f'{self.in_flight} updates still in flight '
+                        f'after {timeout} s')
+            return False
+        return True
+
+
+def secret_token_middleware(secret: str = WEBHOOK_SECRET) -> Callable:
+    """Rejects requests without secret token given to setWebhook"""
+    @web.middleware
+    async def check_secret_token(request: web.Request, handler):
+        token = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if secret and not hmac.compare_digest(token, secret):
+            log.warning(f'wrong secret token from {request.remote}')
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+    return check_secret_token
+
+
+async def set_webhook(bot: Bot, url: str = WEBHOOK_URL,
+                      secret: str = WEBHOOK_SECRET) -> bool:
+    """Bot.set_webhook of aiogram 2 does not know secret_token"""
+    params = {'url': url}
+    if secret:
+        params['secret_token'] = secret
+    return await bot.request('setWebhook', params)
+
+
+async def _register_webhook(dp: Dispatcher) -> None:
+    await set_webhook(dp.bot)
+    log.info(f'webhook is set to {WEBHOOK_URL}')
+
+
+def start_webhook(dp: Dispatcher,
+                  on_startup: List[Callable] = (),
+                  on_shutdown: List[Callable] = ()) -> None:
+    """Serve updates pushed by Telegram on WEBAPP_HOST:WEBAPP_PORT"""
+    app = web.Application(middlewares=[secret_token_middleware()])
+    executor.set_webhook(
+        dp,
+        WEBHOOK_PATH,
+        skip_updates=False,
+        on_startup=[_register_webhook, *on_startup],
+        on_shutdown=list(on_shutdown),
+        web_app=app
+    ).run_app(host=WEBAPP_HOST, port=WEBAPP_PORT)